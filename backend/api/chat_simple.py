@@ -1,10 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlmodel import Session, select
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import List, Optional
 import uuid
 from uuid import UUID
 import json
-from database import get_session
+from database import get_async_session
 from models.user import User
 from models.conversation import Conversation, ConversationCreate
 from models.message import Message, MessageCreate
@@ -30,21 +32,22 @@ class ChatRequest(BaseModel):
 
 
 @router.post("/{user_id}/chat")
-def chat_with_ai(user_id: str, request: ChatRequest, session: Session = Depends(get_session)):
+async def chat_with_ai(user_id: str, request: ChatRequest, session: AsyncSession = Depends(get_async_session)):
     """
     Main chat endpoint that handles conversation with the AI assistant.
     The AI will use MCP tools to perform task operations.
     """
     try:
         # Verify the user exists and is the same as the authenticated user
-        current_user = session.get(User, user_id)
+        current_user = await session.get(User, user_id)
         if not current_user:
             raise HTTPException(status_code=404, detail="User not found")
 
         # Find or create a conversation for this user
-        conversation_query = session.exec(
+        conversation_result = await session.exec(
             select(Conversation).where(Conversation.user_id == user_id).order_by(Conversation.created_at.desc())
-        ).first()
+        )
+        conversation_query = conversation_result.first()
         if not conversation_query:
             # Create a new conversation
             conversation_data = ConversationCreate()
@@ -56,8 +59,8 @@ def chat_with_ai(user_id: str, request: ChatRequest, session: Session = Depends(
 
             conversation = Conversation(**conversation_dict)
             session.add(conversation)
-            session.commit()
-            session.refresh(conversation)
+            await session.commit()
+            await session.refresh(conversation)
         else:
             conversation = conversation_query
 
@@ -70,7 +73,7 @@ def chat_with_ai(user_id: str, request: ChatRequest, session: Session = Depends(
             created_at=datetime.utcnow()
         )
         session.add(user_message_db)
-        session.commit()
+        await session.commit()
 
         # Prepare messages for the AI, including system prompt
         system_prompt = """You are a helpful AI assistant for managing tasks. You can help users add, list, update, complete, and delete tasks.
@@ -87,12 +90,13 @@ def chat_with_ai(user_id: str, request: ChatRequest, session: Session = Depends(
         IMPORTANT: You MUST respond to every user message. Even if no tools are needed, acknowledge the message and offer help."""
 
         # Get recent conversation history (last 10 messages)
-        recent_messages = session.exec(
+        recent_result = await session.exec(
             select(Message)
             .where(Message.conversation_id == conversation.id)
             .order_by(Message.created_at.asc())
             .limit(10)
-        ).all()
+        )
+        recent_messages = recent_result.all()
 
         # Format messages for the AI
         formatted_messages = [{"role": "system", "content": system_prompt}]
@@ -107,31 +111,11 @@ def chat_with_ai(user_id: str, request: ChatRequest, session: Session = Depends(
             client = get_openai_client()
 
             # Call the OpenAI API with function calling
-            response = client.chat.completions.create(
+            response = await run_in_threadpool(
+                client.chat.completions.create,
                 model="gpt-3.5-turbo",
                 messages=formatted_messages,
-                tools=[
-                    {
-                        "type": "function",
-                        "function": mcp_server.get_tool_description("add_task")
-                    },
-                    {
-                        "type": "function",
-                        "function": mcp_server.get_tool_description("list_tasks")
-                    },
-                    {
-                        "type": "function",
-                        "function": mcp_server.get_tool_description("complete_task")
-                    },
-                    {
-                        "type": "function",
-                        "function": mcp_server.get_tool_description("delete_task")
-                    },
-                    {
-                        "type": "function",
-                        "function": mcp_server.get_tool_description("update_task")
-                    }
-                ],
+                tools=mcp_server.get_tool_definitions(),
                 tool_choice="auto"
             )
 
@@ -147,7 +131,7 @@ def chat_with_ai(user_id: str, request: ChatRequest, session: Session = Depends(
                     function_args = json.loads(tool_call.function.arguments)
 
                     # Execute the tool
-                    tool_result = mcp_server.execute_tool(function_name, user_id, **function_args)
+                    tool_result = await mcp_server.execute_tool(function_name, user_id, **function_args)
 
                     # Add to tool responses
                     tool_responses.append({
@@ -158,7 +142,8 @@ def chat_with_ai(user_id: str, request: ChatRequest, session: Session = Depends(
                     })
 
                 # Get final response from AI with tool results
-                final_response = client.chat.completions.create(
+                final_response = await run_in_threadpool(
+                    client.chat.completions.create,
                     model="gpt-3.5-turbo",
                     messages=formatted_messages + [response_message] + tool_responses
                 )
@@ -192,12 +177,12 @@ def chat_with_ai(user_id: str, request: ChatRequest, session: Session = Depends(
             created_at=datetime.utcnow()
         )
         session.add(ai_message_db)
-        session.commit()
+        await session.commit()
 
         # Update conversation timestamp
         conversation.updated_at = datetime.utcnow()
         session.add(conversation)
-        session.commit()
+        await session.commit()
 
         return {
             "conversation_id": str(conversation.id),
@@ -211,10 +196,10 @@ def chat_with_ai(user_id: str, request: ChatRequest, session: Session = Depends(
 
 
 @router.get("/{user_id}/chat")
-def get_conversations_or_messages(
+async def get_conversations_or_messages(
     user_id: str, 
     conversation_id: Optional[str] = Query(None, description="Specific conversation ID to fetch messages for"),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """
     Get conversation history for a user.
@@ -222,14 +207,14 @@ def get_conversations_or_messages(
     If conversation_id is not provided, returns a list of user's conversations.
     """
     # Verify the user exists
-    current_user = session.get(User, user_id)
+    current_user = await session.get(User, user_id)
     if not current_user:
         raise HTTPException(status_code=404, detail="User not found")
 
     if conversation_id:
         # Fetch messages for a specific conversation
         conversation_uuid = UUID(conversation_id)
-        conversation = session.get(Conversation, conversation_uuid)
+        conversation = await session.get(Conversation, conversation_uuid)
         
         if not conversation or str(conversation.user_id) != user_id:
             raise HTTPException(status_code=404, detail="Conversation not found or does not belong to user")
@@ -238,7 +223,8 @@ def get_conversations_or_messages(
         messages_query = select(Message).where(
             Message.conversation_id == conversation_uuid
         ).order_by(Message.created_at.asc())
-        messages = session.exec(messages_query).all()
+        messages_result = await session.exec(messages_query)
+        messages = messages_result.all()
         
         # Format messages for response
         formatted_messages = [
@@ -257,7 +243,8 @@ def get_conversations_or_messages(
         conversations_query = select(Conversation).where(
             Conversation.user_id == user_id
         ).order_by(Conversation.updated_at.desc())
-        conversations = session.exec(conversations_query).all()
+        conversations_result = await session.exec(conversations_query)
+        conversations = conversations_result.all()
         
         # Format conversations for response
         formatted_conversations = []
@@ -266,7 +253,8 @@ def get_conversations_or_messages(
             last_message_query = select(Message).where(
                 Message.conversation_id == conv.id
             ).order_by(Message.created_at.desc()).limit(1)
-            last_message = session.exec(last_message_query).first()
+            last_message_result = await session.exec(last_message_query)
+            last_message = last_message_result.first()
             
             formatted_conversations.append({
                 "conversation_id": str(conv.id),
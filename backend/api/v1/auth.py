@@ -1,10 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from datetime import timedelta
-from database import get_session
+from database import get_async_session
 from models.user import User, UserCreate, UserPublic
-from utils.auth import create_access_token, verify_password
-from utils.security import get_password_hash
+from utils.auth import create_access_token
+from utils.security import hash_password_async, verify_and_update_password_async
 from config import settings
 from schemas.user import Token
 
@@ -13,26 +14,27 @@ router = APIRouter()
 
 
 @router.post("/register", response_model=Token)
-def register(user: UserCreate, session: Session = Depends(get_session)):
+async def register(user: UserCreate, session: AsyncSession = Depends(get_async_session)):
     """
     Register a new user and return an access token.
     """
     # Check if user already exists
-    existing_user = session.exec(select(User).where(User.email == user.email)).first()
+    result = await session.exec(select(User).where(User.email == user.email))
+    existing_user = result.first()
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
 
-    # Hash the password
-    hashed_password = get_password_hash(user.password)
+    # Hash the password in the hashing pool
+    hashed_password = await hash_password_async(user.password)
 
     # Create new user
     db_user = User(email=user.email, hashed_password=hashed_password)
     session.add(db_user)
-    session.commit()
-    session.refresh(db_user)
+    await session.commit()
+    await session.refresh(db_user)
 
     # Create access token for the newly registered user (auto-login after registration)
     access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
@@ -44,19 +46,34 @@ def register(user: UserCreate, session: Session = Depends(get_session)):
 
 
 @router.post("/login", response_model=Token)
-def login(user_credentials: UserCreate, session: Session = Depends(get_session)):
+async def login(user_credentials: UserCreate, session: AsyncSession = Depends(get_async_session)):
     """
     Login an existing user and return an access token.
     """
     # Find user by email
-    user = session.exec(select(User).where(User.email == user_credentials.email)).first()
+    result = await session.exec(select(User).where(User.email == user_credentials.email))
+    user = result.first()
     
-    if not user or not verify_password(user_credentials.password, user.hashed_password):
+    if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+    verified, new_hash = await verify_and_update_password_async(user_credentials.password, user.hashed_password)
+    if not verified:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect email or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    # Transparently upgrade hashes created with outdated parameters
+    if new_hash:
+        user.hashed_password = new_hash
+        session.add(user)
+        await session.commit()
     
     # Create access token
     access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
@@ -1,29 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlmodel import Session, select
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import AsyncIterator, Dict, List, Optional
 import uuid
 from uuid import UUID
 import json
-from database import get_session
+from config import settings
+from database import get_async_session, get_read_session, set_session_user
 from models.user import User
 from models.conversation import Conversation, ConversationCreate
 from models.message import Message, MessageCreate
 from utils.auth import get_current_user
+from utils.pagination import CONVERSATION_SORT_KEYS, MESSAGE_SORT_KEYS, paginate, split_page
 from datetime import datetime
 from mcp.server import mcp_server
-import os
-from openai import OpenAI
+from utils.llm import STREAM_USAGE, LLMClient, get_llm_client
+from utils.events import format_sse
+from utils.context import build_context
+from utils.tracing import span
 
 router = APIRouter()
 
-# Initialize OpenAI client
-def get_openai_client():
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY environment variable is not set")
-    return OpenAI(api_key=api_key)
-
-
 from pydantic import BaseModel
 
 class ChatRequest(BaseModel):
@@ -36,51 +34,7 @@ class ChatResponse(BaseModel):
     tool_calls: List[dict]
 
 
-@router.post("/{user_id}/chat", response_model=ChatResponse)
-def chat_with_ai(user_id: str, request: ChatRequest, session: Session = Depends(get_session)):
-    """
-    Main chat endpoint that handles conversation with the AI assistant.
-    The AI will use MCP tools to perform task operations.
-    """
-    try:
-        # Verify the user exists and is the same as the authenticated user
-        current_user = session.get(User, user_id)
-        if not current_user:
-            raise HTTPException(status_code=404, detail="User not found")
-
-        # Find or create a conversation for this user
-        conversation_query = session.exec(
-            select(Conversation).where(Conversation.user_id == user_id).order_by(Conversation.created_at.desc())
-        ).first()
-        if not conversation_query:
-            # Create a new conversation
-            conversation_data = ConversationCreate()
-            conversation_dict = conversation_data.model_dump()
-            conversation_dict['user_id'] = user_id
-            conversation_dict['id'] = None
-            conversation_dict['created_at'] = datetime.utcnow()
-            conversation_dict['updated_at'] = datetime.utcnow()
-
-            conversation = Conversation(**conversation_dict)
-            session.add(conversation)
-            session.commit()
-            session.refresh(conversation)
-        else:
-            conversation = conversation_query
-
-        # Save user's message to the conversation
-        user_message_db = Message(
-            conversation_id=conversation.id,
-            user_id=user_id,
-            role="user",
-            content=request.user_message,
-            created_at=datetime.utcnow()
-        )
-        session.add(user_message_db)
-        session.commit()
-
-        # Prepare messages for the AI, including system prompt
-        system_prompt = """You are a helpful AI assistant for managing tasks. You can help users add, list, update, complete, and delete tasks.
+SYSTEM_PROMPT = """You are a helpful AI assistant for managing tasks. You can help users add, list, update, complete, and delete tasks.
         Always use the provided tools to perform these operations. Be friendly and confirm actions with the user.
         The available tools are:
         - add_task: Add a new task with title, description, priority, and due date
@@ -91,85 +45,145 @@ def chat_with_ai(user_id: str, request: ChatRequest, session: Session = Depends(
 
         Always confirm with the user before performing destructive actions like deleting tasks."""
 
-        # Get recent conversation history (last 10 messages)
-        recent_messages = session.exec(
-            select(Message)
-            .where(Message.conversation_id == conversation.id)
-            .order_by(Message.created_at.asc())
-            .limit(10)
-        ).all()
 
-        # Format messages for the AI
-        formatted_messages = [{"role": "system", "content": system_prompt}]
-        for msg in recent_messages:
-            formatted_messages.append({"role": msg.role, "content": msg.content})
+def get_tool_definitions() -> List[dict]:
+    """
+    Tool definitions passed to the chat completions API.
+    Built once by the MCP server's tool registry and reused.
+    """
+    return mcp_server.get_tool_definitions()
+
 
-        # Add the current user message
-        formatted_messages.append({"role": "user", "content": request.user_message})
+async def get_or_create_conversation(session: AsyncSession, user_id: UUID) -> Conversation:
+    """
+    Return the user's latest conversation, creating one if needed.
+    """
+    conversation_result = await session.exec(
+        select(Conversation).where(Conversation.user_id == user_id).order_by(Conversation.created_at.desc())
+    )
+    conversation = conversation_result.first()
+    if conversation:
+        return conversation
+
+    conversation_data = ConversationCreate()
+    conversation_dict = conversation_data.model_dump()
+    conversation_dict['user_id'] = user_id
+    conversation_dict['id'] = None
+    conversation_dict['created_at'] = datetime.utcnow()
+    conversation_dict['updated_at'] = datetime.utcnow()
+
+    conversation = Conversation(**conversation_dict)
+    session.add(conversation)
+    await session.commit()
+    await session.refresh(conversation)
+    return conversation
+
+
+async def build_prompt_messages(
+    session: AsyncSession,
+    conversation: Conversation,
+    llm: Optional[LLMClient] = None
+) -> List[dict]:
+    """
+    System prompt, conversation summary and recent history, formatted for
+    the AI and packed into the context token budget.
+    The new user message is already saved, so it is the last history entry.
+    """
+    return await build_context(session, conversation, SYSTEM_PROMPT, get_tool_definitions(), llm=llm)
+
+
+async def save_message(session: AsyncSession, conversation: Conversation, user_id: UUID, role: str, content: str):
+    """
+    Persist a message and bump the conversation timestamp.
+    """
+    session.add(Message(
+        conversation_id=conversation.id,
+        user_id=user_id,
+        role=role,
+        content=content,
+        created_at=datetime.utcnow()
+    ))
+    conversation.updated_at = datetime.utcnow()
+    session.add(conversation)
+    await session.commit()
+
+
+@router.post("/{user_id}/chat", response_model=ChatResponse)
+async def chat_with_ai(
+    user_id: UUID,
+    request: ChatRequest,
+    session: AsyncSession = Depends(get_async_session),
+    llm: Optional[LLMClient] = Depends(get_llm_client)
+):
+    """
+    Main chat endpoint that handles conversation with the AI assistant.
+    The AI will use MCP tools to perform task operations.
+    """
+    set_session_user(user_id)
+    try:
+        # Verify the user exists and is the same as the authenticated user
+        with span("chat.load_user"):
+            current_user = await session.get(User, user_id)
+        if not current_user:
+            raise HTTPException(status_code=404, detail="User not found")
+
+        # Find or create a conversation for this user, and save user's message to it
+        with span("chat.save_user_message"):
+            conversation = await get_or_create_conversation(session, user_id)
+            await save_message(session, conversation, user_id, "user", request.user_message)
+
+        # Prepare messages for the AI, including system prompt and recent history
+        with span("chat.build_context") as context_span:
+            formatted_messages = await build_prompt_messages(session, conversation, llm)
+            context_span.set_attribute("chat.messages", len(formatted_messages))
 
         try:
-            # Get OpenAI client
-            client = get_openai_client()
+            if llm is None:
+                raise ValueError("OPENAI_API_KEY environment variable is not set")
 
             # Call the OpenAI API with function calling
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=formatted_messages,
-                tools=[
-                    {
-                        "type": "function",
-                        "function": mcp_server.get_tool_description("add_task")
-                    },
-                    {
-                        "type": "function",
-                        "function": mcp_server.get_tool_description("list_tasks")
-                    },
-                    {
-                        "type": "function",
-                        "function": mcp_server.get_tool_description("complete_task")
-                    },
-                    {
-                        "type": "function",
-                        "function": mcp_server.get_tool_description("delete_task")
-                    },
-                    {
-                        "type": "function",
-                        "function": mcp_server.get_tool_description("update_task")
-                    }
-                ],
-                tool_choice="auto"
-            )
+            with span("chat.completion", {"chat.round": "tools"}):
+                response = await llm.chat_completion(
+                    model=settings.openai_model,
+                    messages=formatted_messages,
+                    tools=get_tool_definitions(),
+                    tool_choice="auto"
+                )
 
             # Process the response
             response_message = response.choices[0].message
             tool_calls = response_message.tool_calls
 
             if tool_calls:
-                # Process tool calls
-                tool_responses = []
-                for tool_call in tool_calls:
-                    function_name = tool_call.function.name
-                    function_args = json.loads(tool_call.function.arguments)
-
-                    # Execute the tool
-                    tool_result = mcp_server.execute_tool(function_name, user_id, **function_args)
-
-                    # Add to tool responses
-                    tool_responses.append({
+                # Run the tool calls in this request's session and commit them
+                # once; results come back in call order
+                with span("chat.tool_calls", {"chat.tool_calls": len(tool_calls)}):
+                    tool_results = await mcp_server.execute_tools(
+                        user_id,
+                        [(tc.function.name, tc.function.arguments) for tc in tool_calls],
+                        session
+                    )
+                tool_responses = [
+                    {
                         "tool_call_id": tool_call.id,
                         "role": "tool",
-                        "name": function_name,
+                        "name": tool_call.function.name,
                         "content": json.dumps(tool_result)
-                    })
+                    }
+                    for tool_call, tool_result in zip(tool_calls, tool_results)
+                ]
 
                 # Get final response from AI with tool results
-                final_response = client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=formatted_messages + [response_message] + tool_responses
-                )
+                with span("chat.completion", {"chat.round": "final"}):
+                    final_response = await llm.chat_completion(
+                        model=settings.openai_model,
+                        messages=formatted_messages + [response_message] + tool_responses
+                    )
 
                 ai_response_text = final_response.choices[0].message.content
-                tool_calls_result = [tc.function for tc in tool_calls]  # Extract tool calls for response
+                tool_calls_result = [
+                    {"name": tc.function.name, "arguments": tc.function.arguments} for tc in tool_calls
+                ]
             else:
                 # No tool calls, just return the AI's response
                 ai_response_text = response_message.content
@@ -180,21 +194,9 @@ def chat_with_ai(user_id: str, request: ChatRequest, session: Session = Depends(
             ai_response_text = f"I'm sorry, I encountered an error processing your request: {str(e)}. Could you try rephrasing?"
             tool_calls_result = []
 
-        # Save AI's response to the conversation
-        ai_message_db = Message(
-            conversation_id=conversation.id,
-            user_id=user_id,  # The AI acts on behalf of the user's context
-            role="assistant",
-            content=ai_response_text,
-            created_at=datetime.utcnow()
-        )
-        session.add(ai_message_db)
-        session.commit()
-
-        # Update conversation timestamp
-        conversation.updated_at = datetime.utcnow()
-        session.add(conversation)
-        session.commit()
+        # Save AI's response to the conversation (the AI acts on behalf of the user's context)
+        with span("chat.save_assistant_message"):
+            await save_message(session, conversation, user_id, "assistant", ai_response_text)
 
         return ChatResponse(
             conversation_id=str(conversation.id),
@@ -210,35 +212,183 @@ def chat_with_ai(user_id: str, request: ChatRequest, session: Session = Depends(
         )
 
 
+@router.post("/{user_id}/chat/stream")
+async def chat_with_ai_stream(
+    user_id: UUID,
+    request: ChatRequest,
+    session: AsyncSession = Depends(get_async_session),
+    llm: Optional[LLMClient] = Depends(get_llm_client)
+):
+    """
+    Streaming variant of the chat endpoint.
+    Emits Server-Sent Events: "conversation" once, "token" for every piece
+    of assistant text, "tool_call_start" for every MCP tool call followed by
+    "tool_call_finish" as each one completes, and a final "done" event once the assistant message is saved.
+    """
+    set_session_user(user_id)
+    current_user = await session.get(User, user_id)
+    if not current_user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    conversation = await get_or_create_conversation(session, user_id)
+    await save_message(session, conversation, user_id, "user", request.user_message)
+    formatted_messages = await build_prompt_messages(session, conversation, llm)
+
+    async def event_stream() -> AsyncIterator[str]:
+        yield format_sse("conversation", {"conversation_id": str(conversation.id)})
+
+        text_parts: List[str] = []
+        tool_calls_result: List[dict] = []
+        try:
+            if llm is None:
+                raise ValueError("OPENAI_API_KEY environment variable is not set")
+
+            # Tool calls arrive in fragments keyed by index
+            pending_calls: Dict[int, dict] = {}
+            async with llm.slot() as client:
+                stream = await client.chat.completions.create(
+                    model=settings.openai_model,
+                    messages=formatted_messages,
+                    tools=get_tool_definitions(),
+                    tool_choice="auto",
+                    stream=True,
+                    stream_options=STREAM_USAGE,
+                    timeout=settings.openai_timeout
+                )
+                async for chunk in stream:
+                    if chunk.usage:
+                        llm.record_usage(chunk.usage)
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta
+                    if delta.content:
+                        text_parts.append(delta.content)
+                        yield format_sse("token", {"content": delta.content})
+                    for fragment in delta.tool_calls or []:
+                        call = pending_calls.setdefault(fragment.index, {"id": None, "name": "", "arguments": ""})
+                        if fragment.id:
+                            call["id"] = fragment.id
+                        if fragment.function and fragment.function.name:
+                            call["name"] += fragment.function.name
+                        if fragment.function and fragment.function.arguments:
+                            call["arguments"] += fragment.function.arguments
+
+            if pending_calls:
+                calls = [pending_calls[index] for index in sorted(pending_calls)]
+                for call in calls:
+                    yield format_sse("tool_call_start", call)
+
+                # Tools share this request's session and commit once; finish
+                # events arrive as each completes
+                tool_results: List[dict] = [None] * len(calls)
+                async for index, tool_result in mcp_server.iter_tool_results(
+                    user_id, [(call["name"], call["arguments"]) for call in calls], session
+                ):
+                    tool_results[index] = tool_result
+                    call = calls[index]
+                    yield format_sse("tool_call_finish", {"id": call["id"], "name": call["name"], "result": tool_result})
+
+                tool_calls_result = [{"name": call["name"], "arguments": call["arguments"]} for call in calls]
+                tool_responses = [
+                    {
+                        "tool_call_id": call["id"],
+                        "role": "tool",
+                        "name": call["name"],
+                        "content": json.dumps(tool_result)
+                    }
+                    for call, tool_result in zip(calls, tool_results)
+                ]
+
+                assistant_tool_message = {
+                    "role": "assistant",
+                    "content": "".join(text_parts) or None,
+                    "tool_calls": [
+                        {
+                            "id": call["id"],
+                            "type": "function",
+                            "function": {"name": call["name"], "arguments": call["arguments"]}
+                        }
+                        for call in calls
+                    ]
+                }
+
+                # Stream the final answer built from the tool results
+                text_parts = []
+                async with llm.slot() as client:
+                    final_stream = await client.chat.completions.create(
+                        model=settings.openai_model,
+                        messages=formatted_messages + [assistant_tool_message] + tool_responses,
+                        stream=True,
+                        stream_options=STREAM_USAGE,
+                        timeout=settings.openai_timeout
+                    )
+                    async for chunk in final_stream:
+                        if chunk.usage:
+                            llm.record_usage(chunk.usage)
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            text_parts.append(chunk.choices[0].delta.content)
+                            yield format_sse("token", {"content": chunk.choices[0].delta.content})
+
+            ai_response_text = "".join(text_parts)
+        except Exception as e:
+            # If there's an error with the AI service, return a helpful message
+            ai_response_text = f"I'm sorry, I encountered an error processing your request: {str(e)}. Could you try rephrasing?"
+            yield format_sse("error", {"message": ai_response_text})
+
+        await save_message(session, conversation, user_id, "assistant", ai_response_text)
+        yield format_sse("done", {
+            "conversation_id": str(conversation.id),
+            "assistant_message": ai_response_text,
+            "tool_calls": tool_calls_result
+        })
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/{user_id}/chat")
-def get_conversations_or_messages(
-    user_id: str, 
+async def get_conversations_or_messages(
+    user_id: UUID,
+    response: Response,
     conversation_id: Optional[str] = Query(None, description="Specific conversation ID to fetch messages for"),
-    session: Session = Depends(get_session)
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page"),
+    before: Optional[str] = Query(None, description="Message cursor from X-Next-Cursor: return messages older than it"),
+    limit: int = Query(50, ge=1, le=100, description="Limit number of conversations or messages"),
+    session: AsyncSession = Depends(get_read_session)
 ):
     """
     Get conversation history for a user.
-    If conversation_id is provided, returns messages for that conversation.
-    If conversation_id is not provided, returns a list of user's conversations.
+    If conversation_id is provided, returns a page of that conversation's
+    messages, newest first; pass X-Next-Cursor back as `before` for older ones.
+    If conversation_id is not provided, returns a page of the user's
+    conversations, most recently updated first.
     """
+    set_session_user(user_id)
     # Verify the user exists
-    current_user = session.get(User, user_id)
+    current_user = await session.get(User, user_id)
     if not current_user:
         raise HTTPException(status_code=404, detail="User not found")
 
     if conversation_id:
         # Fetch messages for a specific conversation
         conversation_uuid = UUID(conversation_id)
-        conversation = session.get(Conversation, conversation_uuid)
+        conversation = await session.get(Conversation, conversation_uuid)
         
-        if not conversation or str(conversation.user_id) != user_id:
+        if not conversation or conversation.user_id != user_id:
             raise HTTPException(status_code=404, detail="Conversation not found or does not belong to user")
         
-        # Get all messages for this conversation
-        messages_query = select(Message).where(
-            Message.conversation_id == conversation_uuid
-        ).order_by(Message.created_at.asc())
-        messages = session.exec(messages_query).all()
+        # Get one page of messages, newest first
+        messages_query = paginate(
+            select(Message).where(Message.conversation_id == conversation_uuid),
+            "messages", MESSAGE_SORT_KEYS, limit, before
+        )
+        messages_result = await session.exec(messages_query)
+        messages, next_cursor = split_page(messages_result.all(), "messages", MESSAGE_SORT_KEYS, limit)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
         
         # Format messages for response
         formatted_messages = [
@@ -253,25 +403,36 @@ def get_conversations_or_messages(
         
         return formatted_messages
     else:
-        # Fetch list of user's conversations
-        conversations_query = select(Conversation).where(
+        # Fetch a page of the user's conversations together with their last
+        # message in a single query; the subquery is served by the
+        # (conversation_id, created_at) index
+        last_message = (
+            select(Message.content)
+            .where(Message.conversation_id == Conversation.id)
+            .order_by(Message.created_at.desc())
+            .limit(1)
+            .correlate(Conversation)
+            .scalar_subquery()
+        )
+        conversations_query = select(Conversation, last_message.label("last_message")).where(
             Conversation.user_id == user_id
-        ).order_by(Conversation.updated_at.desc())
-        conversations = session.exec(conversations_query).all()
+        )
+        conversations_query = paginate(conversations_query, "updated_at", CONVERSATION_SORT_KEYS, limit, cursor)
+        conversations_result = await session.exec(conversations_query)
+        rows, next_cursor = split_page(
+            conversations_result.all(), "updated_at", CONVERSATION_SORT_KEYS, limit, row_key=lambda row: row[0]
+        )
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
         
         # Format conversations for response
-        formatted_conversations = []
-        for conv in conversations:
-            # Get the last message for this conversation
-            last_message_query = select(Message).where(
-                Message.conversation_id == conv.id
-            ).order_by(Message.created_at.desc()).limit(1)
-            last_message = session.exec(last_message_query).first()
-            
-            formatted_conversations.append({
+        formatted_conversations = [
+            {
                 "conversation_id": str(conv.id),
-                "last_message": last_message.content if last_message else "",
+                "last_message": last_message_content or "",
                 "updated_at": conv.updated_at.isoformat()
-            })
+            }
+            for conv, last_message_content in rows
+        ]
         
-        return formatted_conversations
\ No newline at end of file
+        return formatted_conversations
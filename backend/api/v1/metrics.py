@@ -0,0 +1,14 @@
+from fastapi import APIRouter
+from utils.metrics import query_metrics
+
+router = APIRouter()
+
+
+@router.get("/queries")
+def get_query_metrics():
+    """
+    Per-statement latency histograms (milliseconds, cumulative buckets),
+    rows returned and the most recent slow queries.
+    """
+    return query_metrics.snapshot()
+
@@ -1,11 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlmodel import Session, select
-from typing import List, Optional
-from uuid import UUID
-from database import get_session
-from models.task import Task, TaskCreate, TaskUpdate, TaskPublic
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response, Header
+from fastapi.responses import StreamingResponse
+from sqlmodel import select
+from sqlalchemy import delete, insert, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import AsyncIterator, Dict, List, Optional, Sequence
+from uuid import UUID, uuid4
+from database import get_async_session, get_read_session
+from models.task import (
+    Task, TaskCreate, TaskUpdate, TaskPublic,
+    TaskBulkCreate, TaskBulkUpdate, TaskBulkComplete, TaskBulkDelete, TaskBulkResult, TaskChanges,
+    TaskFilters, TaskStats
+)
 from models.user import User
 from utils.auth import get_current_user
+from utils.pagination import paginate_tasks, split_task_page
+from utils.etag import task_etag, collection_etag, etag_matches, not_modified, check_if_match
+from utils.task_sync import get_task_version, bump_task_version, record_task_deletions, get_changes
+from utils.task_query import build_task_query, order_by_relevance, get_task_stats
+from utils.cache import task_stats_cache
+from utils.events import format_sse, publish_task_event, subscribe_task_events
 from datetime import datetime
 
 
@@ -13,39 +26,152 @@ router = APIRouter()
 
 
 @router.get("/", response_model=List[TaskPublic])
-def get_tasks(
+async def get_tasks(
+    response: Response,
     current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_read_session),
     completed: Optional[bool] = Query(None, description="Filter by completion status"),
-    priority: Optional[str] = Query(None, regex="^(low|medium|high)$", description="Filter by priority"),
+    priority: Optional[List[str]] = Query(None, description="Filter by priority; repeat or comma-separate for several"),
+    due_before: Optional[datetime] = Query(None, description="Only tasks due before this time"),
+    due_after: Optional[datetime] = Query(None, description="Only tasks due at or after this time"),
+    overdue: Optional[bool] = Query(None, description="Only tasks past their due date and not completed (or the opposite)"),
+    created_after: Optional[datetime] = Query(None, description="Only tasks created at or after this time"),
+    q: Optional[str] = Query(None, min_length=1, max_length=200, description="Full-text search over title and description"),
+    sort: Optional[str] = Query(
+        None, pattern="^(relevance|created_at|updated_at|due_date|priority)$",
+        description="Sort order; defaults to relevance when searching, created_at otherwise"
+    ),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page"),
     limit: int = Query(100, ge=1, le=100, description="Limit number of results"),
-    offset: int = Query(0, ge=0, description="Offset for pagination")
+    offset: int = Query(0, ge=0, description="Offset for pagination (ignored when a cursor is given)"),
+    if_none_match: Optional[str] = Header(None)
 ):
     """
     Get all tasks for the authenticated user with optional filtering.
+    Results are returned in a stable order; when more results exist the
+    cursor for the next page is returned in the X-Next-Cursor header.
+    Responds 304 when If-None-Match carries the current ETag of the page.
+    Search results sorted by relevance are paged with offset only.
     """
-    # Start with base query filtered by user
-    query = select(Task).where(Task.user_id == current_user.id)
-    
-    # Apply filters if provided
-    if completed is not None:
-        query = query.where(Task.completed == completed)
+    if sort is None or (sort == "relevance" and not q):
+        sort = "relevance" if q else "created_at"
+    if sort == "relevance" and cursor:
+        raise HTTPException(status_code=400, detail="Relevance order is paged with offset, not cursors")
+
+    try:
+        filters = TaskFilters(
+            completed=completed, priority=priority, due_before=due_before, due_after=due_after,
+            overdue=overdue, created_after=created_after, q=q
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    # "overdue" depends on the clock, not only on writes, so it is never cached
+    if overdue is None:
+        version = await get_task_version(session, current_user.id)
+        etag = collection_etag(version, {
+            **filters.model_dump(mode="json"), "sort": sort, "cursor": cursor, "limit": limit, "offset": offset
+        })
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        response.headers["ETag"] = etag
+
+    query, rank = build_task_query(current_user.id, filters, session.get_bind().dialect.name)
     
-    if priority is not None:
-        query = query.where(Task.priority == priority)
+    if sort == "relevance":
+        result = await session.exec(order_by_relevance(query, rank, limit, offset))
+        return result.all()
     
-    # Apply pagination
-    query = query.offset(offset).limit(limit)
+    # Apply keyset pagination, falling back to offset for existing clients
+    query = paginate_tasks(query, sort, limit, cursor)
+    if offset and not cursor:
+        query = query.offset(offset)
     
-    tasks = session.exec(query).all()
+    result = await session.exec(query)
+    tasks, next_cursor = split_task_page(result.all(), sort, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return tasks
 
 
+@router.get("/stats", response_model=TaskStats)
+async def get_stats(
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_read_session)
+):
+    """
+    Totals, completed, pending and overdue counts plus a per-priority
+    breakdown of the user's tasks. Served from cache until the user's tasks
+    change, so an idle dashboard costs one primary key lookup.
+    """
+    version = await get_task_version(session, current_user.id)
+    key = f"{current_user.id}:{version}"
+    cached = task_stats_cache.get(key)
+    if cached is not None:
+        return TaskStats.model_validate(cached)
+
+    stats = await get_task_stats(session, current_user.id)
+    task_stats_cache.set(key, stats.model_dump())
+    return stats
+
+
+@router.get("/changes", response_model=TaskChanges)
+async def get_task_changes(
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_read_session),
+    since: int = Query(0, ge=0, description="Token returned by the previous sync; 0 for a full sync")
+):
+    """
+    Delta sync: tasks created or updated since the token, plus the IDs of
+    tasks deleted since then. Pass the returned token as `since` next time.
+    """
+    # Read the version first: anything committed meanwhile is sent again next time, never skipped
+    token = await get_task_version(session, current_user.id)
+    tasks, deleted = await get_changes(session, current_user.id, since)
+    return TaskChanges(token=max(token, since), tasks=tasks, deleted=deleted)
+
+
+@router.get("/events")
+async def task_events(
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_read_session)
+):
+    """
+    Server-Sent Events stream of the user's task changes.
+    Starts with a "ready" event carrying the current sync token, then sends
+    "task.created", "task.updated" and "task.deleted" events as they are
+    committed, and "resync" if the client fell behind and should catch up
+    through /changes. Comment lines are sent as keep-alives while idle.
+    """
+    user_id = current_user.id
+
+    async def event_stream() -> AsyncIterator[str]:
+        async with subscribe_task_events(user_id) as messages:
+            # Subscribed before reading the token, so no change falls in between
+            token = await get_task_version(session, user_id)
+            # Do not hold a pooled connection for the life of the stream
+            await session.close()
+            yield format_sse("ready", {"token": token})
+
+            async for message in messages:
+                if message is None:
+                    yield ": keep-alive\n\n"
+                else:
+                    yield format_sse(message["type"], message)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.post("/", response_model=TaskPublic)
-def create_task(
+async def create_task(
     task: TaskCreate,
+    response: Response,
     current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """
     Create a new task for the authenticated user.
@@ -56,26 +182,182 @@ def create_task(
     task_dict['id'] = None  # Ensure a new ID is generated
     task_dict['created_at'] = datetime.utcnow()
     task_dict['updated_at'] = datetime.utcnow()
+    task_dict['change_seq'] = await bump_task_version(session, current_user.id)
     
     db_task = Task(**task_dict)
     
     session.add(db_task)
-    session.commit()
-    session.refresh(db_task)
+    await session.commit()
+    await session.refresh(db_task)
+    await publish_task_event(current_user.id, "created", db_task.change_seq, task=db_task)
     
+    response.headers["ETag"] = task_etag(db_task)
     return db_task
 
 
+async def check_ownership(
+    session: AsyncSession,
+    task_ids: Sequence[UUID],
+    user_id: UUID
+) -> Dict[UUID, TaskBulkResult]:
+    """
+    Look up the owners of many tasks in one query.
+    Returns a failed result for every ID the user may not touch.
+    """
+    result = await session.exec(select(Task.id, Task.user_id).where(Task.id.in_(set(task_ids))))
+    owners = dict(result.all())
+
+    failures = {}
+    for task_id in task_ids:
+        if task_id not in owners:
+            failures[task_id] = TaskBulkResult(id=task_id, status=404, error="Task not found")
+        elif owners[task_id] != user_id:
+            failures[task_id] = TaskBulkResult(id=task_id, status=403, error="Not authorized to update this task")
+    return failures
+
+
+async def load_tasks(session: AsyncSession, task_ids: Sequence[UUID]) -> Dict[UUID, Task]:
+    if not task_ids:
+        return {}
+    result = await session.exec(
+        select(Task).where(Task.id.in_(set(task_ids))).execution_options(populate_existing=True)
+    )
+    return {task.id: task for task in result.all()}
+
+
+def bulk_results(
+    task_ids: Sequence[UUID],
+    failures: Dict[UUID, TaskBulkResult],
+    tasks: Dict[UUID, Task]
+) -> List[TaskBulkResult]:
+    return [
+        failures.get(task_id) or TaskBulkResult(id=task_id, status=200, task=tasks.get(task_id))
+        for task_id in task_ids
+    ]
+
+
+@router.post("/bulk/create", response_model=List[TaskBulkResult])
+async def bulk_create_tasks(
+    bulk: TaskBulkCreate,
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Create many tasks for the authenticated user in one transaction.
+    """
+    change_seq = await bump_task_version(session, current_user.id)
+    now = datetime.utcnow()
+    rows = [
+        {
+            **task.model_dump(), "id": uuid4(), "user_id": current_user.id,
+            "created_at": now, "updated_at": now, "change_seq": change_seq
+        }
+        for task in bulk.tasks
+    ]
+
+    await session.exec(insert(Task), params=rows)
+    await session.commit()
+
+    results = [TaskBulkResult(id=row["id"], status=201, task=TaskPublic(**row)) for row in rows]
+    for result in results:
+        await publish_task_event(current_user.id, "created", change_seq, task=result.task)
+    return results
+
+
+@router.post("/bulk/update", response_model=List[TaskBulkResult])
+async def bulk_update_tasks(
+    bulk: TaskBulkUpdate,
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Update many tasks in one transaction.
+    Each item carries the task ID plus the fields to change.
+    """
+    task_ids = [item.id for item in bulk.tasks]
+    failures = await check_ownership(session, task_ids, current_user.id)
+
+    owned = [item for item in bulk.tasks if item.id not in failures]
+    if owned:
+        change_seq = await bump_task_version(session, current_user.id)
+        now = datetime.utcnow()
+        rows = [
+            {**item.model_dump(exclude_unset=True), "updated_at": now, "change_seq": change_seq}
+            for item in owned
+        ]
+        # UPDATE ... WHERE id = :id, executed as one batch per set of columns
+        await session.exec(update(Task), params=rows)
+    await session.commit()
+
+    tasks = await load_tasks(session, [item.id for item in owned])
+    for task in tasks.values():
+        await publish_task_event(current_user.id, "updated", task.change_seq, task=task)
+    return bulk_results(task_ids, failures, tasks)
+
+
+@router.post("/bulk/complete", response_model=List[TaskBulkResult])
+async def bulk_complete_tasks(
+    bulk: TaskBulkComplete,
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Mark many tasks as completed (or not completed) in one statement.
+    """
+    failures = await check_ownership(session, bulk.ids, current_user.id)
+    owned = [task_id for task_id in bulk.ids if task_id not in failures]
+
+    if owned:
+        change_seq = await bump_task_version(session, current_user.id)
+        await session.exec(
+            update(Task)
+            .where(Task.id.in_(set(owned)))
+            .values(completed=bulk.completed, updated_at=datetime.utcnow(), change_seq=change_seq)
+        )
+    await session.commit()
+
+    tasks = await load_tasks(session, owned)
+    for task in tasks.values():
+        await publish_task_event(current_user.id, "updated", task.change_seq, task=task)
+    return bulk_results(bulk.ids, failures, tasks)
+
+
+@router.post("/bulk/delete", response_model=List[TaskBulkResult])
+async def bulk_delete_tasks(
+    bulk: TaskBulkDelete,
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Delete many tasks in one statement.
+    """
+    failures = await check_ownership(session, bulk.ids, current_user.id)
+    owned = [task_id for task_id in bulk.ids if task_id not in failures]
+
+    if owned:
+        change_seq = await bump_task_version(session, current_user.id)
+        await session.exec(delete(Task).where(Task.id.in_(set(owned))))
+        await record_task_deletions(session, current_user.id, owned, change_seq)
+    await session.commit()
+
+    for task_id in dict.fromkeys(owned):
+        await publish_task_event(current_user.id, "deleted", change_seq, task_id=task_id)
+    return bulk_results(bulk.ids, failures, {})
+
+
 @router.get("/{task_id}", response_model=TaskPublic)
-def get_task(
+async def get_task(
     task_id: UUID,
+    response: Response,
     current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_read_session),
+    if_none_match: Optional[str] = Header(None)
 ):
     """
     Get a specific task by ID.
+    Responds 304 when If-None-Match carries the task's current ETag.
     """
-    task = session.get(Task, task_id)
+    task = await session.get(Task, task_id)
     
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
@@ -84,20 +366,27 @@ def get_task(
     if task.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to access this task")
     
+    etag = task_etag(task)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
     return task
 
 
 @router.put("/{task_id}", response_model=TaskPublic)
-def update_task(
+async def update_task(
     task_id: UUID,
     task_update: TaskUpdate,
+    response: Response,
     current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session),
+    if_match: Optional[str] = Header(None)
 ):
     """
     Update a specific task by ID.
+    With If-Match, the update only applies if the task is unchanged (412 otherwise).
     """
-    db_task = session.get(Task, task_id)
+    db_task = await session.get(Task, task_id)
     
     if not db_task:
         raise HTTPException(status_code=404, detail="Task not found")
@@ -106,6 +395,13 @@ def update_task(
     if db_task.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to update this task")
     
+    # Take the user's write lock before comparing ETags, and compare against
+    # the committed row, so two writers holding the same ETag cannot both pass
+    change_seq = await bump_task_version(session, current_user.id)
+    db_task = await session.get(Task, task_id, populate_existing=True)
+    check_if_match(if_match, db_task)
+    db_task.change_seq = change_seq
+    
     # Update task fields
     update_data = task_update.dict(exclude_unset=True)
     for field, value in update_data.items():
@@ -115,22 +411,24 @@ def update_task(
     db_task.updated_at = datetime.utcnow()
     
     session.add(db_task)
-    session.commit()
-    session.refresh(db_task)
+    await session.commit()
+    await session.refresh(db_task)
+    await publish_task_event(current_user.id, "updated", db_task.change_seq, task=db_task)
     
+    response.headers["ETag"] = task_etag(db_task)
     return db_task
 
 
 @router.delete("/{task_id}")
-def delete_task(
+async def delete_task(
     task_id: UUID,
     current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """
     Delete a specific task by ID.
     """
-    task = session.get(Task, task_id)
+    task = await session.get(Task, task_id)
     
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
@@ -139,22 +437,28 @@ def delete_task(
     if task.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to delete this task")
     
-    session.delete(task)
-    session.commit()
+    change_seq = await bump_task_version(session, current_user.id)
+    await session.delete(task)
+    await record_task_deletions(session, current_user.id, [task.id], change_seq)
+    await session.commit()
+    await publish_task_event(current_user.id, "deleted", change_seq, task_id=task_id)
     
     return {"message": "Task deleted successfully"}
 
 
 @router.patch("/{task_id}/complete", response_model=TaskPublic)
-def toggle_task_completion(
+async def toggle_task_completion(
     task_id: UUID,
+    response: Response,
     current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session),
+    if_match: Optional[str] = Header(None)
 ):
     """
     Toggle the completion status of a specific task.
+    With If-Match, the toggle only applies if the task is unchanged (412 otherwise).
     """
-    task = session.get(Task, task_id)
+    task = await session.get(Task, task_id)
     
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
@@ -163,12 +467,20 @@ def toggle_task_completion(
     if task.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to update this task")
     
+    # Lock first, then check the committed row (see update_task)
+    change_seq = await bump_task_version(session, current_user.id)
+    task = await session.get(Task, task_id, populate_existing=True)
+    check_if_match(if_match, task)
+    task.change_seq = change_seq
+    
     # Toggle completion status
     task.completed = not task.completed
     task.updated_at = datetime.utcnow()
     
     session.add(task)
-    session.commit()
-    session.refresh(task)
+    await session.commit()
+    await session.refresh(task)
+    await publish_task_event(current_user.id, "updated", task.change_seq, task=task)
     
-    return task
\ No newline at end of file
+    response.headers["ETag"] = task_etag(task)
+    return task
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Benchmark the hot task/chat queries before and after the index migrations
+(0002 composite indexes, 0006 and 0008 for the task orderings) on a seeded
+SQLite database.
+
+For every query this prints the SQLite query plan and the median latency,
+first at revision 0001 (no composite indexes) and then at head. Task
+pages are measured at the start and halfway through a user's tasks, with
+the keyset condition in its OR-expanded and its row-value form.
+
+Usage (from the backend directory):
+    python benchmarks/query_plans.py --users 50 --tasks-per-user 2000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import Column, MetaData, Table, create_engine, insert, text  # noqa: E402
+
+from database import run_migrations  # noqa: E402
+from models.conversation import Conversation  # noqa: E402
+from models.message import Message  # noqa: E402
+from models.task import Task  # noqa: E402
+from models.user import User  # noqa: E402
+
+
+QUERIES = {
+    "tasks by status and priority": (
+        "SELECT * FROM task WHERE user_id = :user_id AND completed = 0 AND priority = 'high'"
+    ),
+    "task page (created_at keyset)": (
+        "SELECT * FROM task WHERE user_id = :user_id "
+        "ORDER BY created_at DESC, id DESC LIMIT 101"
+    ),
+    # Halfway through the user's tasks; the cursor is the row at that depth
+    "deep task page (OR-expanded keyset)": (
+        "SELECT * FROM task WHERE user_id = :user_id "
+        "AND (created_at < :cursor_created_at OR (created_at = :cursor_created_at AND id < :cursor_id)) "
+        "ORDER BY created_at DESC, id DESC LIMIT 101"
+    ),
+    "deep task page (row-value keyset)": (
+        "SELECT * FROM task WHERE user_id = :user_id "
+        "AND (created_at, id) < (:cursor_created_at, :cursor_id) "
+        "ORDER BY created_at DESC, id DESC LIMIT 101"
+    ),
+    # Same ORDER BY expressions as the due_date and priority sorts in utils/pagination.py
+    "task page (due_date sort)": (
+        "SELECT * FROM task WHERE user_id = :user_id "
+        "ORDER BY CASE WHEN (task.due_date IS NULL) THEN 1 ELSE 0 END, task.due_date, task.id LIMIT 101"
+    ),
+    "task page (priority sort)": (
+        "SELECT * FROM task WHERE user_id = :user_id "
+        "ORDER BY CASE WHEN (task.priority = 'high') THEN 3 WHEN (task.priority = 'medium') THEN 2 "
+        "WHEN (task.priority = 'low') THEN 1 ELSE 0 END DESC, task.created_at DESC, task.id DESC LIMIT 101"
+    ),
+    "conversation list": (
+        "SELECT * FROM conversation WHERE user_id = :user_id ORDER BY updated_at DESC"
+    ),
+    "latest conversation": (
+        "SELECT * FROM conversation WHERE user_id = :user_id ORDER BY created_at DESC LIMIT 1"
+    ),
+    "last 10 messages": (
+        "SELECT * FROM message WHERE conversation_id = :conversation_id "
+        "ORDER BY created_at DESC LIMIT 10"
+    ),
+}
+
+
+def seed(engine, users: int, tasks_per_user: int, conversations_per_user: int, messages_per_conversation: int):
+    rng = random.Random(42)
+    base = datetime(2026, 1, 1)
+    user_rows, task_rows, conversation_rows, message_rows = [], [], [], []
+
+    for u in range(users):
+        user_id = uuid.uuid4()
+        user_rows.append({"id": user_id, "email": f"user{u}@example.com", "hashed_password": "x", "created_at": base})
+        for t in range(tasks_per_user):
+            created = base + timedelta(minutes=t)
+            task_rows.append({
+                "id": uuid.uuid4(),
+                "user_id": user_id,
+                "title": f"Task {t}",
+                "description": None,
+                "completed": rng.random() < 0.5,
+                "priority": rng.choice(["low", "medium", "high"]),
+                "due_date": created + timedelta(days=rng.randint(0, 30)) if rng.random() < 0.7 else None,
+                "created_at": created,
+                "updated_at": created,
+            })
+        for c in range(conversations_per_user):
+            conversation_id = uuid.uuid4()
+            started = base + timedelta(hours=c)
+            conversation_rows.append({
+                "id": conversation_id, "user_id": user_id, "created_at": started, "updated_at": started,
+            })
+            for m in range(messages_per_conversation):
+                message_rows.append({
+                    "id": uuid.uuid4(),
+                    "conversation_id": conversation_id,
+                    "user_id": user_id,
+                    "role": "user" if m % 2 == 0 else "assistant",
+                    "content": f"Message {m}",
+                    "created_at": started + timedelta(seconds=m),
+                })
+
+    # The database is at an older revision than the models: insert through
+    # copies of the model tables limited to the columns that exist there
+    existing = MetaData()
+    existing.reflect(engine)
+    seeded = MetaData()
+
+    def table(model):
+        columns = existing.tables[model.__tablename__].columns.keys()
+        return Table(model.__tablename__, seeded, *(
+            Column(c.name, c.type, primary_key=c.primary_key) for c in model.__table__.columns if c.name in columns
+        ))
+
+    with engine.begin() as conn:
+        conn.execute(insert(table(User)), user_rows)
+        conn.execute(insert(table(Task)), task_rows)
+        conn.execute(insert(table(Conversation)), conversation_rows)
+        conn.execute(insert(table(Message)), message_rows)
+
+    return user_rows[len(user_rows) // 2]["id"], conversation_rows[len(conversation_rows) // 2]["id"]
+
+
+def measure(engine, params, repeat: int):
+    results = {}
+    with engine.connect() as conn:
+        for name, sql in QUERIES.items():
+            plan = conn.execute(text("EXPLAIN QUERY PLAN " + sql), params).fetchall()
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                conn.execute(text(sql), params).fetchall()
+                timings.append(time.perf_counter() - start)
+            results[name] = (" | ".join(row[-1] for row in plan), statistics.median(timings) * 1000)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--tasks-per-user", type=int, default=2000)
+    parser.add_argument("--conversations-per-user", type=int, default=20)
+    parser.add_argument("--messages-per-conversation", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        run_migrations(database_url, revision="0001")
+        engine = create_engine(database_url)
+
+        print("Seeding database...")
+        user_id, conversation_id = seed(
+            engine, args.users, args.tasks_per_user, args.conversations_per_user, args.messages_per_conversation
+        )
+        # SQLite stores UUIDs as 32 character hex strings
+        params = {"user_id": user_id.hex, "conversation_id": conversation_id.hex}
+        with engine.connect() as conn:
+            params["cursor_created_at"], params["cursor_id"] = conn.execute(text(
+                "SELECT created_at, id FROM task WHERE user_id = :user_id "
+                "ORDER BY created_at DESC, id DESC LIMIT 1 OFFSET :depth"
+            ), {"user_id": params["user_id"], "depth": args.tasks_per_user // 2}).one()
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+
+        before = measure(engine, params, args.repeat)
+        run_migrations(database_url)
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+        after = measure(engine, params, args.repeat)
+        engine.dispose()
+
+    for name in QUERIES:
+        plan_before, ms_before = before[name]
+        plan_after, ms_after = after[name]
+        print(f"\n{name}")
+        print(f"  before: {ms_before:8.3f} ms  {plan_before}")
+        print(f"  after:  {ms_after:8.3f} ms  {plan_after}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Compare reader/writer throughput on SQLite with the driver defaults and with
+the performance profile from database.py (WAL, synchronous=NORMAL,
+busy_timeout, mmap, cache size, plus a separate read-only pool).
+
+Reader threads run the task list query the API uses while writer threads
+add tasks the way the API does: load the owner, then bump their task
+version and insert the task in one transaction. Reading before writing is
+what makes deferred transactions fail under WAL, so the tuned profile must
+finish without a single "database is locked" error.
+
+Usage (from the backend directory):
+    python benchmarks/sqlite_concurrency.py --readers 8 --writers 2 --seconds 10
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import create_engine, insert, select, text, update  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlmodel import Session  # noqa: E402
+
+from database import configure_sqlite_engine, run_migrations, _import_models  # noqa: E402
+from models.task import Task, TaskFilters  # noqa: E402
+from models.user import User  # noqa: E402
+from utils.pagination import paginate_tasks  # noqa: E402
+from utils.task_query import build_task_query  # noqa: E402
+
+
+def seed(engine, users: int, tasks_per_user: int):
+    user_ids = [uuid.uuid4() for _ in range(users)]
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(User.__table__), [
+            {"id": user_id, "email": f"user{u}@example.com", "hashed_password": "x", "created_at": now, "task_version": 0}
+            for u, user_id in enumerate(user_ids)
+        ])
+        conn.execute(insert(Task.__table__), [
+            {"id": uuid.uuid4(), "user_id": user_id, "title": f"task {t}", "completed": t % 2 == 0,
+             "priority": "medium", "created_at": now, "updated_at": now, "change_seq": 0}
+            for user_id in user_ids for t in range(tasks_per_user)
+        ])
+    return user_ids
+
+
+def run(read_engine, write_engine, user_ids, readers: int, writers: int, seconds: float):
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def count(key):
+        with lock:
+            counts[key] += 1
+
+    def reader(n: int):
+        user_id = user_ids[n % len(user_ids)]
+        query = paginate_tasks(build_task_query(user_id, TaskFilters(completed=False), "sqlite")[0], "created_at", 50, None)
+        while time.perf_counter() < deadline:
+            try:
+                with Session(read_engine) as session:
+                    session.exec(query).all()
+                count("reads")
+            except OperationalError:
+                count("errors")
+
+    def writer(n: int):
+        user_id = user_ids[n % len(user_ids)]
+        while time.perf_counter() < deadline:
+            try:
+                with write_engine.begin() as conn:
+                    # Handlers load the user (or task) before they write
+                    conn.execute(
+                        select(User.__table__).where(User.__table__.c.id == user_id)
+                    ).one()
+                    change_seq = conn.execute(
+                        update(User.__table__).where(User.__table__.c.id == user_id)
+                        .values(task_version=User.__table__.c.task_version + 1)
+                        .returning(User.__table__.c.task_version)
+                    ).scalar_one()
+                    now = datetime.utcnow()
+                    conn.execute(insert(Task.__table__).values(
+                        id=uuid.uuid4(), user_id=user_id, title="new task", completed=False,
+                        priority="medium", created_at=now, updated_at=now, change_seq=change_seq
+                    ))
+                count("writes")
+            except OperationalError:
+                count("errors")
+
+    threads = [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+    threads += [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--tasks-per-user", type=int, default=1000)
+    args = parser.parse_args()
+
+    _import_models()
+    pool_size = args.readers + args.writers
+    for profile in ("default", "tuned"):
+        with tempfile.TemporaryDirectory() as tmp:
+            database_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+            run_migrations(database_url)
+            write_engine = create_engine(database_url, pool_size=pool_size)
+            if profile == "tuned":
+                configure_sqlite_engine(write_engine)
+                read_engine = create_engine(database_url, pool_size=args.readers)
+                configure_sqlite_engine(read_engine, read_only=True)
+            else:
+                read_engine = write_engine
+            user_ids = seed(write_engine, args.users, args.tasks_per_user)
+            with write_engine.connect() as conn:
+                journal_mode = conn.execute(text("PRAGMA journal_mode")).scalar()
+
+            counts = run(read_engine, write_engine, user_ids, args.readers, args.writers, args.seconds)
+            print(
+                f"{profile:8} journal_mode={journal_mode:8} "
+                f"reads/s={counts['reads'] / args.seconds:10.1f} "
+                f"writes/s={counts['writes'] / args.seconds:8.1f} "
+                f"lock errors={counts['errors']}"
+            )
+            read_engine.dispose()
+            write_engine.dispose()
+            if profile == "tuned" and counts["errors"]:
+                sys.exit(f"tuned profile hit {counts['errors']} lock errors")
+
+
+if __name__ == "__main__":
+    main()
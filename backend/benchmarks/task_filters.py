@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Benchmark the task list filters and sort orders on a large seeded SQLite
+database (1M tasks by default).
+
+Every scenario is built with the same query builder the API and the
+list_tasks MCP tool use, so this prints the plans and median latencies of
+the exact SQL they run.
+
+Usage (from the backend directory):
+    python benchmarks/task_filters.py --users 100 --tasks-per-user 10000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import create_engine, insert, text  # noqa: E402
+from sqlmodel import Session  # noqa: E402
+
+from database import run_migrations, _import_models  # noqa: E402
+from models.task import Task, TaskFilters  # noqa: E402
+from models.user import User  # noqa: E402
+from utils.pagination import paginate_tasks  # noqa: E402
+from utils.task_query import build_task_query, order_by_relevance  # noqa: E402
+
+
+NOW = datetime(2026, 6, 1)
+WORDS = ["report", "groceries", "invoice", "meeting", "plumber", "dentist", "budget", "review", "deploy", "call"]
+
+SCENARIOS = {
+    "open tasks, newest first": (TaskFilters(completed=False), "created_at"),
+    "high or medium priority": (TaskFilters(priority=["high", "medium"]), "priority"),
+    "overdue": (TaskFilters(overdue=True), "due_date"),
+    "due in the next week": (TaskFilters(due_after=NOW, due_before=NOW + timedelta(days=7)), "due_date"),
+    "created in the last 30 days": (TaskFilters(created_after=NOW - timedelta(days=30)), "created_at"),
+    "recently updated": (TaskFilters(), "updated_at"),
+    "search, by relevance": (TaskFilters(q="budg"), "relevance"),
+}
+
+
+def seed(engine, users: int, tasks_per_user: int, batch_size: int = 50000):
+    rng = random.Random(42)
+    user_ids = [uuid.uuid4() for _ in range(users)]
+    start = NOW - timedelta(days=365)
+
+    with engine.begin() as conn:
+        conn.execute(insert(User.__table__), [
+            {"id": user_id, "email": f"user{u}@example.com", "hashed_password": "x", "created_at": start, "task_version": 0}
+            for u, user_id in enumerate(user_ids)
+        ])
+        rows = []
+        for user_id in user_ids:
+            for t in range(tasks_per_user):
+                created = start + timedelta(minutes=rng.randint(0, 365 * 24 * 60))
+                rows.append({
+                    "id": uuid.uuid4(),
+                    "user_id": user_id,
+                    "title": f"{rng.choice(WORDS)} {rng.choice(WORDS)} {t}",
+                    "description": rng.choice(WORDS) if rng.random() < 0.5 else None,
+                    "completed": rng.random() < 0.5,
+                    "priority": rng.choice(["low", "medium", "high"]),
+                    "due_date": created + timedelta(days=rng.randint(0, 60)) if rng.random() < 0.7 else None,
+                    "created_at": created,
+                    "updated_at": created + timedelta(hours=rng.randint(0, 48)),
+                    "change_seq": 0,
+                })
+                if len(rows) >= batch_size:
+                    conn.execute(insert(Task.__table__), rows)
+                    rows = []
+        if rows:
+            conn.execute(insert(Task.__table__), rows)
+        conn.execute(text("ANALYZE"))
+
+    return user_ids[len(user_ids) // 2]
+
+
+def build(user_id, filters: TaskFilters, sort: str, limit: int):
+    query, rank = build_task_query(user_id, filters, "sqlite", now=NOW)
+    if sort == "relevance":
+        return order_by_relevance(query, rank, limit)
+    return paginate_tasks(query, sort, limit, None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--tasks-per-user", type=int, default=10000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    _import_models()
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        run_migrations(database_url)
+        engine = create_engine(database_url)
+
+        print(f"Seeding {args.users * args.tasks_per_user} tasks...")
+        started = time.perf_counter()
+        user_id = seed(engine, args.users, args.tasks_per_user)
+        print(f"Seeded in {time.perf_counter() - started:.1f}s")
+
+        with Session(engine) as session:
+            for name, (filters, sort) in SCENARIOS.items():
+                query = build(user_id, filters, sort, args.limit)
+                compiled = query.compile(engine, compile_kwargs={"literal_binds": True})
+                plan = session.connection().execute(text(f"EXPLAIN QUERY PLAN {compiled}")).fetchall()
+                timings = []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    rows = session.exec(query).all()
+                    timings.append(time.perf_counter() - start)
+                    session.expunge_all()
+                print(f"\n{name} (sort={sort}, {len(rows)} rows)")
+                print(f"  {statistics.median(timings) * 1000:8.3f} ms  {' | '.join(row[-1] for row in plan)}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,86 @@
-from pydantic_settings import BaseSettings
-from typing import Optional
+from pydantic import field_validator
+from pydantic_settings import BaseSettings, NoDecode
+from typing import Annotated, List, Optional
 
 
 class Settings(BaseSettings):
     # Database settings
     database_url: str = "sqlite:///./todo_app.db"  # Default to SQLite for development
+    # Async driver URL; derived from database_url when not set
+    async_database_url: Optional[str] = None
+
+    # Read replicas of database_url (comma-separated). Read-only endpoints
+    # use them, except for users who wrote within read_your_writes_seconds.
+    database_replica_urls: Annotated[List[str], NoDecode] = []
+    read_your_writes_seconds: float = 5.0
+
+    # Connection pool settings (ignored for SQLite)
+    db_pool_size: int = 20
+    db_max_overflow: int = 10
+    db_pool_timeout: int = 30  # seconds to wait for a free connection
+    db_pool_recycle: int = 1800  # seconds before a connection is recycled
+    db_pool_pre_ping: bool = True
+
+    # SQLite tuning, applied to every connection (ignored for other databases)
+    sqlite_journal_mode: str = "wal"  # readers no longer block on the writer
+    sqlite_synchronous: str = "normal"  # safe with WAL; fsync at checkpoints, not every commit
+    sqlite_busy_timeout_ms: int = 5000  # wait for a lock instead of failing at once
+    sqlite_mmap_size: int = 268435456  # bytes of the database file to memory-map
+    sqlite_cache_size_kib: int = 65536  # page cache per connection
+    sqlite_foreign_keys: bool = True
+    # Read-only connections serving GET endpoints
+    sqlite_read_pool_size: int = 10
+
+    # Query instrumentation, served by /api/v1/metrics/queries
+    query_metrics_enabled: bool = True
+    slow_query_threshold_ms: float = 200.0
+    slow_query_samples: int = 50  # most recent slow queries kept
+
+    # Request tracing: spans for requests, chat stages, OpenAI calls, MCP
+    # tools and SQL statements. Exporter: console, file (tracing_file) or
+    # otel (the OpenTelemetry SDK configured for the process)
+    tracing_enabled: bool = False
+    tracing_exporter: str = "console"
+    tracing_file: str = "traces.jsonl"
+    tracing_service_name: str = "todo-backend"
 
     # JWT settings
     jwt_secret_key: str = "your-super-secret-jwt-key-here-make-it-long-and-random"
     jwt_algorithm: str = "HS256"
     access_token_expire_minutes: int = 10080  # 7 days
 
+    # Token -> user resolution cache
+    user_cache_enabled: bool = True
+    user_cache_ttl_seconds: int = 300
+    user_cache_max_size: int = 10000
+    user_cache_backend: str = "memory"  # memory or redis
+    user_cache_redis_url: Optional[str] = None
+
+    # Task statistics cache; entries also expire on every task write
+    task_stats_cache_ttl_seconds: int = 30
+
+    # Password hashing pool
+    password_hash_workers: int = 2
+    password_hash_max_queue: int = 32  # waiting hash jobs before returning 503
+    password_hash_retry_after: int = 1  # seconds, sent in Retry-After
+
+    # Task change notifications (memory or redis; redis requires TASK_EVENTS_REDIS_URL)
+    task_events_backend: str = "memory"
+    task_events_redis_url: Optional[str] = None
+    task_events_queue_size: int = 100  # per subscriber; overflowing subscribers must resync
+    task_events_heartbeat_seconds: float = 15.0
+
+    # Chat context: prompt tokens for system prompt, tool schemas, summary and
+    # history, and the most recent messages considered for it
+    chat_context_token_budget: int = 4000
+    chat_context_messages: int = 50
+    # Older messages outside the context window that trigger a summary update
+    chat_summary_min_messages: int = 20
+    chat_summary_max_tokens: int = 300
+
+    # MCP tool calls from one chat turn that may run at once for a user
+    mcp_max_parallel_tools_per_user: int = 4
+
     # Better Auth settings (for compatibility with frontend)
     better_auth_secret: str = "your-better-auth-secret-key-here"
 
@@ -26,9 +96,25 @@ class Settings(BaseSettings):
 
     # OpenAI API Key
     openai_api_key: Optional[str] = None
+    # Base URL of an OpenAI-compatible API; None uses api.openai.com
+    openai_base_url: Optional[str] = None
+    openai_model: str = "gpt-3.5-turbo"
+    openai_timeout: float = 60.0  # seconds per request
+    openai_connect_timeout: float = 5.0
+    openai_max_retries: int = 2
+    openai_max_connections: int = 100
+    openai_max_keepalive_connections: int = 20
+    openai_max_concurrency: int = 50  # LLM calls in flight per process
+
+    @field_validator("database_replica_urls", mode="before")
+    @classmethod
+    def split_urls(cls, v):
+        if isinstance(v, str):
+            return [url.strip() for url in v.split(",") if url.strip()]
+        return v
 
     class Config:
         env_file = ".env"
 
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
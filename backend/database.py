@@ -1,24 +1,270 @@
+import os
+import random
+from contextvars import ContextVar
+from uuid import UUID
 from sqlmodel import create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import event, inspect
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from config import settings
-from typing import Generator
+from utils.cache import mark_recent_write, wrote_recently
+from utils.metrics import instrument_engine, register_pool_metrics
+from utils import tracing
+from typing import AsyncGenerator, Generator, List, Optional, Sequence
 
 
 # Create the database engine
 engine = create_engine(
     settings.database_url,
-    echo=True  # Set to True to see SQL queries in the logs
+    echo=settings.debug  # log every SQL statement while debugging
+)
+
+
+def get_async_database_url(database_url: str) -> str:
+    """
+    Map a sync database URL onto its async driver equivalent.
+    """
+    url = make_url(database_url)
+    if url.drivername in ("sqlite", "sqlite+pysqlite"):
+        url = url.set(drivername="sqlite+aiosqlite")
+    elif url.drivername in ("postgresql", "postgres", "postgresql+psycopg2"):
+        # asyncpg does not understand libpq-only query options
+        query = {k: v for k, v in url.query.items() if k not in ("sslmode", "channel_binding")}
+        url = url.set(drivername="postgresql+asyncpg", query=query)
+    return url.render_as_string(hide_password=False)
+
+
+def get_async_engine_options(database_url: str) -> dict:
+    """
+    Build create_async_engine() keyword arguments for the given URL.
+    """
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite":
+        # SQLite has no server-side pool to size
+        return {}
+
+    options = {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+    sslmode = url.query.get("sslmode")
+    if sslmode in ("require", "verify-ca", "verify-full"):
+        options["connect_args"] = {"ssl": "require" if sslmode == "require" else True}
+    return options
+
+
+def sqlite_pragmas(read_only: bool = False) -> List[str]:
+    """
+    Per-connection PRAGMAs of the SQLite performance profile.
+    """
+    pragmas = [
+        f"PRAGMA journal_mode={settings.sqlite_journal_mode}",
+        f"PRAGMA synchronous={settings.sqlite_synchronous}",
+        f"PRAGMA busy_timeout={settings.sqlite_busy_timeout_ms}",
+        f"PRAGMA mmap_size={settings.sqlite_mmap_size}",
+        f"PRAGMA cache_size=-{settings.sqlite_cache_size_kib}",  # negative means KiB
+        f"PRAGMA foreign_keys={'ON' if settings.sqlite_foreign_keys else 'OFF'}",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only=ON")
+    return pragmas
+
+
+def configure_sqlite_engine(engine: Engine, read_only: bool = False) -> None:
+    """
+    Apply the SQLite profile to every new connection of `engine`. Pass the
+    sync_engine of an async engine.
+
+    SQLAlchemy also takes over transaction control: the sqlite3 driver
+    otherwise defers BEGIN until the first write, so a SAVEPOINT opened
+    before it becomes the outermost transaction and releasing it commits.
+    Transactions on writable engines start with BEGIN IMMEDIATE, taking the
+    write lock up front: handlers read before they write, and under WAL a
+    deferred transaction whose snapshot went stale cannot upgrade to a
+    writer (SQLITE_BUSY_SNAPSHOT), however long busy_timeout is. Read-only
+    engines keep a deferred BEGIN so readers never wait for the writer.
+    """
+    begin = "BEGIN" if read_only else "BEGIN IMMEDIATE"
+
+    @event.listens_for(engine, "connect")
+    def _configure_connection(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in sqlite_pragmas(read_only):
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def _begin(connection):
+        connection.exec_driver_sql(begin)
+
+
+def is_sqlite_file(database_url: str) -> bool:
+    url = make_url(database_url)
+    return url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:")
+
+
+# User whose request is being served, for read-your-writes routing
+session_user_id: ContextVar[Optional[UUID]] = ContextVar("session_user_id", default=None)
+
+
+def set_session_user(user_id: UUID) -> None:
+    """
+    Record the user the current request acts for. Sessions send that
+    user's reads to the primary for a while after they write.
+    """
+    session_user_id.set(user_id)
+
+
+class RoutingSession(Session):
+    """
+    Session that spreads reads over replicas.
+
+    Writes, and every statement of a transaction that has written, go to the
+    primary (the session's bind). Other statements go to a replica when the
+    session was opened with info={"replica_reads": True} or the statement
+    has the `replica_reads` execution option, unless the current user wrote
+    within settings.read_your_writes_seconds.
+    """
+
+    def __init__(self, *args, replicas: Sequence[Engine] = (), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replicas = list(replicas)
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.info["wrote"] = True
+        elif self.replicas and not self.info.get("wrote") and self._replica_allowed(clause):
+            # One replica per session, so its reads see a single snapshot
+            if "replica" not in self.info:
+                self.info["replica"] = random.choice(self.replicas)
+            return self.info["replica"]
+        return super().get_bind(mapper, clause=clause, **kwargs)
+
+    def _replica_allowed(self, clause) -> bool:
+        if not (self.info.get("replica_reads") or (
+            clause is not None and clause.get_execution_options().get("replica_reads")
+        )):
+            return False
+        user_id = session_user_id.get()
+        if user_id is None:
+            return True
+        # Looked up once per session, not for every statement
+        if self.info.get("recent_writer", (None,))[0] != user_id:
+            self.info["recent_writer"] = (user_id, wrote_recently(user_id))
+        return not self.info["recent_writer"][1]
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _remember_write(session):
+    user_id = session_user_id.get()
+    if session.info.pop("wrote", False) and user_id is not None:
+        mark_recent_write(user_id)
+        session.info.pop("recent_writer", None)
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _forget_write(session):
+    session.info.pop("wrote", None)
+
+
+# Create the async database engine used by the API routers and MCP tools;
+# it is the primary, all writes go through it
+async_database_url = settings.async_database_url or get_async_database_url(settings.database_url)
+async_engine = create_async_engine(
+    async_database_url,
+    echo=settings.debug,
+    **get_async_engine_options(settings.database_url)
+)
+
+replica_engines = [
+    create_async_engine(get_async_database_url(url), echo=settings.debug, **get_async_engine_options(url))
+    for url in settings.database_replica_urls
+]
+
+if is_sqlite_file(settings.database_url):
+    configure_sqlite_engine(engine)
+    configure_sqlite_engine(async_engine.sync_engine)
+    if not replica_engines:
+        # Reads go through a separate pool of query_only connections to the
+        # same file; with WAL they never wait for the writer
+        read_engine = create_async_engine(
+            async_database_url,
+            echo=settings.debug,
+            pool_size=settings.sqlite_read_pool_size,
+            max_overflow=0
+        )
+        configure_sqlite_engine(read_engine.sync_engine, read_only=True)
+        replica_engines.append(read_engine)
+
+if settings.query_metrics_enabled:
+    instrument_engine(engine)
+    for instrumented in (async_engine, *replica_engines):
+        instrument_engine(instrumented.sync_engine)
+
+if tracing.tracer.enabled:
+    tracing.instrument_engine(engine)
+    for traced in (async_engine, *replica_engines):
+        tracing.instrument_engine(traced.sync_engine)
+
+register_pool_metrics({
+    "primary": async_engine.pool,
+    **{f"replica{index}": replica.pool for index, replica in enumerate(replica_engines)}
+})
+
+async_session_maker = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    sync_session_class=RoutingSession,
+    replicas=[replica.sync_engine for replica in replica_engines],
+    expire_on_commit=False
 )
 
 
 def get_session() -> Generator[Session, None, None]:
     """
     Get a database session.
-    This function is meant to be used as a FastAPI dependency.
+    Kept for scripts and tooling that run outside the event loop.
     """
     with Session(engine) as session:
         yield session
 
 
+async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Get an async database session.
+    This function is meant to be used as a FastAPI dependency.
+    """
+    async with async_session_maker() as session:
+        yield session
+
+
+async def get_read_session() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Get an async session for endpoints that only read: its queries go to
+    a replica (on SQLite, the read-only pool) unless the user wrote recently.
+    This function is meant to be used as a FastAPI dependency.
+    """
+    async with async_session_maker(info={"replica_reads": True}) as session:
+        yield session
+
+
+def _import_models():
+    # Register all models on SQLModel.metadata
+    from models.user import User
+    from models.task import Task
+    from models.conversation import Conversation
+    from models.message import Message
+
+
 # Convenience function to create tables
 def create_tables():
     """
@@ -26,10 +272,44 @@ def create_tables():
     This should typically be called once at application startup.
     """
     from sqlmodel import SQLModel
-    from models.user import User
-    from models.task import Task
-    from models.conversation import Conversation
-    from models.message import Message
+    _import_models()
+
+    SQLModel.metadata.create_all(engine)
+
+
+# Search index objects created by raw DDL rather than the models
+SEARCH_INDEX_OBJECTS = ("task_search", "search_vector", "ix_task_search_vector")
+
+
+def include_schema_name(name: Optional[str], type_: str, parent_names: dict) -> bool:
+    """
+    Alembic include_name hook: leave the full-text search objects out of
+    autogenerate comparisons.
+    """
+    return not (name and name.startswith(SEARCH_INDEX_OBJECTS))
+
+
+def run_migrations(database_url: Optional[str] = None, revision: str = "head"):
+    """
+    Bring the database schema up to date with the Alembic migrations.
+    Databases created by the old create_all() startup path are stamped with
+    the initial revision first, so their tables are kept and only the newer
+    migrations run.
+    """
+    from alembic import command
+    from alembic.config import Config
+
+    database_url = database_url or settings.database_url
+    alembic_config = Config(os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini"))
+    alembic_config.attributes["database_url"] = database_url
+    alembic_config.attributes["configure_logger"] = False
+
+    migration_engine = create_engine(database_url, poolclass=NullPool)
+    try:
+        tables = inspect(migration_engine).get_table_names()
+    finally:
+        migration_engine.dispose()
 
-    # Register all models
-    SQLModel.metadata.create_all(engine)
\ No newline at end of file
+    if "user" in tables and "alembic_version" not in tables:
+        command.stamp(alembic_config, "0001")
+    command.upgrade(alembic_config, revision)
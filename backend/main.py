@@ -1,21 +1,37 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from api.v1.auth import router as auth_router
 from api.v1.tasks import router as tasks_router
 from api.v1.chat import router as chat_router
+from api.v1.metrics import router as metrics_router
 from api.chat_simple import router as simple_chat_router
-from database import create_tables
+from fastapi.concurrency import run_in_threadpool
+from database import run_migrations, async_engine
+from utils.security import password_hash_pool
+from utils.llm import create_llm_client
+from utils.metrics import MetricsMiddleware, registry
+from utils.tracing import TracingMiddleware, configure_logging
 from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Create tables on startup
-    create_tables()
+    # Apply pending schema migrations on startup
+    await run_in_threadpool(run_migrations)
+    # Password hashing workers, started up front rather than on the first login
+    password_hash_pool.start()
+    # One OpenAI client per process so connections are reused across requests
+    app.state.llm_client = create_llm_client()
     yield
-    # Cleanup on shutdown if needed
+    if app.state.llm_client is not None:
+        await app.state.llm_client.close()
+    # Release pooled connections and hashing workers on shutdown
+    await async_engine.dispose()
+    password_hash_pool.shutdown()
 
 
+configure_logging()
 app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware
@@ -25,12 +41,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-Request-ID"],
 )
+# Request IDs and root spans for everything below
+app.add_middleware(TracingMiddleware)
+# Outermost, so the timings include every other middleware
+app.add_middleware(MetricsMiddleware)
 
 # Include API routers
 app.include_router(auth_router, prefix="/api/v1/auth", tags=["auth"])
 app.include_router(tasks_router, prefix="/api/v1/tasks", tags=["tasks"])
 app.include_router(chat_router, prefix="/api/v1/chat", tags=["chat"])
+app.include_router(metrics_router, prefix="/api/v1/metrics", tags=["metrics"])
 
 
 @app.get("/")
@@ -38,6 +60,14 @@ def read_root():
     return {"message": "Todo API is running!"}
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """
+    Request, database pool, OpenAI and MCP tool metrics for Prometheus.
+    """
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8080)
\ No newline at end of file
@@ -0,0 +1,95 @@
+"""
+Argument models for the MCP tools.
+
+Each model is both the JSON schema advertised to the AI agent and the
+validator for the arguments it sends back.
+"""
+from typing import List, Literal, Optional
+from uuid import UUID
+
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+
+
+Priority = Literal["low", "medium", "high"]
+SortOrder = Literal["relevance", "created_at", "updated_at", "due_date", "priority"]
+
+
+class ToolArguments(BaseModel):
+    # Unknown arguments are rejected rather than silently dropped
+    model_config = ConfigDict(extra="forbid")
+
+
+class AddTaskArguments(ToolArguments):
+    title: str = Field(min_length=1, description="Title of the task")
+    description: Optional[str] = Field(None, description="Description of the task (optional)")
+    priority: Priority = Field("medium", description="Priority level (default: medium)")
+    due_date: Optional[str] = Field(None, description="Due date in ISO format (optional)")
+
+
+class ListTasksArguments(ToolArguments):
+    completed: Optional[bool] = Field(None, description="Filter by completion status (optional)")
+    priority: Optional[List[Priority]] = Field(
+        None, description="Only tasks with one of these priorities (optional)"
+    )
+    due_before: Optional[str] = Field(None, description="Only tasks due before this ISO date/time (optional)")
+    due_after: Optional[str] = Field(None, description="Only tasks due at or after this ISO date/time (optional)")
+    overdue: Optional[bool] = Field(
+        None, description="Only tasks past their due date and not completed (optional)"
+    )
+    created_after: Optional[str] = Field(
+        None, description="Only tasks created at or after this ISO date/time (optional)"
+    )
+    query: Optional[str] = Field(None, description="Words to search for in titles and descriptions (optional)")
+    sort: Optional[SortOrder] = Field(None, description="Sort order (optional)")
+    limit: int = Field(50, ge=1, le=100, description="Maximum number of tasks to return, up to 100 (optional)")
+
+    @field_validator("priority", mode="before")
+    @classmethod
+    def split_priorities(cls, v):
+        # Models sometimes send "high,medium" instead of an array
+        if isinstance(v, str):
+            return [p.strip() for p in v.split(",") if p.strip()]
+        return v
+
+
+class TaskIdArguments(ToolArguments):
+    task_id: UUID = Field(description="ID of the task")
+
+
+class CompleteTaskArguments(TaskIdArguments):
+    task_id: UUID = Field(description="ID of the task to toggle")
+
+
+class DeleteTaskArguments(TaskIdArguments):
+    task_id: UUID = Field(description="ID of the task to delete")
+
+
+class UpdateTaskArguments(TaskIdArguments):
+    task_id: UUID = Field(description="ID of the task to update")
+    title: Optional[str] = Field(None, min_length=1, description="New title for the task (optional)")
+    description: Optional[str] = Field(None, description="New description for the task (optional)")
+    completed: Optional[bool] = Field(None, description="New completion status (optional)")
+    priority: Optional[Priority] = Field(None, description="New priority level (optional)")
+    due_date: Optional[str] = Field(None, description="New due date in ISO format (optional)")
+
+
+def function_parameters(model: type[BaseModel]) -> dict:
+    """
+    JSON schema for a function's parameters, trimmed to what the chat
+    completions API needs: no titles, and optional fields shown as their
+    plain type rather than anyOf [type, null].
+    """
+    schema = model.model_json_schema()
+    properties = {}
+    for name, prop in schema.get("properties", {}).items():
+        prop = {key: value for key, value in prop.items() if key != "title"}
+        variants = [variant for variant in prop.pop("anyOf", []) if variant.get("type") != "null"]
+        if len(variants) == 1:
+            prop = {**variants[0], **prop}
+        if prop.get("default", "") is None:
+            del prop["default"]
+        properties[name] = prop
+    parameters = {"type": "object", "properties": properties}
+    if schema.get("required"):
+        parameters["required"] = schema["required"]
+    return parameters
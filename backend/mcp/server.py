@@ -4,7 +4,25 @@ Implements the MCP protocol to expose tools for the AI agent
 """
 import asyncio
 import json
-from typing import Dict, Any, Callable
+import time
+from typing import Dict, Any, Callable, Awaitable, AsyncIterator, List, Optional, Sequence, Tuple, Type, Union
+from uuid import UUID
+from pydantic import ValidationError
+from sqlmodel.ext.asyncio.session import AsyncSession
+from config import settings
+from database import async_session_maker
+from utils.events import discard_queued_task_events, publish_queued_task_events, queued_task_event_count
+from utils.metrics import mcp_tool_duration, mcp_tool_errors
+from utils.tracing import span, tracer
+from .schemas import (
+    ToolArguments,
+    AddTaskArguments,
+    ListTasksArguments,
+    CompleteTaskArguments,
+    DeleteTaskArguments,
+    UpdateTaskArguments,
+    function_parameters
+)
 from .tools import (
     add_task_tool,
     list_tasks_tool,
@@ -14,180 +32,296 @@ from .tools import (
 )
 
 
+class Tool:
+    """
+    A registered tool: the coroutine that runs it, the description shown to
+    the AI agent and the model its arguments are validated against.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[..., Awaitable[Dict[str, Any]]],
+        description: str,
+        arguments: Type[ToolArguments]
+    ):
+        self.name = name
+        self.func = func
+        self.description = description
+        self.arguments = arguments
+        self.definition = {
+            "name": name,
+            "description": description,
+            "parameters": function_parameters(arguments)
+        }
+
+
 class MCPServer:
     def __init__(self):
-        self.tools: Dict[str, Callable] = {
-            "add_task": self._wrap_add_task,
-            "list_tasks": self._wrap_list_tasks,
-            "complete_task": self._wrap_complete_task,
-            "delete_task": self._wrap_delete_task,
-            "update_task": self._wrap_update_task
-        }
-    
-    def _wrap_add_task(self, **kwargs) -> Dict[str, Any]:
-        """Wrapper for add_task_tool to handle user_id from context"""
-        user_id = kwargs.pop('user_id', None)
-        if not user_id:
-            return {
-                "success": False,
-                "error": "Missing user_id",
-                "message": "User context is required for this operation"
-            }
-        
-        return add_task_tool(user_id, **kwargs)
-    
-    def _wrap_list_tasks(self, **kwargs) -> Dict[str, Any]:
-        """Wrapper for list_tasks_tool to handle user_id from context"""
-        user_id = kwargs.pop('user_id', None)
-        if not user_id:
-            return {
-                "success": False,
-                "error": "Missing user_id",
-                "message": "User context is required for this operation"
-            }
-        
-        return list_tasks_tool(user_id, **kwargs)
-    
-    def _wrap_complete_task(self, **kwargs) -> Dict[str, Any]:
-        """Wrapper for complete_task_tool to handle user_id from context"""
-        user_id = kwargs.pop('user_id', None)
-        if not user_id:
-            return {
-                "success": False,
-                "error": "Missing user_id",
-                "message": "User context is required for this operation"
-            }
-        
-        return complete_task_tool(user_id, **kwargs)
-    
-    def _wrap_delete_task(self, **kwargs) -> Dict[str, Any]:
-        """Wrapper for delete_task_tool to handle user_id from context"""
-        user_id = kwargs.pop('user_id', None)
-        if not user_id:
-            return {
-                "success": False,
-                "error": "Missing user_id",
-                "message": "User context is required for this operation"
-            }
-        
-        return delete_task_tool(user_id, **kwargs)
-    
-    def _wrap_update_task(self, **kwargs) -> Dict[str, Any]:
-        """Wrapper for update_task_tool to handle user_id from context"""
-        user_id = kwargs.pop('user_id', None)
-        if not user_id:
-            return {
-                "success": False,
-                "error": "Missing user_id",
-                "message": "User context is required for this operation"
-            }
-        
-        return update_task_tool(user_id, **kwargs)
-    
-    def execute_tool(self, tool_name: str, user_id: str, **params) -> Dict[str, Any]:
+        self.tools: Dict[str, Tool] = {}
+        self._tool_definitions: Optional[List[Dict[str, Any]]] = None
+        # Per-user limiter: [semaphore, number of batches using it]
+        self._user_limiters: Dict[str, list] = {}
+
+        self.register_tool("add_task", add_task_tool, "Add a new task to the user's task list", AddTaskArguments)
+        self.register_tool(
+            "list_tasks", list_tasks_tool,
+            "List the user's tasks, with optional filtering, search and sorting", ListTasksArguments
+        )
+        self.register_tool(
+            "complete_task", complete_task_tool, "Toggle the completion status of a task", CompleteTaskArguments
+        )
+        self.register_tool("delete_task", delete_task_tool, "Delete a task from the user's task list", DeleteTaskArguments)
+        self.register_tool("update_task", update_task_tool, "Update properties of an existing task", UpdateTaskArguments)
+        # Build the payload now rather than on the first chat request
+        self.get_tool_definitions()
+
+    def register_tool(
+        self,
+        name: str,
+        func: Callable[..., Awaitable[Dict[str, Any]]],
+        description: str,
+        arguments: Type[ToolArguments]
+    ):
+        """
+        Register a tool. `func` is called as func(session, user_id, **arguments)
+        with the arguments the caller actually set, after validation.
+        """
+        self.tools[name] = Tool(name, func, description, arguments)
+        self._tool_definitions = None
+
+    def get_tool_definitions(self) -> List[Dict[str, Any]]:
+        """
+        The `tools` payload for the chat completions API, built once and
+        shared by every request; callers must not modify it.
+        """
+        if self._tool_definitions is None:
+            self._tool_definitions = [
+                {"type": "function", "function": tool.definition} for tool in self.tools.values()
+            ]
+        return self._tool_definitions
+
+    async def execute_tool(
+        self,
+        tool_name: str,
+        user_id: Union[UUID, str],
+        session: Optional[AsyncSession] = None,
+        /,
+        **params
+    ) -> Dict[str, Any]:
         """
         Execute a tool with the given parameters.
         
         Args:
             tool_name: Name of the tool to execute
             user_id: ID of the user executing the tool
-            **params: Additional parameters for the tool
+            session: The caller's unit of work. The tool runs in a savepoint
+                that is rolled back if it fails, and nothing is committed;
+                see commit(). Without one the tool gets its own session,
+                committed when it succeeds.
+            **params: Additional parameters for the tool, validated against
+                the tool's argument model
         
         Returns:
             Result of the tool execution
         """
-        if tool_name not in self.tools:
+        tool = self.tools.get(tool_name)
+        if tool is None:
             return {
                 "success": False,
                 "error": f"Tool '{tool_name}' not found",
                 "message": f"Tool '{tool_name}' is not available"
             }
-        
-        # Add user_id to params for the wrapper functions
-        params['user_id'] = user_id
-        
+
         try:
-            result = self.tools[tool_name](**params)
-            return result
-        except Exception as e:
+            user_id = UUID(str(user_id)) if user_id else None
+        except ValueError:
+            user_id = None
+        if not user_id:
+            return {
+                "success": False,
+                "error": "Missing user_id",
+                "message": "User context is required for this operation"
+            }
+
+        try:
+            arguments = tool.arguments.model_validate(params).model_dump(exclude_unset=True)
+        except ValidationError as e:
+            mcp_tool_errors.inc(tool=tool_name)
             return {
                 "success": False,
                 "error": str(e),
-                "message": f"Error executing tool '{tool_name}'"
+                "message": f"Invalid arguments for tool '{tool_name}'"
+            }
+
+        started = time.perf_counter()
+        with span("mcp.execute_tool", {"mcp.tool": tool_name}) as tool_span:
+            try:
+                if session is None:
+                    async with async_session_maker() as own_session:
+                        result = await self._run_tool(tool, own_session, user_id, arguments)
+                        if result.get("success") is not False:
+                            await self.commit(own_session)
+                else:
+                    result = await self._run_tool(tool, session, user_id, arguments)
+            except Exception:
+                mcp_tool_errors.inc(tool=tool_name)
+                raise
+            finally:
+                mcp_tool_duration.observe(time.perf_counter() - started, tool=tool_name)
+            if result.get("success") is False:
+                mcp_tool_errors.inc(tool=tool_name)
+                if tracer.enabled:
+                    tracer.set_error(tool_span, str(result.get("error")))
+        return result
+
+    async def _run_tool(self, tool: Tool, session: AsyncSession, user_id: UUID, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        queued = queued_task_event_count(session)
+        savepoint = await session.begin_nested()
+        try:
+            result = await tool.func(session, user_id, **arguments)
+        except Exception as e:
+            result = {
+                "success": False,
+                "error": str(e),
+                "message": f"Error executing tool '{tool.name}'"
             }
-    
+        if result.get("success") is False:
+            await savepoint.rollback()
+            discard_queued_task_events(session, keep=queued)
+        else:
+            await savepoint.commit()
+        return result
+
+    async def commit(self, session: AsyncSession):
+        """
+        Commit the tool calls made in `session` and publish their task
+        events; everything is rolled back if the commit fails.
+        """
+        try:
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            discard_queued_task_events(session)
+            raise
+        await publish_queued_task_events(session)
+
+    def _acquire_limiter(self, user_id: str) -> asyncio.Semaphore:
+        limiter = self._user_limiters.get(user_id)
+        if limiter is None:
+            limiter = self._user_limiters[user_id] = [asyncio.Semaphore(settings.mcp_max_parallel_tools_per_user), 0]
+        limiter[1] += 1
+        return limiter[0]
+
+    def _release_limiter(self, user_id: str):
+        limiter = self._user_limiters[user_id]
+        limiter[1] -= 1
+        if limiter[1] == 0:
+            del self._user_limiters[user_id]
+
+    async def iter_tool_results(
+        self,
+        user_id: Union[UUID, str],
+        calls: Sequence[Tuple[str, str]],
+        session: Optional[AsyncSession] = None
+    ) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Execute several tool calls from one model turn.
+
+        Args:
+            user_id: ID of the user executing the tools
+            calls: (tool name, JSON encoded arguments) pairs, in model order
+            session: Unit of work shared by all the calls. They then run one
+                at a time on its connection and are committed together once
+                the last one finishes; nothing is committed if iteration
+                stops early or the commit fails.
+
+        Yields:
+            (index, result) pairs as each call finishes. Calls that touch the
+            same task_id run one after another in their original order.
+            Without a session, all others run in parallel, at most
+            mcp_max_parallel_tools_per_user at a time for a user.
+        """
+        parsed = []
+        chains: Dict[Any, List[int]] = {}
+        for index, (tool_name, arguments) in enumerate(calls):
+            try:
+                params = json.loads(arguments or "{}")
+            except json.JSONDecodeError as e:
+                params = e
+            parsed.append(params)
+            task_id = params.get("task_id") if isinstance(params, dict) else None
+            chains.setdefault(("task", str(task_id)) if task_id else ("call", index), []).append(index)
+
+        # A session runs one statement at a time, so shared-session calls take turns
+        guard = asyncio.Lock() if session is not None else self._acquire_limiter(str(user_id))
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def run_chain(indices: List[int]):
+            for index in indices:
+                params = parsed[index]
+                if isinstance(params, Exception):
+                    result = {
+                        "success": False,
+                        "error": str(params),
+                        "message": "Invalid tool arguments"
+                    }
+                else:
+                    try:
+                        async with guard:
+                            result = await self.execute_tool(calls[index][0], user_id, session, **params)
+                    except Exception as e:
+                        # Every call must report back, or the caller waits forever
+                        result = {
+                            "success": False,
+                            "error": str(e),
+                            "message": f"Error executing tool '{calls[index][0]}'"
+                        }
+                await queue.put((index, result))
+
+        workers = [asyncio.create_task(run_chain(indices)) for indices in chains.values()]
+        committed = False
+        try:
+            for _ in range(len(calls)):
+                yield await queue.get()
+            if session is not None:
+                await self.commit(session)
+                committed = True
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            if session is None:
+                self._release_limiter(str(user_id))
+            elif not committed:
+                await session.rollback()
+                discard_queued_task_events(session)
+
+    async def execute_tools(
+        self,
+        user_id: Union[UUID, str],
+        calls: Sequence[Tuple[str, str]],
+        session: Optional[AsyncSession] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Execute several tool calls and return their results in the original
+        call order. See iter_tool_results.
+        """
+        results: List[Dict[str, Any]] = [None] * len(calls)
+        async for index, result in self.iter_tool_results(user_id, calls, session):
+            results[index] = result
+        return results
+
     def get_tool_description(self, tool_name: str) -> Dict[str, Any]:
         """Get description of a tool for the AI agent."""
-        descriptions = {
-            "add_task": {
-                "name": "add_task",
-                "description": "Add a new task to the user's task list",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "title": {"type": "string", "description": "Title of the task"},
-                        "description": {"type": "string", "description": "Description of the task (optional)"},
-                        "priority": {"type": "string", "enum": ["low", "medium", "high"], "description": "Priority level (default: medium)"},
-                        "due_date": {"type": "string", "description": "Due date in ISO format (optional)"}
-                    },
-                    "required": ["title"]
-                }
-            },
-            "list_tasks": {
-                "name": "list_tasks",
-                "description": "List all tasks for the user, with optional filtering",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "completed": {"type": "boolean", "description": "Filter by completion status (optional)"}
-                    }
-                }
-            },
-            "complete_task": {
-                "name": "complete_task",
-                "description": "Toggle the completion status of a task",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "task_id": {"type": "string", "description": "ID of the task to toggle"}
-                    },
-                    "required": ["task_id"]
-                }
-            },
-            "delete_task": {
-                "name": "delete_task",
-                "description": "Delete a task from the user's task list",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "task_id": {"type": "string", "description": "ID of the task to delete"}
-                    },
-                    "required": ["task_id"]
-                }
-            },
-            "update_task": {
-                "name": "update_task",
-                "description": "Update properties of an existing task",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "task_id": {"type": "string", "description": "ID of the task to update"},
-                        "title": {"type": "string", "description": "New title for the task (optional)"},
-                        "description": {"type": "string", "description": "New description for the task (optional)"},
-                        "completed": {"type": "boolean", "description": "New completion status (optional)"},
-                        "priority": {"type": "string", "enum": ["low", "medium", "high"], "description": "New priority level (optional)"},
-                        "due_date": {"type": "string", "description": "New due date in ISO format (optional)"}
-                    },
-                    "required": ["task_id"]
-                }
-            }
-        }
-        
-        return descriptions.get(tool_name, {
+        tool = self.tools.get(tool_name)
+        if tool is not None:
+            return tool.definition
+        return {
             "name": tool_name,
             "description": f"Unknown tool: {tool_name}",
             "parameters": {"type": "object", "properties": {}}
-        })
+        }
 
 
 # Global MCP server instance
@@ -1,45 +1,78 @@
 """
 MCP Tools for Todo Application
-These tools connect to existing task operations in the backend
+These tools connect to existing task operations in the backend.
+
+Every tool works in the session it is given and only flushes: the MCP
+server owns the transaction, so all tool calls of a chat turn commit once.
+Task events are queued on the session and published after that commit.
 """
-import json
-from typing import Dict, Any
-from sqlmodel import Session, select
-from models.task import Task, TaskCreate, TaskUpdate
-from models.user import User
-from database import get_session
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from uuid import UUID
+from sqlmodel.ext.asyncio.session import AsyncSession
+from models.task import Task, TaskCreate, TaskFilters
+from utils.task_sync import bump_task_version, record_task_deletions
+from utils.events import queue_task_event
+from utils.pagination import TASK_SORT_KEYS, paginate_tasks
+from utils.task_query import build_task_query, order_by_relevance
+
+
+def parse_due_date(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
 
 
-def add_task_tool(user_id: str, title: str, description: str = None, priority: str = "medium", due_date: str = None) -> Dict[str, Any]:
+async def get_owned_task(session: AsyncSession, user_id: UUID, task_id: UUID, action: str):
+    """
+    Load a task owned by the user. Returns (task, None) or (None, error result).
+    """
+    task = await session.get(Task, task_id)
+    if not task:
+        return None, {
+            "success": False,
+            "error": "Task not found",
+            "message": "Task not found"
+        }
+
+    # Verify user owns the task
+    if task.user_id != user_id:
+        return None, {
+            "success": False,
+            "error": "Not authorized",
+            "message": f"Not authorized to {action} this task"
+        }
+    return task, None
+
+
+async def add_task_tool(session: AsyncSession, user_id: UUID, title: str, description: str = None,
+                       priority: str = "medium", due_date: str = None) -> Dict[str, Any]:
     """Add a new task for the user."""
     try:
-        with next(get_session()) as session:
-            # Prepare task data
-            task_data = {
-                "title": title,
-                "description": description,
-                "priority": priority
-            }
-            
-            if due_date:
-                from datetime import datetime
-                task_data["due_date"] = datetime.fromisoformat(due_date.replace('Z', '+00:00'))
-            
-            # Create task
-            task_create = TaskCreate(**task_data)
-            task_dict = task_create.model_dump()
-            task_dict['user_id'] = user_id  # Override user_id to ensure security
-            
-            db_task = Task(**task_dict)
-            session.add(db_task)
-            session.commit()
-            session.refresh(db_task)
-            
-            return {
-                "success": True,
-                "task_id": str(db_task.id),
-                "message": f"Task '{db_task.title}' added successfully"
-            }
+        # Prepare task data
+        task_data = {
+            "title": title,
+            "description": description,
+            "priority": priority
+        }
+
+        if due_date:
+            task_data["due_date"] = parse_due_date(due_date)
+
+        # Create task
+        task_create = TaskCreate(**task_data)
+        task_dict = task_create.model_dump()
+        task_dict['user_id'] = user_id  # Override user_id to ensure security
+        task_dict['change_seq'] = await bump_task_version(session, user_id)
+
+        db_task = Task(**task_dict)
+        session.add(db_task)
+        await session.flush()
+        queue_task_event(session, user_id, "created", db_task.change_seq, task=db_task)
+
+        return {
+            "success": True,
+            "task_id": str(db_task.id),
+            "message": f"Task '{db_task.title}' added successfully"
+        }
     except Exception as e:
         return {
             "success": False,
@@ -48,37 +81,52 @@ def add_task_tool(user_id: str, title: str, description: str = None, priority: s
         }
 
 
-def list_tasks_tool(user_id: str, completed: bool = None) -> Dict[str, Any]:
-    """List tasks for the user with optional filtering."""
+async def list_tasks_tool(session: AsyncSession, user_id: UUID, completed: bool = None,
+                          priority: Optional[List[str]] = None, due_before: str = None,
+                          due_after: str = None, overdue: bool = None, created_after: str = None,
+                          query: str = None, sort: str = None, limit: int = 50) -> Dict[str, Any]:
+    """List tasks for the user with optional filtering and sorting."""
     try:
-        with next(get_session()) as session:
-            # Build query
-            query = select(Task).where(Task.user_id == user_id)
-            
-            if completed is not None:
-                query = query.where(Task.completed == completed)
-                
-            tasks = session.exec(query).all()
-            
-            task_list = []
-            for task in tasks:
-                task_list.append({
-                    "id": str(task.id),
-                    "title": task.title,
-                    "description": task.description,
-                    "completed": task.completed,
-                    "priority": task.priority,
-                    "due_date": task.due_date.isoformat() if task.due_date else None,
-                    "created_at": task.created_at.isoformat(),
-                    "updated_at": task.updated_at.isoformat()
-                })
-            
-            return {
-                "success": True,
-                "tasks": task_list,
-                "count": len(task_list),
-                "message": f"Retrieved {len(task_list)} tasks"
-            }
+        filters = TaskFilters(
+            completed=completed, priority=priority, due_before=due_before, due_after=due_after,
+            overdue=overdue, created_after=created_after, q=query
+        )
+        sort = sort or ("relevance" if query else "created_at")
+        if sort not in TASK_SORT_KEYS and sort != "relevance":
+            raise ValueError(f"Unknown sort order: {sort}")
+        limit = max(1, min(limit, 100))
+
+        # Same filters and ordering as GET /api/v1/tasks, executed in SQL
+        statement, rank = build_task_query(user_id, filters, session.get_bind().dialect.name)
+        if sort == "relevance":
+            statement = order_by_relevance(statement, rank, limit + 1)
+        else:
+            statement = paginate_tasks(statement, sort, limit, None)
+        # Safe to serve from a replica unless this turn or the user wrote recently
+        result = await session.exec(statement.execution_options(replica_reads=True))
+        rows = result.all()
+        tasks = rows[:limit]
+
+        task_list = []
+        for task in tasks:
+            task_list.append({
+                "id": str(task.id),
+                "title": task.title,
+                "description": task.description,
+                "completed": task.completed,
+                "priority": task.priority,
+                "due_date": task.due_date.isoformat() if task.due_date else None,
+                "created_at": task.created_at.isoformat(),
+                "updated_at": task.updated_at.isoformat()
+            })
+
+        return {
+            "success": True,
+            "tasks": task_list,
+            "count": len(task_list),
+            "has_more": len(rows) > limit,
+            "message": f"Retrieved {len(task_list)} tasks"
+        }
     except Exception as e:
         return {
             "success": False,
@@ -87,44 +135,29 @@ def list_tasks_tool(user_id: str, completed: bool = None) -> Dict[str, Any]:
         }
 
 
-def complete_task_tool(user_id: str, task_id: str) -> Dict[str, Any]:
+async def complete_task_tool(session: AsyncSession, user_id: UUID, task_id: UUID) -> Dict[str, Any]:
     """Toggle completion status of a task."""
     try:
-        with next(get_session()) as session:
-            # Get the task
-            task = session.get(Task, task_id)
-            
-            if not task:
-                return {
-                    "success": False,
-                    "error": "Task not found",
-                    "message": "Task not found"
-                }
-            
-            # Verify user owns the task
-            if str(task.user_id) != user_id:
-                return {
-                    "success": False,
-                    "error": "Not authorized",
-                    "message": "Not authorized to update this task"
-                }
-            
-            # Toggle completion status
-            task.completed = not task.completed
-            from datetime import datetime
-            task.updated_at = datetime.utcnow()
-            
-            session.add(task)
-            session.commit()
-            session.refresh(task)
-            
-            status = "completed" if task.completed else "marked incomplete"
-            return {
-                "success": True,
-                "task_id": str(task.id),
-                "completed": task.completed,
-                "message": f"Task '{task.title}' {status}"
-            }
+        task, error = await get_owned_task(session, user_id, task_id, "update")
+        if error:
+            return error
+
+        # Toggle completion status
+        task.change_seq = await bump_task_version(session, user_id)
+        task.completed = not task.completed
+        task.updated_at = datetime.utcnow()
+
+        session.add(task)
+        await session.flush()
+        queue_task_event(session, user_id, "updated", task.change_seq, task=task)
+
+        status = "completed" if task.completed else "marked incomplete"
+        return {
+            "success": True,
+            "task_id": str(task.id),
+            "completed": task.completed,
+            "message": f"Task '{task.title}' {status}"
+        }
     except Exception as e:
         return {
             "success": False,
@@ -133,37 +166,26 @@ def complete_task_tool(user_id: str, task_id: str) -> Dict[str, Any]:
         }
 
 
-def delete_task_tool(user_id: str, task_id: str) -> Dict[str, Any]:
+async def delete_task_tool(session: AsyncSession, user_id: UUID, task_id: UUID) -> Dict[str, Any]:
     """Delete a task."""
     try:
-        with next(get_session()) as session:
-            # Get the task
-            task = session.get(Task, task_id)
-            
-            if not task:
-                return {
-                    "success": False,
-                    "error": "Task not found",
-                    "message": "Task not found"
-                }
-            
-            # Verify user owns the task
-            if str(task.user_id) != user_id:
-                return {
-                    "success": False,
-                    "error": "Not authorized",
-                    "message": "Not authorized to delete this task"
-                }
-            
-            # Delete the task
-            session.delete(task)
-            session.commit()
-            
-            return {
-                "success": True,
-                "task_id": str(task.id),
-                "message": f"Task '{task.title}' deleted successfully"
-            }
+        task, error = await get_owned_task(session, user_id, task_id, "delete")
+        if error:
+            return error
+
+        # Delete the task
+        title = task.title
+        change_seq = await bump_task_version(session, user_id)
+        await session.delete(task)
+        await record_task_deletions(session, user_id, [task_id], change_seq)
+        await session.flush()
+        queue_task_event(session, user_id, "deleted", change_seq, task_id=task_id)
+
+        return {
+            "success": True,
+            "task_id": str(task_id),
+            "message": f"Task '{title}' deleted successfully"
+        }
     except Exception as e:
         return {
             "success": False,
@@ -172,63 +194,48 @@ def delete_task_tool(user_id: str, task_id: str) -> Dict[str, Any]:
         }
 
 
-def update_task_tool(user_id: str, task_id: str, title: str = None, description: str = None, 
-                     completed: bool = None, priority: str = None, due_date: str = None) -> Dict[str, Any]:
+async def update_task_tool(session: AsyncSession, user_id: UUID, task_id: UUID, title: str = None,
+                           description: str = None, completed: bool = None, priority: str = None,
+                           due_date: str = None) -> Dict[str, Any]:
     """Update a task."""
     try:
-        with next(get_session()) as session:
-            # Get the task
-            task = session.get(Task, task_id)
-            
-            if not task:
-                return {
-                    "success": False,
-                    "error": "Task not found",
-                    "message": "Task not found"
-                }
-            
-            # Verify user owns the task
-            if str(task.user_id) != user_id:
-                return {
-                    "success": False,
-                    "error": "Not authorized",
-                    "message": "Not authorized to update this task"
-                }
-            
-            # Prepare update data
-            update_data = {}
-            if title is not None:
-                update_data["title"] = title
-            if description is not None:
-                update_data["description"] = description
-            if completed is not None:
-                update_data["completed"] = completed
-            if priority is not None:
-                update_data["priority"] = priority
-            if due_date is not None:
-                from datetime import datetime
-                update_data["due_date"] = datetime.fromisoformat(due_date.replace('Z', '+00:00'))
-            
-            # Update task fields
-            for field, value in update_data.items():
-                setattr(task, field, value)
-            
-            # Update the timestamp
-            from datetime import datetime
-            task.updated_at = datetime.utcnow()
-            
-            session.add(task)
-            session.commit()
-            session.refresh(task)
-            
-            return {
-                "success": True,
-                "task_id": str(task.id),
-                "message": f"Task '{task.title}' updated successfully"
-            }
+        task, error = await get_owned_task(session, user_id, task_id, "update")
+        if error:
+            return error
+
+        # Prepare update data
+        update_data = {}
+        if title is not None:
+            update_data["title"] = title
+        if description is not None:
+            update_data["description"] = description
+        if completed is not None:
+            update_data["completed"] = completed
+        if priority is not None:
+            update_data["priority"] = priority
+        if due_date is not None:
+            update_data["due_date"] = parse_due_date(due_date)
+
+        # Update task fields
+        task.change_seq = await bump_task_version(session, user_id)
+        for field, value in update_data.items():
+            setattr(task, field, value)
+
+        # Update the timestamp
+        task.updated_at = datetime.utcnow()
+
+        session.add(task)
+        await session.flush()
+        queue_task_event(session, user_id, "updated", task.change_seq, task=task)
+
+        return {
+            "success": True,
+            "task_id": str(task.id),
+            "message": f"Task '{task.title}' updated successfully"
+        }
     except Exception as e:
         return {
             "success": False,
             "error": str(e),
             "message": "Failed to update task"
-        }
\ No newline at end of file
+        }
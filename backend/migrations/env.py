@@ -0,0 +1,72 @@
+"""
+Alembic environment for the Todo API backend.
+"""
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine, pool
+from sqlmodel import SQLModel
+
+from config import settings
+from database import _import_models, include_schema_name
+
+config = context.config
+
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+_import_models()
+target_metadata = SQLModel.metadata
+
+
+def _database_url() -> str:
+    return config.attributes.get("database_url") or settings.database_url
+
+
+def run_migrations_offline():
+    """
+    Emit the migration SQL without connecting to a database.
+    """
+    context.configure(
+        url=_database_url(),
+        target_metadata=target_metadata,
+        include_name=include_schema_name,
+        literal_binds=True,
+        render_as_batch=True,
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def _run_with_connection(connection):
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_name=include_schema_name,
+        # SQLite needs table rebuilds for most ALTERs
+        render_as_batch=connection.dialect.name == "sqlite",
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    """
+    Run migrations against a live database connection.
+    """
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        _run_with_connection(connection)
+        return
+
+    engine = create_engine(_database_url(), poolclass=pool.NullPool)
+    with engine.connect() as connection:
+        _run_with_connection(connection)
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
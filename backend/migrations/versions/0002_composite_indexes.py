@@ -0,0 +1,36 @@
+"""Composite indexes for task, conversation and message queries
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 00:00:00
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ("ix_task_user_id_completed_priority", "task", ["user_id", "completed", "priority"]),
+    ("ix_task_user_id_created_at_id", "task", ["user_id", "created_at", "id"]),
+    ("ix_task_user_id_due_date_id", "task", ["user_id", "due_date", "id"]),
+    ("ix_task_user_id_updated_at", "task", ["user_id", "updated_at"]),
+    ("ix_conversation_user_id_created_at", "conversation", ["user_id", "created_at"]),
+    ("ix_conversation_user_id_updated_at", "conversation", ["user_id", "updated_at"]),
+    ("ix_message_conversation_id_created_at", "message", ["conversation_id", "created_at"]),
+]
+
+
+def upgrade():
+    # Some of these already exist on databases built by create_all()
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, if_not_exists=True)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
@@ -0,0 +1,32 @@
+"""Per-user task collection version
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def _has_column(table, column):
+    return column in {c["name"] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade():
+    # Databases built by create_all() from the current models already have it
+    if _has_column("user", "task_version"):
+        return
+    with op.batch_alter_table("user") as batch_op:
+        batch_op.add_column(sa.Column("task_version", sa.Integer(), nullable=False, server_default="0"))
+
+
+def downgrade():
+    with op.batch_alter_table("user") as batch_op:
+        batch_op.drop_column("task_version")
@@ -0,0 +1,57 @@
+"""Task change sequence and tombstones for delta sync
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases built by create_all() from the current models already have these
+    inspector = sa.inspect(op.get_bind())
+    if "change_seq" not in {c["name"] for c in inspector.get_columns("task")}:
+        with op.batch_alter_table("task") as batch_op:
+            batch_op.add_column(sa.Column("change_seq", sa.Integer(), nullable=False, server_default="0"))
+    op.create_index("ix_task_user_id_change_seq", "task", ["user_id", "change_seq"], if_not_exists=True)
+
+    # Tasks written before change sequences existed become version 1 of
+    # their user's collection, so a full sync (since=0) returns them
+    user = sa.table("user", sa.column("id", sa.Uuid()), sa.column("task_version", sa.Integer()))
+    task = sa.table("task", sa.column("user_id", sa.Uuid()), sa.column("change_seq", sa.Integer()))
+    op.execute(
+        user.update()
+        .where(user.c.task_version == 0, user.c.id.in_(sa.select(task.c.user_id).where(task.c.change_seq == 0)))
+        .values(task_version=1)
+    )
+    op.execute(task.update().where(task.c.change_seq == 0).values(change_seq=1))
+
+    if "tasktombstone" not in inspector.get_table_names():
+        op.create_table(
+            "tasktombstone",
+            sa.Column("task_id", sa.Uuid(), nullable=False),
+            sa.Column("user_id", sa.Uuid(), nullable=False),
+            sa.Column("change_seq", sa.Integer(), nullable=False),
+            sa.Column("deleted_at", sa.DateTime(), nullable=False),
+            sa.ForeignKeyConstraint(["user_id"], ["user.id"]),
+            sa.PrimaryKeyConstraint("task_id"),
+        )
+    op.create_index(
+        "ix_tasktombstone_user_id_change_seq", "tasktombstone", ["user_id", "change_seq"], if_not_exists=True
+    )
+
+
+def downgrade():
+    op.drop_index("ix_tasktombstone_user_id_change_seq", table_name="tasktombstone", if_exists=True)
+    op.drop_table("tasktombstone")
+    op.drop_index("ix_task_user_id_change_seq", table_name="task", if_exists=True)
+    with op.batch_alter_table("task") as batch_op:
+        batch_op.drop_column("change_seq")
@@ -0,0 +1,24 @@
+"""Cover the id tie-breaker of the updated_at task ordering
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 00:00:00
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_index("ix_task_user_id_updated_at", table_name="task", if_exists=True)
+    op.create_index("ix_task_user_id_updated_at_id", "task", ["user_id", "updated_at", "id"], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index("ix_task_user_id_updated_at_id", table_name="task", if_exists=True)
+    op.create_index("ix_task_user_id_updated_at", "task", ["user_id", "updated_at"], if_not_exists=True)
@@ -0,0 +1,31 @@
+"""Rolling summary on conversation
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases built by create_all() from the current models already have these
+    columns = {c["name"] for c in sa.inspect(op.get_bind()).get_columns("conversation")}
+    with op.batch_alter_table("conversation") as batch_op:
+        if "summary" not in columns:
+            batch_op.add_column(sa.Column("summary", sa.String(), nullable=True))
+        if "summarized_until" not in columns:
+            batch_op.add_column(sa.Column("summarized_until", sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table("conversation") as batch_op:
+        batch_op.drop_column("summarized_until")
+        batch_op.drop_column("summary")
@@ -0,0 +1,39 @@
+"""Expression indexes for the due_date and priority task orderings
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+# Must match DUE_DATE_MISSING and PRIORITY_RANK in models/task.py
+DUE_DATE_MISSING = "(CASE WHEN (due_date IS NULL) THEN 1 ELSE 0 END)"
+PRIORITY_RANK = (
+    "(CASE WHEN (priority = 'high') THEN 3 WHEN (priority = 'medium') THEN 2 "
+    "WHEN (priority = 'low') THEN 1 ELSE 0 END)"
+)
+
+
+def upgrade():
+    op.create_index(
+        "ix_task_user_id_due_date_missing_due_date_id", "task",
+        ["user_id", sa.text(DUE_DATE_MISSING), "due_date", "id"], if_not_exists=True
+    )
+    op.create_index(
+        "ix_task_user_id_priority_rank_created_at_id", "task",
+        ["user_id", sa.text(PRIORITY_RANK), "created_at", "id"], if_not_exists=True
+    )
+
+
+def downgrade():
+    op.drop_index("ix_task_user_id_priority_rank_created_at_id", table_name="task", if_exists=True)
+    op.drop_index("ix_task_user_id_due_date_missing_due_date_id", table_name="task", if_exists=True)
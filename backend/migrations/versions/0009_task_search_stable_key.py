@@ -0,0 +1,104 @@
+"""Key the SQLite full-text index on a stable integer per task
+
+The FTS5 table from 0005 used the implicit rowid of task, which VACUUM may
+renumber because task has a UUID primary key; index entries would then
+point at the wrong tasks. task_search_key assigns each task a permanent
+integer key, and the new contentless task_search table is keyed on it.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 00:00:00
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+DROP_ROWID_INDEX = [
+    "DROP TRIGGER IF EXISTS task_fts_au",
+    "DROP TRIGGER IF EXISTS task_fts_ad",
+    "DROP TRIGGER IF EXISTS task_fts_ai",
+    "DROP TABLE IF EXISTS task_fts",
+]
+
+# Same as TASK_SEARCH_DDL["sqlite"] in models/task.py
+CREATE_KEYED_INDEX = [
+    "CREATE TABLE IF NOT EXISTS task_search_key (id INTEGER PRIMARY KEY, task_id CHAR(32) NOT NULL UNIQUE)",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS task_search USING fts5("
+    "title, description, content='', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS task_search_ai AFTER INSERT ON task BEGIN "
+    "INSERT INTO task_search_key(task_id) VALUES (new.id); "
+    "INSERT INTO task_search(rowid, title, description) "
+    "SELECT id, new.title, new.description FROM task_search_key WHERE task_id = new.id; "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS task_search_ad AFTER DELETE ON task BEGIN "
+    "INSERT INTO task_search(task_search, rowid, title, description) "
+    "SELECT 'delete', id, old.title, old.description FROM task_search_key WHERE task_id = old.id; "
+    "DELETE FROM task_search_key WHERE task_id = old.id; "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS task_search_au AFTER UPDATE OF title, description ON task BEGIN "
+    "INSERT INTO task_search(task_search, rowid, title, description) "
+    "SELECT 'delete', id, old.title, old.description FROM task_search_key WHERE task_id = old.id; "
+    "INSERT INTO task_search(rowid, title, description) "
+    "SELECT id, new.title, new.description FROM task_search_key WHERE task_id = new.id; "
+    "END",
+]
+
+# Index the rows that already exist; databases built by create_all() from
+# the current models already have the keyed index and are left alone
+POPULATE_KEYED_INDEX = [
+    "INSERT INTO task_search_key(task_id) SELECT id FROM task "
+    "WHERE id NOT IN (SELECT task_id FROM task_search_key)",
+    "INSERT INTO task_search(task_search) VALUES ('delete-all')",
+    "INSERT INTO task_search(rowid, title, description) "
+    "SELECT k.id, t.title, t.description FROM task_search_key k JOIN task t ON t.id = k.task_id",
+]
+
+DROP_KEYED_INDEX = [
+    "DROP TRIGGER IF EXISTS task_search_au",
+    "DROP TRIGGER IF EXISTS task_search_ad",
+    "DROP TRIGGER IF EXISTS task_search_ai",
+    "DROP TABLE IF EXISTS task_search",
+    "DROP TABLE IF EXISTS task_search_key",
+]
+
+# The 0005 index
+CREATE_ROWID_INDEX = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS task_fts USING fts5("
+    "title, description, content='task', content_rowid='rowid', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS task_fts_ai AFTER INSERT ON task BEGIN "
+    "INSERT INTO task_fts(rowid, title, description) VALUES (new.rowid, new.title, new.description); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS task_fts_ad AFTER DELETE ON task BEGIN "
+    "INSERT INTO task_fts(task_fts, rowid, title, description) "
+    "VALUES ('delete', old.rowid, old.title, old.description); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS task_fts_au AFTER UPDATE OF title, description ON task BEGIN "
+    "INSERT INTO task_fts(task_fts, rowid, title, description) "
+    "VALUES ('delete', old.rowid, old.title, old.description); "
+    "INSERT INTO task_fts(rowid, title, description) VALUES (new.rowid, new.title, new.description); "
+    "END",
+    "INSERT INTO task_fts(task_fts) VALUES ('rebuild')",
+]
+
+
+def _run(statements):
+    # PostgreSQL's tsvector column is keyed by the row itself; nothing to do
+    if op.get_bind().dialect.name == "sqlite":
+        for statement in statements:
+            op.execute(statement)
+
+
+def upgrade():
+    _run(DROP_ROWID_INDEX + CREATE_KEYED_INDEX + POPULATE_KEYED_INDEX)
+
+
+def downgrade():
+    _run(DROP_KEYED_INDEX + CREATE_ROWID_INDEX)
@@ -1,4 +1,5 @@
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import Index
 from datetime import datetime
 from typing import Optional, List
 import uuid
@@ -10,10 +11,19 @@ class ConversationBase(SQLModel):
 
 
 class Conversation(ConversationBase, table=True):
+    __table_args__ = (
+        # Latest conversation lookup and the conversation list
+        Index("ix_conversation_user_id_created_at", "user_id", "created_at"),
+        Index("ix_conversation_user_id_updated_at", "user_id", "updated_at"),
+    )
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     user_id: uuid.UUID = Field(foreign_key="user.id")
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
+    # Rolling summary of the messages up to and including summarized_until
+    summary: Optional[str] = None
+    summarized_until: Optional[datetime] = None
 
     # Relationships
     user: User = Relationship(back_populates="conversations")
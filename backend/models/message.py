@@ -1,4 +1,5 @@
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import Index
 from datetime import datetime
 from typing import Optional, List
 import uuid
@@ -13,6 +14,11 @@ class MessageBase(SQLModel):
 
 
 class Message(MessageBase, table=True):
+    __table_args__ = (
+        # Conversation history, oldest or newest first
+        Index("ix_message_conversation_id_created_at", "conversation_id", "created_at"),
+    )
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     conversation_id: uuid.UUID = Field(foreign_key="conversation.id")
     user_id: uuid.UUID = Field(foreign_key="user.id")
@@ -1,6 +1,8 @@
 from sqlmodel import SQLModel, Field, Relationship
-from datetime import datetime
-from typing import Optional
+from sqlalchemy import DDL, Index, case, event, literal_column
+from sqlalchemy.sql.expression import Grouping
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
 import uuid
 from pydantic import field_validator
 from .user import User
@@ -22,15 +24,109 @@ class TaskBase(SQLModel):
 
 
 class Task(TaskBase, table=True):
+    __table_args__ = (
+        # Filtering a user's tasks by status and priority
+        Index("ix_task_user_id_completed_priority", "user_id", "completed", "priority"),
+        # Keyset pagination over a user's tasks
+        Index("ix_task_user_id_created_at_id", "user_id", "created_at", "id"),
+        Index("ix_task_user_id_due_date_id", "user_id", "due_date", "id"),
+        Index("ix_task_user_id_updated_at_id", "user_id", "updated_at", "id"),
+        # Delta sync: a user's tasks changed after a given sequence number
+        Index("ix_task_user_id_change_seq", "user_id", "change_seq"),
+    )
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     user_id: uuid.UUID = Field(foreign_key="user.id")
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
+    # User.task_version at the task's last write
+    change_seq: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
 
     # Relationship to User
     user: User = Relationship(back_populates="tasks")
 
 
+# Leading keys of the due_date and priority orderings (see utils.pagination).
+# Their values are literals rather than bound parameters so the ORDER BY
+# matches the expression indexes below and no sort step is needed.
+# 1 for tasks without a due date, so they sort after dated ones
+DUE_DATE_MISSING = case((Task.due_date.is_(None), literal_column("1")), else_=literal_column("0"))
+# Higher rank sorts first when ordering by priority
+PRIORITY_RANK = case(
+    (Task.priority == literal_column("'high'"), literal_column("3")),
+    (Task.priority == literal_column("'medium'"), literal_column("2")),
+    (Task.priority == literal_column("'low'"), literal_column("1")),
+    else_=literal_column("0"),
+)
+
+# PostgreSQL only accepts expressions in an index definition in parentheses
+Index(
+    "ix_task_user_id_due_date_missing_due_date_id",
+    Task.user_id, Grouping(DUE_DATE_MISSING), Task.due_date, Task.id
+)
+Index(
+    "ix_task_user_id_priority_rank_created_at_id",
+    Task.user_id, Grouping(PRIORITY_RANK), Task.created_at, Task.id
+)
+
+
+# Full-text index over title and description, maintained by the database on
+# every write (see migrations 0005 and 0009). SQLite uses a contentless FTS5
+# table plus triggers; its rowids come from task_search_key, which gives
+# every task a stable integer key (the implicit rowid of a table with a UUID
+# primary key may change on VACUUM). PostgreSQL uses a generated tsvector
+# column with a GIN index.
+TASK_SEARCH_DDL = {
+    "sqlite": [
+        "CREATE TABLE IF NOT EXISTS task_search_key (id INTEGER PRIMARY KEY, task_id CHAR(32) NOT NULL UNIQUE)",
+        "CREATE VIRTUAL TABLE IF NOT EXISTS task_search USING fts5("
+        "title, description, content='', "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        "CREATE TRIGGER IF NOT EXISTS task_search_ai AFTER INSERT ON task BEGIN "
+        "INSERT INTO task_search_key(task_id) VALUES (new.id); "
+        "INSERT INTO task_search(rowid, title, description) "
+        "SELECT id, new.title, new.description FROM task_search_key WHERE task_id = new.id; "
+        "END",
+        # A contentless table is told the indexed values to remove them
+        "CREATE TRIGGER IF NOT EXISTS task_search_ad AFTER DELETE ON task BEGIN "
+        "INSERT INTO task_search(task_search, rowid, title, description) "
+        "SELECT 'delete', id, old.title, old.description FROM task_search_key WHERE task_id = old.id; "
+        "DELETE FROM task_search_key WHERE task_id = old.id; "
+        "END",
+        "CREATE TRIGGER IF NOT EXISTS task_search_au AFTER UPDATE OF title, description ON task BEGIN "
+        "INSERT INTO task_search(task_search, rowid, title, description) "
+        "SELECT 'delete', id, old.title, old.description FROM task_search_key WHERE task_id = old.id; "
+        "INSERT INTO task_search(rowid, title, description) "
+        "SELECT id, new.title, new.description FROM task_search_key WHERE task_id = new.id; "
+        "END",
+    ],
+    "postgresql": [
+        "ALTER TABLE task ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(description, '')), 'B')) STORED",
+        "CREATE INDEX IF NOT EXISTS ix_task_search_vector ON task USING gin (search_vector)",
+    ],
+}
+
+for _dialect, _statements in TASK_SEARCH_DDL.items():
+    for _statement in _statements:
+        event.listen(Task.__table__, "after_create", DDL(_statement).execute_if(dialect=_dialect))
+
+
+class TaskTombstone(SQLModel, table=True):
+    """
+    Marker left behind by a deleted task so sync clients can drop it.
+    """
+    __table_args__ = (
+        Index("ix_tasktombstone_user_id_change_seq", "user_id", "change_seq"),
+    )
+
+    task_id: uuid.UUID = Field(primary_key=True)
+    user_id: uuid.UUID = Field(foreign_key="user.id")
+    change_seq: int
+    deleted_at: datetime = Field(default_factory=datetime.utcnow)
+
+
 class TaskCreate(TaskBase):
     title: str
 
@@ -50,8 +146,94 @@ class TaskUpdate(SQLModel):
         return v
 
 
+class TaskFilters(SQLModel):
+    """
+    Task list filters shared by the REST API and the list_tasks MCP tool.
+    """
+    completed: Optional[bool] = None
+    priority: Optional[List[str]] = None  # any of low, medium, high
+    due_before: Optional[datetime] = None
+    due_after: Optional[datetime] = None
+    overdue: Optional[bool] = None  # due in the past and not completed
+    created_after: Optional[datetime] = None
+    q: Optional[str] = None  # full-text search
+
+    @field_validator('priority', mode='before')
+    @classmethod
+    def split_priorities(cls, v):
+        # Accept "high,medium", ["high", "medium"] or ["high,medium"]
+        if v is None:
+            return None
+        values = [v] if isinstance(v, str) else v
+        priorities = [p.strip() for value in values for p in value.split(',') if p.strip()]
+        for p in priorities:
+            if p not in ['low', 'medium', 'high']:
+                raise ValueError('Priority must be low, medium, or high')
+        return priorities or None
+
+    @field_validator('due_before', 'due_after', 'created_after')
+    @classmethod
+    def to_naive_utc(cls, v):
+        # Stored timestamps are naive UTC
+        if v is not None and v.tzinfo is not None:
+            v = v.astimezone(timezone.utc).replace(tzinfo=None)
+        return v
+
+
 class TaskPublic(TaskBase):
     id: uuid.UUID
     user_id: uuid.UUID
     created_at: datetime
-    updated_at: datetime
\ No newline at end of file
+    updated_at: datetime
+
+
+# Most items accepted by one bulk request
+BULK_MAX_ITEMS = 5000
+
+
+class TaskBulkCreate(SQLModel):
+    tasks: List[TaskCreate] = Field(min_length=1, max_length=BULK_MAX_ITEMS)
+
+
+class TaskBulkUpdateItem(TaskUpdate):
+    id: uuid.UUID
+
+
+class TaskBulkUpdate(SQLModel):
+    tasks: List[TaskBulkUpdateItem] = Field(min_length=1, max_length=BULK_MAX_ITEMS)
+
+
+class TaskBulkComplete(SQLModel):
+    ids: List[uuid.UUID] = Field(min_length=1, max_length=BULK_MAX_ITEMS)
+    completed: bool = True
+
+
+class TaskBulkDelete(SQLModel):
+    ids: List[uuid.UUID] = Field(min_length=1, max_length=BULK_MAX_ITEMS)
+
+
+class TaskBulkResult(SQLModel):
+    id: uuid.UUID
+    status: int  # HTTP status of this item: 200, 201, 403 or 404
+    task: Optional[TaskPublic] = None
+    error: Optional[str] = None
+
+
+class TaskChanges(SQLModel):
+    # Pass back as ?since= on the next sync
+    token: int
+    tasks: List[TaskPublic]
+    deleted: List[uuid.UUID]
+
+
+class TaskPriorityStats(SQLModel):
+    total: int = 0
+    completed: int = 0
+
+
+class TaskStats(SQLModel):
+    total: int = 0
+    completed: int = 0
+    pending: int = 0
+    overdue: int = 0
+    by_priority: Dict[str, TaskPriorityStats] = {}
@@ -13,6 +13,8 @@ class User(UserBase, table=True):
     email: str = Field(unique=True, index=True)
     hashed_password: str
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    # Bumped on every write to the user's tasks; versions the task list
+    task_version: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
 
     # Relationships to tasks, conversations, and messages
     tasks: List["Task"] = Relationship(back_populates="user")
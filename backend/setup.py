@@ -7,8 +7,11 @@ setup(
     install_requires=[
         "fastapi==0.128.5",
         "sqlmodel==0.0.32",
+        "alembic==1.20.0",
         "uvicorn==0.40.0",
         "psycopg2-binary==2.9.11",
+        "asyncpg==0.30.0",
+        "aiosqlite==0.21.0",
         "python-jose[cryptography]==3.5.0",
         "passlib[bcrypt]==1.7.4",
         "python-multipart==0.0.22",
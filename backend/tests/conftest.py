@@ -0,0 +1,17 @@
+import os
+import sys
+
+# The application modules use top-level imports (``from database import ...``),
+# so make the backend directory importable regardless of where pytest runs from.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def clear_auth_caches():
+    # Every test gets its own database, so cached users must not leak between tests
+    from utils.cache import clear_caches
+    clear_caches()
+    yield
+    clear_caches()
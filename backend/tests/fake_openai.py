@@ -0,0 +1,97 @@
+"""
+A tiny in-process OpenAI-compatible chat completions server for tests.
+
+Each request consumes the next scripted reply: either assistant text or a
+list of tool calls. Replies are streamed as chat.completion.chunk events
+when the request asks for stream=True.
+"""
+import json
+from typing import List, Optional
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from openai import AsyncOpenAI
+
+
+class FakeOpenAI:
+    def __init__(self):
+        self.replies: List[dict] = []
+        self.requests: List[dict] = []
+        self.app = FastAPI()
+        self.app.post("/v1/chat/completions")(self._chat_completions)
+
+    def reply_text(self, text: str):
+        self.replies.append({"content": text, "tool_calls": None})
+
+    def reply_tool_calls(self, *calls: dict):
+        tool_calls = [
+            {"id": f"call_{i}", "type": "function",
+             "function": {"name": call["name"], "arguments": json.dumps(call.get("arguments", {}))}}
+            for i, call in enumerate(calls)
+        ]
+        self.replies.append({"content": None, "tool_calls": tool_calls})
+
+    def client(self, **kwargs) -> AsyncOpenAI:
+        return AsyncOpenAI(
+            api_key="test-key",
+            base_url="http://fake-openai/v1",
+            http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=self.app)),
+            **kwargs,
+        )
+
+    async def _chat_completions(self, request: Request):
+        body = await request.json()
+        self.requests.append(body)
+        reply = self.replies.pop(0)
+        if body.get("stream"):
+            include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+            return StreamingResponse(self._stream(reply, include_usage), media_type="text/event-stream")
+        return JSONResponse({
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": 0,
+            "model": body["model"],
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": reply["content"], "tool_calls": reply["tool_calls"]},
+                "finish_reason": "tool_calls" if reply["tool_calls"] else "stop",
+            }],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+        })
+
+    def _chunk(self, delta: dict, finish_reason: Optional[str] = None) -> str:
+        payload = {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "fake",
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        return f"data: {json.dumps(payload)}\n\n"
+
+    async def _stream(self, reply: dict, include_usage: bool = False):
+        yield self._chunk({"role": "assistant", "content": ""})
+        if reply["tool_calls"]:
+            for index, call in enumerate(reply["tool_calls"]):
+                arguments = call["function"]["arguments"]
+                middle = len(arguments) // 2
+                # Split the arguments over two chunks like the real API does
+                yield self._chunk({"tool_calls": [{
+                    "index": index, "id": call["id"], "type": "function",
+                    "function": {"name": call["function"]["name"], "arguments": arguments[:middle]},
+                }]})
+                yield self._chunk({"tool_calls": [{"index": index, "function": {"arguments": arguments[middle:]}}]})
+            yield self._chunk({}, "tool_calls")
+        else:
+            for word in reply["content"].split(" "):
+                yield self._chunk({"content": word + " "})
+            yield self._chunk({}, "stop")
+        if include_usage:
+            # The usage chunk has no choices, like the real API's
+            payload = {
+                "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": 0, "model": "fake",
+                "choices": [], "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+            }
+            yield f"data: {json.dumps(payload)}\n\n"
+        yield "data: [DONE]\n\n"
@@ -1,19 +1,20 @@
 import pytest
 from fastapi.testclient import TestClient
 from sqlmodel import Session, SQLModel, create_engine
-from sqlmodel.pool import StaticPool
-from backend.main import app
-from backend.database import get_session
-from backend.models.user import User
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from main import app
+from database import get_async_session, get_read_session
+from models.user import User
 
 
 # Create a test database engine
 @pytest.fixture(name="session")
-def session_fixture():
+def session_fixture(tmp_path):
     engine = create_engine(
-        "sqlite:///:memory:",
+        f"sqlite:///{tmp_path / 'test.db'}",
         connect_args={"check_same_thread": False},
-        poolclass=StaticPool,
     )
     SQLModel.metadata.create_all(bind=engine)
     with Session(engine) as session:
@@ -22,10 +23,19 @@ def session_fixture():
 
 @pytest.fixture(name="client")
 def client_fixture(session: Session):
-    def get_session_override():
-        return session
+    # The app talks to the same database file through the async driver
+    async_engine = create_async_engine(
+        session.get_bind().url.set(drivername="sqlite+aiosqlite"),
+        poolclass=NullPool,
+    )
+
+    async def get_async_session_override():
+        async with AsyncSession(async_engine, expire_on_commit=False) as async_session:
+            yield async_session
 
-    app.dependency_overrides[get_session] = get_session_override
+    app.dependency_overrides[get_async_session] = get_async_session_override
+
+    app.dependency_overrides[get_read_session] = get_async_session_override
     client = TestClient(app)
     yield client
     app.dependency_overrides.clear()
@@ -65,4 +75,80 @@ def test_login_user(client: TestClient, session: Session):
     assert response.status_code == 200
     data = response.json()
     assert "access_token" in data
-    assert data["token_type"] == "bearer"
\ No newline at end of file
+    assert data["token_type"] == "bearer"
+
+def test_authenticated_requests_reuse_cached_user(client: TestClient):
+    from utils.cache import cache_stats
+
+    response = client.post(
+        "/api/v1/auth/register",
+        json={
+            "email": "cached@example.com",
+            "password": "password123"
+        }
+    )
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    # First request resolves the user from the database, the rest hit the cache
+    for _ in range(3):
+        assert client.get("/api/v1/tasks/", headers=headers).status_code == 200
+
+    stats = cache_stats()
+    assert stats["user"] == {"hits": 2, "misses": 1}
+    assert stats["token"] == {"hits": 2, "misses": 1}
+
+
+def test_login_rehashes_outdated_password_hash(client: TestClient, session: Session):
+    from passlib.hash import argon2
+
+    # A user whose hash was created with weaker parameters than the current defaults
+    legacy_hash = argon2.using(rounds=1, memory_cost=1024).hash("password123")
+    user = User(email="legacy@example.com", hashed_password=legacy_hash)
+    session.add(user)
+    session.commit()
+
+    response = client.post(
+        "/api/v1/auth/login",
+        json={
+            "email": "legacy@example.com",
+            "password": "password123"
+        }
+    )
+    assert response.status_code == 200
+
+    session.refresh(user)
+    assert user.hashed_password != legacy_hash
+    assert not argon2.needs_update(user.hashed_password)
+
+
+def test_register_returns_503_when_hash_pool_is_saturated(client: TestClient):
+    from utils.security import password_hash_pool
+
+    password_hash_pool.in_flight = password_hash_pool.capacity
+    try:
+        response = client.post(
+            "/api/v1/auth/register",
+            json={
+                "email": "busy@example.com",
+                "password": "password123"
+            }
+        )
+    finally:
+        password_hash_pool.in_flight = 0
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(password_hash_pool.retry_after)
+
+
+def test_hash_pool_workers_are_not_forked_from_the_app():
+    import asyncio
+    from utils.security import PasswordHashPool, get_password_hash, verify_password
+
+    pool = PasswordHashPool(max_workers=1, max_queue=0, retry_after=1)
+    assert pool.mp_context.get_start_method() in ("forkserver", "spawn")
+    pool.start()
+    try:
+        hashed = asyncio.run(pool.run(get_password_hash, "password123"))
+    finally:
+        pool.shutdown()
+    assert verify_password("password123", hashed)
@@ -0,0 +1,561 @@
+import json
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlmodel import Session, SQLModel, create_engine, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from main import app
+from database import configure_sqlite_engine, get_async_session, get_read_session
+from models.user import User
+from models.conversation import Conversation
+from models.message import Message
+from uuid import uuid4
+from datetime import datetime, timedelta
+
+
+# Create a test database engine
+@pytest.fixture(name="session")
+def session_fixture(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'test.db'}",
+        connect_args={"check_same_thread": False},
+    )
+    SQLModel.metadata.create_all(bind=engine)
+    with Session(engine) as session:
+        yield session
+
+
+@pytest.fixture(name="async_engine")
+def async_engine_fixture(session: Session):
+    async_engine = create_async_engine(
+        session.get_bind().url.set(drivername="sqlite+aiosqlite"),
+        poolclass=NullPool,
+    )
+    configure_sqlite_engine(async_engine.sync_engine)
+    return async_engine
+
+
+@pytest.fixture(name="client")
+def client_fixture(async_engine):
+    async def get_async_session_override():
+        async with AsyncSession(async_engine, expire_on_commit=False) as async_session:
+            yield async_session
+
+    app.dependency_overrides[get_async_session] = get_async_session_override
+
+    app.dependency_overrides[get_read_session] = get_async_session_override
+    client = TestClient(app)
+    yield client
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture(name="user")
+def user_fixture(session: Session):
+    user = User(id=uuid4(), email="chat@example.com", hashed_password="x", created_at=datetime.utcnow())
+    session.add(user)
+    session.commit()
+    session.refresh(user)
+    return user
+
+
+def _seed_conversations(session: Session, user: User, count: int, messages_each: int):
+    base = datetime(2026, 1, 1)
+    for c in range(count):
+        conversation = Conversation(
+            user_id=user.id,
+            created_at=base + timedelta(hours=c),
+            updated_at=base + timedelta(hours=c),
+        )
+        session.add(conversation)
+        for m in range(messages_each):
+            session.add(Message(
+                conversation_id=conversation.id,
+                user_id=user.id,
+                role="user",
+                content=f"conversation {c} message {m}",
+                created_at=base + timedelta(hours=c, minutes=m),
+            ))
+    session.commit()
+
+
+def test_conversation_list_is_paginated_with_last_message(client: TestClient, session: Session, user: User):
+    _seed_conversations(session, user, count=3, messages_each=4)
+
+    response = client.get(f"/api/v1/chat/{user.id}/chat", params={"limit": 2})
+    assert response.status_code == 200
+    first_page = response.json()
+    assert [c["last_message"] for c in first_page] == ["conversation 2 message 3", "conversation 1 message 3"]
+
+    cursor = response.headers["X-Next-Cursor"]
+    response = client.get(f"/api/v1/chat/{user.id}/chat", params={"limit": 2, "cursor": cursor})
+    assert [c["last_message"] for c in response.json()] == ["conversation 0 message 3"]
+    assert "X-Next-Cursor" not in response.headers
+
+
+def test_conversation_list_query_count_does_not_grow(client: TestClient, session: Session, user: User, async_engine):
+    statements = []
+    event.listen(async_engine.sync_engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+
+    _seed_conversations(session, user, count=2, messages_each=1)
+    client.get(f"/api/v1/chat/{user.id}/chat")
+    few = len(statements)
+
+    statements.clear()
+    _seed_conversations(session, user, count=20, messages_each=1)
+    client.get(f"/api/v1/chat/{user.id}/chat")
+
+    assert len(statements) == few
+
+
+def _parse_sse(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_chat_stream_emits_tokens_tool_events_and_persists_reply(client: TestClient, session: Session, user: User):
+    from utils.llm import LLMClient, get_llm_client
+    from tests.fake_openai import FakeOpenAI
+
+    fake = FakeOpenAI()
+    fake.reply_tool_calls({"name": "list_tasks", "arguments": {"completed": False}})
+    fake.reply_text("You have no open tasks")
+    app.dependency_overrides[get_llm_client] = lambda: LLMClient(fake.client(), max_concurrency=4)
+
+    response = client.post(f"/api/v1/chat/{user.id}/chat/stream", json={"user_message": "What is left to do?"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = _parse_sse(response.text)
+    names = [name for name, _ in events]
+    assert names[0] == "conversation"
+    assert names.index("tool_call_start") < names.index("tool_call_finish") < names.index("token")
+    assert names[-1] == "done"
+
+    start = dict(events)["tool_call_start"]
+    assert start["name"] == "list_tasks"
+    assert json.loads(start["arguments"]) == {"completed": False}
+
+    streamed = "".join(data["content"] for name, data in events if name == "token")
+    assert streamed.strip() == "You have no open tasks"
+    assert events[-1][1]["assistant_message"] == streamed
+
+    # The second request carries the tool result back to the model
+    assert fake.requests[1]["messages"][-1]["role"] == "tool"
+
+    messages = session.exec(select(Message).order_by(Message.created_at)).all()
+    assert [(m.role, m.content) for m in messages] == [("user", "What is left to do?"), ("assistant", streamed)]
+
+
+def test_chat_uses_shared_llm_client(client: TestClient, session: Session, user: User):
+    from utils.llm import LLMClient, get_llm_client
+    from tests.fake_openai import FakeOpenAI
+
+    fake = FakeOpenAI()
+    fake.reply_text("Hello there")
+    fake.reply_text("Hello again")
+    llm = LLMClient(fake.client(), max_concurrency=4)
+    app.dependency_overrides[get_llm_client] = lambda: llm
+
+    for expected in ("Hello there", "Hello again"):
+        response = client.post(f"/api/v1/chat/{user.id}/chat", json={"user_message": "Hi"})
+        assert response.status_code == 200
+        assert response.json()["assistant_message"] == expected
+    assert len(fake.requests) == 2
+
+
+def test_chat_without_api_key_returns_friendly_message(client: TestClient, user: User):
+    from utils.llm import get_llm_client
+
+    app.dependency_overrides[get_llm_client] = lambda: None
+    response = client.post(f"/api/v1/chat/{user.id}/chat", json={"user_message": "Hi"})
+    assert response.status_code == 200
+    assert "OPENAI_API_KEY" in response.json()["assistant_message"]
+
+
+def test_chat_runs_tool_calls_in_one_session_in_call_order(client: TestClient, user: User, monkeypatch):
+    import asyncio
+    from mcp.server import mcp_server
+    from utils.llm import LLMClient, get_llm_client
+    from tests.fake_openai import FakeOpenAI
+
+    running, peak, order, sessions = [0], [0], [], set()
+
+    async def fake_execute_tool(tool_name, user_id, session, **params):
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        sessions.add(id(session))
+        # The first call is the slowest, so unordered results would show it
+        await asyncio.sleep(0.05 if params.get("title") == "first" else 0.01)
+        order.append(params.get("title") or params.get("task_id"))
+        running[0] -= 1
+        return {"success": True, "tool": tool_name, "params": params}
+
+    monkeypatch.setattr(mcp_server, "execute_tool", fake_execute_tool)
+
+    fake = FakeOpenAI()
+    fake.reply_tool_calls(
+        {"name": "add_task", "arguments": {"title": "first"}},
+        {"name": "add_task", "arguments": {"title": "second"}},
+        {"name": "update_task", "arguments": {"task_id": "t1", "title": "renamed"}},
+        {"name": "complete_task", "arguments": {"task_id": "t1"}},
+    )
+    fake.reply_text("Done")
+    app.dependency_overrides[get_llm_client] = lambda: LLMClient(fake.client(), max_concurrency=4)
+
+    response = client.post(f"/api/v1/chat/{user.id}/chat", json={"user_message": "Do it all"})
+    assert response.status_code == 200
+    assert [call["name"] for call in response.json()["tool_calls"]] == [
+        "add_task", "add_task", "update_task", "complete_task"
+    ]
+
+    # The calls share the request's session, so they take turns in call order
+    assert len(sessions) == 1 and None not in sessions
+    assert peak[0] == 1
+    assert order == ["first", "second", "renamed", "t1"]
+
+    tool_messages = [m for m in fake.requests[1]["messages"] if m["role"] == "tool"]
+    assert [m["tool_call_id"] for m in tool_messages] == ["call_0", "call_1", "call_2", "call_3"]
+    assert [json.loads(m["content"])["tool"] for m in tool_messages] == [
+        "add_task", "add_task", "update_task", "complete_task"
+    ]
+
+
+def test_tool_calls_without_a_session_run_in_parallel_up_to_the_user_limit(monkeypatch):
+    import asyncio
+    from config import settings
+    from mcp.server import mcp_server
+
+    monkeypatch.setattr(settings, "mcp_max_parallel_tools_per_user", 2)
+    running, peak, order = [0], [0], []
+
+    async def fake_execute_tool(tool_name, user_id, session, **params):
+        assert session is None
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        # Later calls on t1 finish faster, so running them out of order would show
+        await asyncio.sleep(0.05 if params.get("title") == "renamed" else 0.01)
+        order.append(params.get("title") or params.get("task_id"))
+        running[0] -= 1
+        return {"success": True, "tool": tool_name, "params": params}
+
+    monkeypatch.setattr(mcp_server, "execute_tool", fake_execute_tool)
+
+    user_id = uuid4()
+    calls = [
+        ("update_task", json.dumps({"task_id": "t1", "title": "renamed"})),
+        ("add_task", json.dumps({"title": "a"})),
+        ("add_task", json.dumps({"title": "b"})),
+        ("add_task", json.dumps({"title": "c"})),
+        ("complete_task", json.dumps({"task_id": "t1"})),
+    ]
+    results = asyncio.run(mcp_server.execute_tools(user_id, calls))
+
+    assert [r["tool"] for r in results] == [name for name, _ in calls]
+    # Independent calls overlap, but never more than the per-user limit
+    assert peak[0] == 2
+    # Calls on the same task keep their call order
+    assert order.index("renamed") < order.index("t1")
+    assert str(user_id) not in mcp_server._user_limiters
+
+
+def test_chat_tool_calls_commit_once_and_roll_back_failed_calls(
+    client: TestClient, session: Session, user: User, async_engine, monkeypatch
+):
+    import utils.events
+    from models.task import Task
+    from utils.llm import LLMClient, get_llm_client
+    from tests.fake_openai import FakeOpenAI
+
+    published = []
+
+    class RecordingBroker:
+        async def publish(self, channel, message):
+            published.append(message["type"])
+
+    monkeypatch.setattr(utils.events, "broker", RecordingBroker())
+
+    existing = Task(user_id=user.id, title="Existing")
+    session.add(existing)
+    session.commit()
+
+    commits = []
+    event.listen(async_engine.sync_engine, "commit", lambda conn: commits.append(conn))
+
+    fake = FakeOpenAI()
+    fake.reply_tool_calls(
+        {"name": "add_task", "arguments": {"title": "Buy milk"}},
+        {"name": "complete_task", "arguments": {"task_id": str(uuid4())}},
+        # Fails after bumping the task version, which must be rolled back
+        {"name": "update_task", "arguments": {"task_id": str(existing.id), "due_date": "next week"}},
+        {"name": "delete_task", "arguments": {"task_id": "not-a-uuid"}},
+        {"name": "add_task", "arguments": {"title": "Call mum", "priority": "high"}},
+    )
+    fake.reply_text("Done")
+    app.dependency_overrides[get_llm_client] = lambda: LLMClient(fake.client(), max_concurrency=4)
+
+    response = client.post(f"/api/v1/chat/{user.id}/chat", json={"user_message": "Do it all"})
+    assert response.status_code == 200
+
+    results = [json.loads(m["content"]) for m in fake.requests[1]["messages"] if m["role"] == "tool"]
+    assert [r["success"] for r in results] == [True, False, False, False, True]
+    assert results[1]["message"] == "Task not found"
+
+    session.expire_all()
+    tasks = session.exec(select(Task).order_by(Task.change_seq, Task.title)).all()
+    assert [(t.title, t.change_seq) for t in tasks] == [("Existing", 0), ("Buy milk", 1), ("Call mum", 2)]
+    assert tasks[0].due_date is None
+    assert published == ["task.created", "task.created"]
+
+    # New conversation, user message, all five tool calls, reply
+    assert len(commits) == 4
+
+
+def test_metrics_cover_requests_llm_calls_and_tools(client: TestClient, user: User):
+    from config import settings
+    from utils.llm import LLMClient, get_llm_client
+    from utils.metrics import http_request_duration, llm_tokens, mcp_tool_duration, mcp_tool_errors
+    from tests.fake_openai import FakeOpenAI
+
+    def observed(family, **labels):
+        child = family.child(**labels)
+        return child.count if child else 0
+
+    route = "/api/v1/chat/{user_id}/chat"
+    requests_before = observed(http_request_duration, method="POST", route=route, status="200")
+    tokens_before = llm_tokens.value(model=settings.openai_model, type="completion")
+    adds_before = observed(mcp_tool_duration, tool="add_task")
+    errors_before = mcp_tool_errors.value(tool="delete_task")
+
+    fake = FakeOpenAI()
+    fake.reply_tool_calls(
+        {"name": "add_task", "arguments": {"title": "Measured"}},
+        {"name": "delete_task", "arguments": {"task_id": str(uuid4())}},
+    )
+    fake.reply_text("Done")
+    app.dependency_overrides[get_llm_client] = lambda: LLMClient(fake.client(), max_concurrency=4)
+
+    response = client.post(f"/api/v1/chat/{user.id}/chat", json={"user_message": "Add and delete"})
+    assert response.status_code == 200
+
+    # Requests are keyed by route template, not by the user ID in the URL
+    assert observed(http_request_duration, method="POST", route=route, status="200") == requests_before + 1
+    assert llm_tokens.value(model=settings.openai_model, type="completion") == tokens_before + 10
+    assert observed(mcp_tool_duration, tool="add_task") == adds_before + 1
+    assert mcp_tool_errors.value(tool="delete_task") == errors_before + 1
+
+    # Streamed completions report their usage in a final chunk
+    tokens_before = llm_tokens.value(model=settings.openai_model, type="completion")
+    fake.reply_tool_calls({"name": "list_tasks", "arguments": {}})
+    fake.reply_text("Nothing left")
+    response = client.post(f"/api/v1/chat/{user.id}/chat/stream", json={"user_message": "What is left?"})
+    assert response.status_code == 200
+    assert all(request["stream_options"] == {"include_usage": True} for request in fake.requests[-2:])
+    assert llm_tokens.value(model=settings.openai_model, type="completion") == tokens_before + 10
+
+    metrics = client.get("/metrics")
+    assert metrics.status_code == 200
+    assert metrics.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert f'http_request_duration_seconds_count{{method="POST",route="{route}",status="200"}}' in metrics.text
+    assert 'http_requests_in_progress{method="GET"} 1' in metrics.text
+    assert "# TYPE mcp_tool_duration_seconds histogram" in metrics.text
+
+
+def test_chat_request_is_traced_with_nested_spans(client: TestClient, user: User, async_engine, monkeypatch):
+    import logging
+    from utils import tracing
+    from utils.llm import LLMClient, get_llm_client
+    from tests.fake_openai import FakeOpenAI
+
+    exporter = tracing.MemorySpanExporter()
+    monkeypatch.setattr(tracing.tracer, "exporter", exporter)
+    tracing.instrument_engine(async_engine.sync_engine)
+
+    fake = FakeOpenAI()
+    fake.reply_tool_calls({"name": "add_task", "arguments": {"title": "Traced"}})
+    fake.reply_text("Done")
+    app.dependency_overrides[get_llm_client] = lambda: LLMClient(fake.client(), max_concurrency=4)
+
+    response = client.post(
+        f"/api/v1/chat/{user.id}/chat", json={"user_message": "Add it"}, headers={"X-Request-ID": "req-123"}
+    )
+    assert response.status_code == 200
+    assert response.headers["x-request-id"] == "req-123"
+
+    spans = {span.span_id: span for span in exporter.spans}
+    root = exporter.spans[-1]
+    assert root.name == "POST /api/v1/chat/{user_id}/chat"
+    assert root.parent_id is None
+    assert root.attributes["http.request_id"] == "req-123"
+    assert {span.trace_id for span in exporter.spans} == {root.trace_id}
+
+    def parent_name(span):
+        return spans[span.parent_id].name
+
+    stages = [span.name for span in exporter.spans if span.parent_id == root.span_id]
+    assert stages == [
+        "chat.load_user", "chat.save_user_message", "chat.build_context", "chat.completion",
+        "chat.tool_calls", "chat.completion", "chat.save_assistant_message"
+    ]
+    llm_calls = [span for span in exporter.spans if span.name == "openai.chat.completions"]
+    assert [parent_name(span) for span in llm_calls] == ["chat.completion", "chat.completion"]
+    assert llm_calls[0].attributes["gen_ai.usage.output_tokens"] == 5
+    tool_span, = [span for span in exporter.spans if span.name == "mcp.execute_tool"]
+    assert parent_name(tool_span) == "chat.tool_calls"
+    assert tool_span.attributes["mcp.tool"] == "add_task"
+    # The tool's INSERT runs inside its span
+    assert any(
+        span.name == "db.query" and span.parent_id == tool_span.span_id
+        and span.attributes["db.statement"].startswith("INSERT INTO task")
+        for span in exporter.spans
+    )
+
+    # Log records made while serving a request carry its IDs
+    record = logging.LogRecord("test", logging.INFO, __file__, 0, "message", None, None)
+    token = tracing.request_id_var.set("req-456")
+    try:
+        tracing.RequestIdFilter().filter(record)
+    finally:
+        tracing.request_id_var.reset(token)
+    assert record.request_id == "req-456"
+
+
+def test_message_history_is_paginated_newest_first(client: TestClient, session: Session, user: User):
+    _seed_conversations(session, user, count=1, messages_each=5)
+    conversation = session.exec(select(Conversation)).one()
+
+    contents, before = [], None
+    while True:
+        params = {"conversation_id": str(conversation.id), "limit": 2}
+        if before:
+            params["before"] = before
+        response = client.get(f"/api/v1/chat/{user.id}/chat", params=params)
+        assert response.status_code == 200
+        assert len(response.json()) <= 2
+        contents.extend(message["content"] for message in response.json())
+        before = response.headers.get("X-Next-Cursor")
+        if not before:
+            break
+
+    assert contents == [f"conversation 0 message {m}" for m in range(4, -1, -1)]
+
+
+def test_chat_context_is_the_most_recent_messages(client: TestClient, session: Session, user: User):
+    from config import settings
+    from utils.llm import LLMClient, get_llm_client
+    from tests.fake_openai import FakeOpenAI
+
+    _seed_conversations(session, user, count=1, messages_each=settings.chat_context_messages + 5)
+
+    fake = FakeOpenAI()
+    fake.reply_text("Noted")
+    app.dependency_overrides[get_llm_client] = lambda: LLMClient(fake.client(), max_concurrency=4)
+
+    response = client.post(f"/api/v1/chat/{user.id}/chat", json={"user_message": "Latest question"})
+    assert response.status_code == 200
+
+    sent = fake.requests[0]["messages"]
+    assert sent[0]["role"] == "system"
+    history = [message["content"] for message in sent[1:]]
+    # The newest stored messages in order, ending with the new message exactly once
+    assert len(history) == settings.chat_context_messages
+    assert history[-1] == "Latest question"
+    assert history[-2] == f"conversation 0 message {settings.chat_context_messages + 4}"
+    assert history.count("Latest question") == 1
+
+
+def test_chat_context_fits_token_budget_and_summarizes_older_messages(
+    client: TestClient, session: Session, user: User, monkeypatch
+):
+    from config import settings
+    from api.v1.chat import SYSTEM_PROMPT, get_tool_definitions
+    from utils.context import MESSAGE_OVERHEAD_TOKENS, count_tokens
+    from utils.llm import LLMClient, get_llm_client
+    from tests.fake_openai import FakeOpenAI
+
+    reserved = (
+        count_tokens(SYSTEM_PROMPT) + MESSAGE_OVERHEAD_TOKENS + settings.chat_summary_max_tokens
+        + count_tokens(json.dumps(get_tool_definitions()))
+    )
+    monkeypatch.setattr(settings, "chat_context_token_budget", reserved + 50)
+    monkeypatch.setattr(settings, "chat_summary_min_messages", 5)
+    _seed_conversations(session, user, count=1, messages_each=30)
+
+    fake = FakeOpenAI()
+    fake.reply_text("The user asked about 30 things")
+    fake.reply_text("Noted")
+    fake.reply_text("Noted again")
+    app.dependency_overrides[get_llm_client] = lambda: LLMClient(fake.client(), max_concurrency=4)
+
+    response = client.post(f"/api/v1/chat/{user.id}/chat", json={"user_message": "Latest question"})
+    assert response.status_code == 200
+    assert response.json()["assistant_message"] == "Noted"
+
+    # The messages that no longer fit were summarized first
+    summary_request, chat_request = fake.requests[0], fake.requests[1]
+    assert "conversation 0 message 0" in summary_request["messages"][-1]["content"]
+    assert "tools" not in summary_request
+
+    sent = chat_request["messages"]
+    assert sent[0]["content"].endswith("The user asked about 30 things")
+    history = [message["content"] for message in sent[1:]]
+    assert 1 < len(history) < 31
+    assert history[-1] == "Latest question"
+    assert sum(MESSAGE_OVERHEAD_TOKENS + count_tokens(content) for content in history) <= 50
+
+    session.expire_all()
+    conversation = session.exec(select(Conversation)).one()
+    assert conversation.summary == "The user asked about 30 things"
+    assert conversation.summarized_until is not None
+
+    # Too few new messages fell out of the window to summarize again
+    response = client.post(f"/api/v1/chat/{user.id}/chat", json={"user_message": "Another one"})
+    assert response.json()["assistant_message"] == "Noted again"
+    assert len(fake.requests) == 3
+    assert fake.requests[2]["messages"][0]["content"].endswith("The user asked about 30 things")
+
+
+def test_tool_registry_builds_definitions_once_and_validates_arguments(async_engine, monkeypatch):
+    import asyncio
+    from mcp.server import mcp_server
+
+    definitions = mcp_server.get_tool_definitions()
+    assert mcp_server.get_tool_definitions() is definitions
+    assert [d["function"]["name"] for d in definitions] == [
+        "add_task", "list_tasks", "complete_task", "delete_task", "update_task"
+    ]
+    add_task = mcp_server.get_tool_description("add_task")
+    assert add_task["parameters"]["required"] == ["title"]
+    assert add_task["parameters"]["properties"]["priority"]["enum"] == ["low", "medium", "high"]
+
+    calls = []
+
+    async def fake_list_tasks(session, user_id, **params):
+        calls.append((str(user_id), params))
+        return {"success": True}
+
+    monkeypatch.setattr(mcp_server.tools["list_tasks"], "func", fake_list_tasks)
+
+    user_id = str(uuid4())
+
+    async def scenario():
+        async with AsyncSession(async_engine) as session:
+            return [
+                await mcp_server.execute_tool("list_tasks", user_id, session, priority="high,low", limit=5),
+                await mcp_server.execute_tool("list_tasks", user_id, session, limit=500),
+                await mcp_server.execute_tool("list_tasks", user_id, session, colour="red"),
+                await mcp_server.execute_tool("add_task", user_id, session, priority="urgent"),
+            ]
+
+    ok, too_many, unknown, missing_title = asyncio.run(scenario())
+    assert ok == {"success": True}
+    # Only validated, explicitly set arguments reach the tool
+    assert calls == [(user_id, {"priority": ["high", "low"], "limit": 5})]
+    for result in (too_many, unknown, missing_title):
+        assert result["success"] is False
+        assert result["message"].startswith("Invalid arguments")
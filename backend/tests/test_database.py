@@ -0,0 +1,177 @@
+import pytest
+from sqlalchemy import bindparam, column, insert, table, text
+from sqlalchemy.exc import OperationalError
+from sqlmodel import create_engine
+from config import settings
+from database import configure_sqlite_engine, is_sqlite_file
+
+
+def test_sqlite_profile_is_applied_to_every_connection(tmp_path):
+    database_url = f"sqlite:///{tmp_path / 'tuned.db'}"
+    engine = create_engine(database_url)
+    configure_sqlite_engine(engine)
+
+    with engine.connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert connection.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert connection.execute(text("PRAGMA busy_timeout")).scalar() == settings.sqlite_busy_timeout_ms
+        assert connection.execute(text("PRAGMA cache_size")).scalar() == -settings.sqlite_cache_size_kib
+        assert connection.execute(text("PRAGMA foreign_keys")).scalar() == 1
+    engine.dispose()
+
+
+def test_sqlite_read_only_connections_reject_writes(tmp_path):
+    database_url = f"sqlite:///{tmp_path / 'tuned.db'}"
+    writer = create_engine(database_url)
+    configure_sqlite_engine(writer)
+    reader = create_engine(database_url)
+    configure_sqlite_engine(reader, read_only=True)
+
+    with writer.begin() as connection:
+        connection.execute(text("CREATE TABLE note (body TEXT)"))
+        connection.execute(text("INSERT INTO note VALUES ('hello')"))
+
+    with reader.connect() as connection:
+        assert connection.execute(text("SELECT body FROM note")).scalar() == "hello"
+        with pytest.raises(OperationalError):
+            connection.execute(text("INSERT INTO note VALUES ('nope')"))
+    writer.dispose()
+    reader.dispose()
+
+
+def test_concurrent_read_then_write_transactions_do_not_fail(tmp_path):
+    import threading
+
+    database_url = f"sqlite:///{tmp_path / 'tuned.db'}"
+    engine = create_engine(database_url, pool_size=4)
+    configure_sqlite_engine(engine)
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE counter (value INTEGER)"))
+        connection.execute(text("INSERT INTO counter VALUES (0)"))
+
+    errors = []
+
+    def worker():
+        for _ in range(25):
+            try:
+                # Read first, then write, like the request handlers; a
+                # deferred BEGIN fails here with "database is locked"
+                with engine.begin() as connection:
+                    value = connection.execute(text("SELECT value FROM counter")).scalar()
+                    connection.execute(text("UPDATE counter SET value = :value"), {"value": value + 1})
+            except OperationalError as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    with engine.connect() as connection:
+        # No lost updates either: each transaction saw the previous one's write
+        assert connection.execute(text("SELECT value FROM counter")).scalar() == 100
+    engine.dispose()
+
+
+def test_only_sqlite_files_get_the_profile():
+    assert is_sqlite_file("sqlite:///./todo_app.db")
+    assert not is_sqlite_file("sqlite://")
+    assert not is_sqlite_file("sqlite:///:memory:")
+    assert not is_sqlite_file("postgresql://user@localhost/todo")
+
+
+def test_routing_session_reads_from_replica_until_the_user_writes(tmp_path, monkeypatch):
+    from uuid import uuid4
+    import database
+    from database import RoutingSession, session_user_id
+
+    lookups = []
+    wrote_recently = database.wrote_recently
+    monkeypatch.setattr(database, "wrote_recently", lambda user_id: lookups.append(user_id) or wrote_recently(user_id))
+
+    engines = {}
+    for name in ("primary", "replica"):
+        engines[name] = create_engine(f"sqlite:///{tmp_path / name}.db")
+        with engines[name].begin() as connection:
+            connection.execute(text("CREATE TABLE note (body TEXT)"))
+            connection.execute(text("INSERT INTO note VALUES (:body)"), {"body": name})
+
+    def session(**kwargs):
+        return RoutingSession(bind=engines["primary"], replicas=[engines["replica"]], **kwargs)
+
+    def read(s, statement=text("SELECT body FROM note LIMIT 1")):
+        return s.execute(statement).scalar()
+
+    token = session_user_id.set(uuid4())
+    try:
+        with session(info={"replica_reads": True}) as s:
+            assert read(s) == "replica"
+            assert read(s) == "replica"
+        # The recent write marker is looked up once per session
+        assert len(lookups) == 1
+
+        # Write sessions read from the primary unless a statement opts in
+        with session() as s:
+            assert read(s) == "primary"
+            assert read(s, text("SELECT body FROM note LIMIT 1").execution_options(replica_reads=True)) == "replica"
+
+        with session() as s:
+            opted_in = text("SELECT body FROM note LIMIT 1").execution_options(replica_reads=True)
+            assert read(s, opted_in) == "replica"
+            s.execute(insert(table("note", column("body"))).values(body="new"))
+            s.commit()
+            assert read(s, opted_in) == "primary"
+
+        # The user's next reads see their own write
+        with session(info={"replica_reads": True}) as s:
+            assert read(s) == "primary"
+
+        session_user_id.set(uuid4())
+        with session(info={"replica_reads": True}) as s:
+            assert read(s) == "replica"
+    finally:
+        session_user_id.reset(token)
+        for engine in engines.values():
+            engine.dispose()
+
+
+def test_query_metrics_record_latency_rows_and_slow_queries(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    from main import app
+    from utils.metrics import QueryMetrics, instrument_engine, query_metrics
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'metrics.db'}")
+    metrics = QueryMetrics(slow_samples=2)
+    instrument_engine(engine, metrics)
+
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE note (id INTEGER, body TEXT)"))
+        connection.execute(text("INSERT INTO note VALUES (1, 'a'), (2, 'b'), (3, 'c')"))
+        for ids in ([1, 2], [1, 2, 3]):
+            connection.execute(
+                text("SELECT body FROM note WHERE id IN :ids").bindparams(bindparam("ids", expanding=True)),
+                {"ids": ids}
+            )
+        monkeypatch.setattr(settings, "slow_query_threshold_ms", 0)
+        connection.execute(text("UPDATE note SET body = 'z' WHERE id > 1"))
+    engine.dispose()
+
+    snapshot = metrics.snapshot()
+    statements = {s["statement"]: s for s in snapshot["statements"]}
+    # Different IN list lengths are one query shape
+    select = statements["SELECT body FROM note WHERE id IN (?...)"]
+    assert select["count"] == 2
+    assert select["buckets_ms"]["+Inf"] == 2
+    assert statements["UPDATE note SET body = 'z' WHERE id > 1"]["rows"] == 2
+
+    # Only the statement run after the threshold dropped counts as slow
+    assert [(s["statement"], s["rows"]) for s in snapshot["slow_queries"]] == [
+        ("UPDATE note SET body = 'z' WHERE id > 1", 2)
+    ]
+    assert "parameters" not in snapshot["slow_queries"][0]
+
+    response = TestClient(app).get("/api/v1/metrics/queries")
+    assert response.status_code == 200
+    assert response.json().keys() == query_metrics.snapshot().keys()
@@ -4,33 +4,39 @@ Integration test to verify the full application functionality
 import pytest
 from fastapi.testclient import TestClient
 from sqlmodel import Session, SQLModel, create_engine
-from sqlmodel.pool import StaticPool
-from backend.main import app
-from backend.database import get_session
-from backend.models.user import User
-from backend.models.task import Task
-from backend.utils.security import get_password_hash
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from main import app
+from database import get_async_session, get_read_session
+from models.user import User
+from models.task import Task
+from utils.security import get_password_hash
 from uuid import uuid4
 from datetime import datetime
 
 
-def test_full_application_flow():
+def test_full_application_flow(tmp_path):
     """
     Test the full application flow: register user -> login -> create task -> get task -> update task -> delete task
     """
-    # Create an in-memory database for testing
+    # Create a throwaway database for testing
+    database_path = tmp_path / "test.db"
     engine = create_engine(
-        "sqlite:///:memory:",
+        f"sqlite:///{database_path}",
         connect_args={"check_same_thread": False},
-        poolclass=StaticPool,
     )
     SQLModel.metadata.create_all(bind=engine)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{database_path}", poolclass=NullPool)
     
     with Session(engine) as session:
-        def get_session_override():
-            return session
+        async def get_async_session_override():
+            async with AsyncSession(async_engine, expire_on_commit=False) as async_session:
+                yield async_session
 
-        app.dependency_overrides[get_session] = get_session_override
+        app.dependency_overrides[get_async_session] = get_async_session_override
+
+        app.dependency_overrides[get_read_session] = get_async_session_override
         client = TestClient(app)
         
         # 1. Register a new user
@@ -146,4 +152,7 @@ def test_full_application_flow():
 
 
 if __name__ == "__main__":
-    test_full_application_flow()
\ No newline at end of file
+    import tempfile
+    from pathlib import Path
+    with tempfile.TemporaryDirectory() as tmp:
+        test_full_application_flow(Path(tmp))
\ No newline at end of file
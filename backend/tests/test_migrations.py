@@ -0,0 +1,138 @@
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from sqlmodel import SQLModel, create_engine
+from database import run_migrations, _import_models, include_schema_name
+
+
+def test_migrations_match_models(tmp_path):
+    database_url = f"sqlite:///{tmp_path / 'migrated.db'}"
+    run_migrations(database_url)
+
+    _import_models()
+    engine = create_engine(database_url)
+    with engine.connect() as connection:
+        context = MigrationContext.configure(connection, opts={"include_name": include_schema_name})
+        diff = compare_metadata(context, SQLModel.metadata)
+    engine.dispose()
+
+    assert diff == []
+
+
+def test_migrations_adopt_create_all_database(tmp_path):
+    # Databases created before migrations existed already have every table
+    database_url = f"sqlite:///{tmp_path / 'legacy.db'}"
+    _import_models()
+    engine = create_engine(database_url)
+    SQLModel.metadata.create_all(engine)
+    engine.dispose()
+
+    run_migrations(database_url)
+
+
+def test_every_task_sort_order_is_served_by_an_index(tmp_path):
+    from uuid import uuid4
+    from sqlalchemy import text
+    from sqlmodel import select
+    from models.task import Task
+    from utils.pagination import TASK_SORT_KEYS, paginate_tasks
+
+    database_url = f"sqlite:///{tmp_path / 'migrated.db'}"
+    run_migrations(database_url)
+    engine = create_engine(database_url)
+    with engine.connect() as connection:
+        for sort in TASK_SORT_KEYS:
+            query = paginate_tasks(select(Task).where(Task.user_id == uuid4()), sort, 50, None)
+            compiled = query.compile(engine, compile_kwargs={"literal_binds": True})
+            plan = connection.execute(text(f"EXPLAIN QUERY PLAN {compiled}")).fetchall()
+            details = " | ".join(row[-1] for row in plan)
+            assert "USING INDEX" in details and "TEMP B-TREE" not in details, (sort, details)
+    engine.dispose()
+
+
+def test_search_index_survives_vacuum(tmp_path):
+    from datetime import datetime
+    from uuid import uuid4
+    from sqlalchemy import insert, select, text
+    from models.task import Task
+    from models.user import User
+    from utils.search import apply_task_search
+
+    database_url = f"sqlite:///{tmp_path / 'migrated.db'}"
+    # Tasks written under the rowid-keyed index of 0005 are carried over
+    run_migrations(database_url, revision="0008")
+    engine = create_engine(database_url)
+    user_id, now = uuid4(), datetime.utcnow()
+    tasks = {title: uuid4() for title in ("Water plants", "Pay rent", "Book dentist")}
+    with engine.begin() as connection:
+        connection.execute(insert(User.__table__).values(
+            id=user_id, email="search@example.com", hashed_password="x", created_at=now
+        ))
+        connection.execute(insert(Task.__table__), [
+            {"id": task_id, "user_id": user_id, "title": title, "created_at": now, "updated_at": now}
+            for title, task_id in tasks.items()
+        ])
+    run_migrations(database_url)
+
+    def search(q):
+        query, _ = apply_task_search(select(Task.id), q, "sqlite")
+        with engine.connect() as connection:
+            return connection.execute(query).scalars().all()
+
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM task WHERE title = 'Water plants'"))
+        connection.execute(insert(Task.__table__).values(
+            id=uuid4(), user_id=user_id, title="Call plumber", created_at=now, updated_at=now
+        ))
+    # VACUUM may renumber the implicit rowids of task; search must not care
+    with engine.connect() as connection:
+        connection.execution_options(isolation_level="AUTOCOMMIT").execute(text("VACUUM"))
+
+    assert search("rent") == [tasks["Pay rent"]]
+    assert search("dentist") == [tasks["Book dentist"]]
+    assert search("water") == []
+    assert len(search("plumb")) == 1
+    engine.dispose()
+
+
+def test_full_sync_returns_tasks_written_before_change_sequences(tmp_path):
+    import asyncio
+    from datetime import datetime
+    from uuid import uuid4
+    import sqlalchemy as sa
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlmodel.ext.asyncio.session import AsyncSession
+    from utils.task_sync import get_changes, get_task_version
+
+    database_url = f"sqlite:///{tmp_path / 'migrated.db'}"
+    run_migrations(database_url, revision="0002")
+    engine = create_engine(database_url)
+    user_id, task_id, now = uuid4(), uuid4(), datetime.utcnow()
+    # The tables as they were at 0002
+    user = sa.table("user", sa.column("id", sa.Uuid()), sa.column("email"), sa.column("hashed_password"),
+                    sa.column("created_at", sa.DateTime()))
+    task = sa.table("task", sa.column("id", sa.Uuid()), sa.column("user_id", sa.Uuid()), sa.column("title"),
+                    sa.column("completed", sa.Boolean()), sa.column("created_at", sa.DateTime()),
+                    sa.column("updated_at", sa.DateTime()))
+    with engine.begin() as connection:
+        connection.execute(user.insert().values(
+            id=user_id, email="legacy@example.com", hashed_password="x", created_at=now
+        ))
+        connection.execute(task.insert().values(
+            id=task_id, user_id=user_id, title="Legacy", completed=False, created_at=now, updated_at=now
+        ))
+    engine.dispose()
+    run_migrations(database_url)
+
+    async def sync():
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'migrated.db'}")
+        async with AsyncSession(async_engine) as session:
+            tasks, deleted = await get_changes(session, user_id, 0)
+            version = await get_task_version(session, user_id)
+        await async_engine.dispose()
+        return tasks, deleted, version
+
+    tasks, deleted, version = asyncio.run(sync())
+    assert [t.id for t in tasks] == [task_id]
+    assert deleted == []
+    # Clients that synced to the returned version see no changes after it
+    assert version == tasks[0].change_seq == 1
@@ -1,23 +1,24 @@
 import pytest
 from fastapi.testclient import TestClient
 from sqlmodel import Session, SQLModel, create_engine
-from sqlmodel.pool import StaticPool
-from backend.main import app
-from backend.database import get_session
-from backend.models.user import User
-from backend.models.task import Task
-from backend.utils.security import get_password_hash
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from main import app
+from database import get_async_session, get_read_session
+from models.user import User
+from models.task import Task
+from utils.security import get_password_hash
 from uuid import uuid4
 from datetime import datetime
 
 
 # Create a test database engine
 @pytest.fixture(name="session")
-def session_fixture():
+def session_fixture(tmp_path):
     engine = create_engine(
-        "sqlite:///:memory:",
+        f"sqlite:///{tmp_path / 'test.db'}",
         connect_args={"check_same_thread": False},
-        poolclass=StaticPool,
     )
     SQLModel.metadata.create_all(bind=engine)
     with Session(engine) as session:
@@ -26,10 +27,19 @@ def session_fixture():
 
 @pytest.fixture(name="client")
 def client_fixture(session: Session):
-    def get_session_override():
-        return session
+    # The app talks to the same database file through the async driver
+    async_engine = create_async_engine(
+        session.get_bind().url.set(drivername="sqlite+aiosqlite"),
+        poolclass=NullPool,
+    )
+
+    async def get_async_session_override():
+        async with AsyncSession(async_engine, expire_on_commit=False) as async_session:
+            yield async_session
 
-    app.dependency_overrides[get_session] = get_session_override
+    app.dependency_overrides[get_async_session] = get_async_session_override
+
+    app.dependency_overrides[get_read_session] = get_async_session_override
     client = TestClient(app)
     yield client
     app.dependency_overrides.clear()
@@ -50,13 +60,13 @@ def authenticated_client_fixture(client: TestClient, session: Session):
     
     # Get a token for the user (we'll simulate this since we can't easily authenticate)
     # For testing purposes, we'll bypass authentication by overriding the dependency
-    from backend.models.user import User as UserModel
+    from models.user import User as UserModel
     
     def get_current_user_override():
         return user
 
     # Import here to avoid circular import issues
-    from backend.utils.auth import get_current_user
+    from utils.auth import get_current_user
     app.dependency_overrides[get_current_user] = get_current_user_override
     
     yield client
@@ -194,4 +204,438 @@ def test_delete_task(authenticated_client: TestClient):
     
     # Verify the task is gone
     response = authenticated_client.get(f"/api/v1/tasks/{task_id}")
-    assert response.status_code == 404
\ No newline at end of file
+    assert response.status_code == 404
+
+def test_get_tasks_cursor_pagination(authenticated_client: TestClient, session: Session):
+    from sqlmodel import select
+    from datetime import timedelta
+
+    user = session.exec(select(User)).one()
+    base = datetime(2026, 1, 1)
+    for i in range(7):
+        session.add(Task(
+            title=f"Task {i}",
+            priority=["low", "medium", "high"][i % 3],
+            due_date=base + timedelta(days=7 - i) if i % 2 else None,
+            user_id=user.id,
+            created_at=base + timedelta(minutes=i),
+            updated_at=base + timedelta(minutes=i),
+        ))
+    session.commit()
+
+    for sort in ("created_at", "due_date", "priority"):
+        titles = []
+        cursor = None
+        while True:
+            params = {"sort": sort, "limit": 3}
+            if cursor:
+                params["cursor"] = cursor
+            response = authenticated_client.get("/api/v1/tasks/", params=params)
+            assert response.status_code == 200
+            titles.extend(task["title"] for task in response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+
+        # Every task shows up exactly once, in the same order as a single page
+        single_page = authenticated_client.get("/api/v1/tasks/", params={"sort": sort, "limit": 100})
+        assert titles == [task["title"] for task in single_page.json()]
+        assert sorted(titles) == [f"Task {i}" for i in range(7)]
+
+    newest_first = authenticated_client.get("/api/v1/tasks/").json()
+    assert [task["title"] for task in newest_first][:2] == ["Task 6", "Task 5"]
+
+
+def test_keyset_condition_uses_row_values_when_it_can():
+    from sqlalchemy.dialects import sqlite
+    from utils.pagination import TASK_SORT_KEYS, keyset_condition
+
+    def sql(sort, values):
+        return str(keyset_condition(TASK_SORT_KEYS[sort], values).compile(dialect=sqlite.dialect()))
+
+    # One seek into (user_id, created_at, id) however deep the page
+    assert sql("created_at", [datetime(2026, 1, 1), uuid4()]) == "(task.created_at, task.id) < (?, ?)"
+    # A NULL due date cannot be compared, so the expanded form is used
+    assert " OR " in sql("due_date", [1, None, uuid4()])
+
+
+def test_get_tasks_rejects_invalid_cursor(authenticated_client: TestClient):
+    response = authenticated_client.get("/api/v1/tasks/", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+def test_bulk_task_operations(authenticated_client: TestClient, session: Session):
+    from sqlmodel import select
+
+    response = authenticated_client.post("/api/v1/tasks/bulk/create", json={
+        "tasks": [{"title": f"Bulk {i}", "priority": "low"} for i in range(5)]
+    })
+    assert response.status_code == 200
+    created = response.json()
+    assert [item["status"] for item in created] == [201] * 5
+    ids = [item["id"] for item in created]
+
+    # A task owned by somebody else and an unknown ID fail individually
+    other = User(id=uuid4(), email="other@example.com", hashed_password="x", created_at=datetime.utcnow())
+    session.add(other)
+    foreign = Task(title="Not yours", user_id=other.id)
+    session.add(foreign)
+    session.commit()
+    missing = str(uuid4())
+
+    response = authenticated_client.post("/api/v1/tasks/bulk/update", json={"tasks": [
+        {"id": ids[0], "title": "Renamed"},
+        {"id": ids[1], "priority": "high"},
+        {"id": str(foreign.id), "title": "Hijacked"},
+        {"id": missing, "title": "Ghost"},
+    ]})
+    assert response.status_code == 200
+    results = response.json()
+    assert [item["status"] for item in results] == [200, 200, 403, 404]
+    assert results[0]["task"]["title"] == "Renamed"
+    assert results[0]["task"]["priority"] == "low"
+    assert results[1]["task"]["priority"] == "high"
+
+    response = authenticated_client.post("/api/v1/tasks/bulk/complete", json={"ids": ids[:3] + [str(foreign.id)]})
+    assert [item["status"] for item in response.json()] == [200, 200, 200, 403]
+    assert all(item["task"]["completed"] for item in response.json()[:3])
+
+    response = authenticated_client.post("/api/v1/tasks/bulk/delete", json={"ids": ids[3:] + [missing]})
+    assert [item["status"] for item in response.json()] == [200, 200, 404]
+
+    session.expire_all()
+    remaining = session.exec(select(Task).where(Task.user_id != other.id)).all()
+    assert sorted((t.title, t.completed) for t in remaining) == [
+        ("Bulk 1", True), ("Bulk 2", True), ("Renamed", True)
+    ]
+    assert {str(t.id) for t in remaining} == set(ids[:3])
+    assert session.get(Task, foreign.id).title == "Not yours"
+
+
+def test_bulk_request_size_is_limited(authenticated_client: TestClient):
+    from models.task import BULK_MAX_ITEMS
+
+    response = authenticated_client.post("/api/v1/tasks/bulk/delete", json={"ids": []})
+    assert response.status_code == 422
+    response = authenticated_client.post(
+        "/api/v1/tasks/bulk/delete", json={"ids": [str(uuid4()) for _ in range(BULK_MAX_ITEMS + 1)]}
+    )
+    assert response.status_code == 422
+
+
+def test_task_etags_and_conditional_requests(authenticated_client: TestClient):
+    created = authenticated_client.post("/api/v1/tasks/", json={"title": "Versioned"})
+    task_id = created.json()["id"]
+
+    response = authenticated_client.get(f"/api/v1/tasks/{task_id}")
+    etag = response.headers["ETag"]
+    assert etag == created.headers["ETag"]
+
+    response = authenticated_client.get(f"/api/v1/tasks/{task_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    listing = authenticated_client.get("/api/v1/tasks/")
+    list_etag = listing.headers["ETag"]
+    assert authenticated_client.get("/api/v1/tasks/", headers={"If-None-Match": list_etag}).status_code == 304
+    # A different page shape has a different ETag
+    assert authenticated_client.get("/api/v1/tasks/", params={"completed": True}).headers["ETag"] != list_etag
+
+    # Writes with a stale If-Match are rejected, current ones go through
+    response = authenticated_client.put(
+        f"/api/v1/tasks/{task_id}", json={"title": "Renamed"}, headers={"If-Match": etag}
+    )
+    assert response.status_code == 200
+    new_etag = response.headers["ETag"]
+    assert new_etag != etag
+
+    response = authenticated_client.put(
+        f"/api/v1/tasks/{task_id}", json={"title": "Lost update"}, headers={"If-Match": etag}
+    )
+    assert response.status_code == 412
+    response = authenticated_client.patch(f"/api/v1/tasks/{task_id}/complete", headers={"If-Match": etag})
+    assert response.status_code == 412
+    response = authenticated_client.patch(f"/api/v1/tasks/{task_id}/complete", headers={"If-Match": new_etag})
+    assert response.status_code == 200
+
+    # Every write moves the collection to a new version
+    response = authenticated_client.get("/api/v1/tasks/", headers={"If-None-Match": list_etag})
+    assert response.status_code == 200
+    assert response.json()[0]["title"] == "Renamed"
+
+
+def test_concurrent_updates_with_the_same_etag_cannot_both_apply(session: Session, monkeypatch):
+    import asyncio
+    from fastapi import HTTPException, Response
+    from api.v1 import tasks as tasks_api
+    from models.task import TaskUpdate
+    from utils.etag import task_etag
+
+    user = User(id=uuid4(), email="race@example.com", hashed_password="x", created_at=datetime.utcnow())
+    task = Task(user_id=user.id, title="Original")
+    session.add(user)
+    session.add(task)
+    session.commit()
+    session.refresh(task)
+    etag = task_etag(task)
+
+    # Without the SQLite profile reads take no lock and only writes wait,
+    # like row locks on PostgreSQL, so the two requests can interleave
+    async_engine = create_async_engine(
+        session.get_bind().url.set(drivername="sqlite+aiosqlite"),
+        poolclass=NullPool,
+    )
+
+    # Both requests have loaded the task before either takes the write lock
+    loaded = asyncio.Barrier(2)
+    bump_task_version = tasks_api.bump_task_version
+
+    async def bump_after_both_loaded(session, user_id):
+        await loaded.wait()
+        return await bump_task_version(session, user_id)
+
+    monkeypatch.setattr(tasks_api, "bump_task_version", bump_after_both_loaded)
+
+    async def update(title):
+        async with AsyncSession(async_engine, expire_on_commit=False) as async_session:
+            try:
+                await tasks_api.update_task(
+                    task.id, TaskUpdate(title=title), Response(),
+                    current_user=user, session=async_session, if_match=etag
+                )
+                return 200
+            except HTTPException as e:
+                return e.status_code
+
+    async def scenario():
+        return await asyncio.gather(update("First"), update("Second"))
+
+    statuses = asyncio.run(scenario())
+    assert sorted(statuses) == [200, 412]
+    session.expire_all()
+    winner = "First" if statuses[0] == 200 else "Second"
+    assert session.get(Task, task.id).title == winner
+
+
+def test_task_changes_since_token(authenticated_client: TestClient):
+    full = authenticated_client.get("/api/v1/tasks/changes").json()
+    assert full == {"token": 0, "tasks": [], "deleted": []}
+
+    first = authenticated_client.post("/api/v1/tasks/", json={"title": "First"}).json()
+    second = authenticated_client.post("/api/v1/tasks/", json={"title": "Second"}).json()
+    sync = authenticated_client.get("/api/v1/tasks/changes", params={"since": 0}).json()
+    assert [task["title"] for task in sync["tasks"]] == ["First", "Second"]
+    token = sync["token"]
+
+    # Nothing changed: an empty delta
+    assert authenticated_client.get("/api/v1/tasks/changes", params={"since": token}).json() == {
+        "token": token, "tasks": [], "deleted": []
+    }
+
+    authenticated_client.patch(f"/api/v1/tasks/{first['id']}/complete")
+    authenticated_client.delete(f"/api/v1/tasks/{second['id']}")
+    authenticated_client.post("/api/v1/tasks/bulk/create", json={"tasks": [{"title": "Third"}]})
+
+    delta = authenticated_client.get("/api/v1/tasks/changes", params={"since": token}).json()
+    assert [(task["title"], task["completed"]) for task in delta["tasks"]] == [("First", True), ("Third", False)]
+    assert delta["deleted"] == [second["id"]]
+    assert delta["token"] > token
+
+
+def test_task_writes_publish_events(authenticated_client: TestClient, monkeypatch):
+    import utils.events
+
+    published = []
+
+    class RecordingBroker(utils.events.EventBroker):
+        async def publish(self, channel, message):
+            published.append((channel, message))
+
+    monkeypatch.setattr(utils.events, "broker", RecordingBroker())
+
+    task = authenticated_client.post("/api/v1/tasks/", json={"title": "Pushed"}).json()
+    authenticated_client.patch(f"/api/v1/tasks/{task['id']}/complete")
+    authenticated_client.delete(f"/api/v1/tasks/{task['id']}")
+
+    assert {channel for channel, _ in published} == {f"user:{task['user_id']}"}
+    assert [message["type"] for _, message in published] == ["task.created", "task.updated", "task.deleted"]
+    assert published[0][1]["task"]["title"] == "Pushed"
+    assert published[1][1]["task"]["completed"] is True
+    assert published[2][1]["task_id"] == task["id"]
+    seqs = [message["change_seq"] for _, message in published]
+    assert seqs == sorted(seqs) and len(set(seqs)) == 3
+
+
+def test_task_event_stream(session: Session):
+    import asyncio
+    from api.v1.tasks import task_events
+    from utils.events import InMemoryEventBroker, publish_task_event
+    import utils.events
+
+    user = User(id=uuid4(), email="stream@example.com", hashed_password="x", created_at=datetime.utcnow())
+    session.add(user)
+    session.commit()
+    async_engine = create_async_engine(session.get_bind().url.set(drivername="sqlite+aiosqlite"), poolclass=NullPool)
+
+    async def scenario():
+        test_broker = InMemoryEventBroker(max_queue=2)
+        original = utils.events.broker
+        utils.events.broker = test_broker
+        try:
+            async with AsyncSession(async_engine) as async_session:
+                response = await task_events(current_user=user, session=async_session)
+                chunks = response.body_iterator
+                ready = await chunks.__anext__()
+                assert ready.startswith("event: ready") and '"token": 0' in ready
+
+                await publish_task_event(user.id, "deleted", 7, task_id=user.id)
+                event = await chunks.__anext__()
+                assert event.startswith("event: task.deleted") and '"change_seq": 7' in event
+
+                # A subscriber that falls behind is told to resync and dropped
+                for seq in range(8, 12):
+                    await publish_task_event(user.id, "deleted", seq, task_id=user.id)
+                assert (await chunks.__anext__()).startswith("event: resync")
+                assert test_broker.subscriber_count(f"user:{user.id}") == 0
+                await chunks.aclose()
+        finally:
+            utils.events.broker = original
+            await async_engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_search_tasks(authenticated_client: TestClient):
+    for title, description in [
+        ("Buy groceries", "milk, eggs and bread"),
+        ("Write report", "quarterly groceries budget"),
+        ("Call plumber", None),
+    ]:
+        authenticated_client.post("/api/v1/tasks/", json={"title": title, "description": description})
+
+    def search(q, **params):
+        response = authenticated_client.get("/api/v1/tasks/", params={"q": q, **params})
+        assert response.status_code == 200
+        return [task["title"] for task in response.json()]
+
+    # Title matches rank above description matches; words match as prefixes
+    assert search("grocer") == ["Buy groceries", "Write report"]
+    assert search("plumb") == ["Call plumber"]
+    assert search("groceries milk") == ["Buy groceries"]
+    assert search("dentist") == []
+    # Search syntax in user input is treated as plain words
+    assert search('"bread" OR NOT*') == []
+    assert search("grocer", sort="created_at") == ["Write report", "Buy groceries"]
+
+    # The index follows updates and deletes
+    tasks = authenticated_client.get("/api/v1/tasks/").json()
+    plumber = next(task for task in tasks if task["title"] == "Call plumber")
+    authenticated_client.put(f"/api/v1/tasks/{plumber['id']}", json={"title": "Call electrician"})
+    assert search("plumb") == []
+    assert search("electric") == ["Call electrician"]
+    authenticated_client.delete(f"/api/v1/tasks/{plumber['id']}")
+    assert search("electric") == []
+
+    response = authenticated_client.get("/api/v1/tasks/", params={"q": "grocer", "cursor": "abc"})
+    assert response.status_code == 400
+
+
+def _seed_dated_tasks(session: Session):
+    from sqlmodel import select
+    from datetime import timedelta
+
+    user = session.exec(select(User)).one()
+    now = datetime.utcnow()
+    for title, priority, due_in, completed, age in [
+        ("Late and open", "high", -2, False, 10),
+        ("Late but done", "low", -1, True, 9),
+        ("Due soon", "medium", 1, False, 3),
+        ("Due later", "high", 10, False, 2),
+        ("Whenever", "low", None, False, 1),
+    ]:
+        session.add(Task(
+            title=title,
+            priority=priority,
+            completed=completed,
+            due_date=now + timedelta(days=due_in) if due_in is not None else None,
+            user_id=user.id,
+            created_at=now - timedelta(days=age),
+            updated_at=now - timedelta(hours=age),
+        ))
+    session.commit()
+    return user, now
+
+
+def test_get_tasks_filters_and_sorts(authenticated_client: TestClient, session: Session):
+    from datetime import timedelta
+
+    _, now = _seed_dated_tasks(session)
+
+    def titles(**params):
+        response = authenticated_client.get("/api/v1/tasks/", params=params)
+        assert response.status_code == 200, response.text
+        return [task["title"] for task in response.json()]
+
+    assert titles(overdue=True) == ["Late and open"]
+    assert titles(priority=["high", "low"], completed=False) == ["Whenever", "Due later", "Late and open"]
+    assert titles(priority="high,medium", sort="due_date") == ["Late and open", "Due soon", "Due later"]
+    assert titles(due_after=now.isoformat(), due_before=(now + timedelta(days=5)).isoformat()) == ["Due soon"]
+    assert titles(created_after=(now - timedelta(days=5)).isoformat() + "Z") == ["Whenever", "Due later", "Due soon"]
+    assert titles(sort="updated_at")[:2] == ["Whenever", "Due later"]
+
+    assert authenticated_client.get("/api/v1/tasks/", params={"priority": "urgent"}).status_code == 422
+    # Clock-dependent results are not cached
+    assert "ETag" not in authenticated_client.get("/api/v1/tasks/", params={"overdue": True}).headers
+
+
+def test_list_tasks_tool_uses_shared_filters(session: Session):
+    import asyncio
+    import mcp.tools
+
+    session.add(User(id=uuid4(), email="tool@example.com", hashed_password="x", created_at=datetime.utcnow()))
+    session.commit()
+    user, _ = _seed_dated_tasks(session)
+    async_engine = create_async_engine(session.get_bind().url.set(drivername="sqlite+aiosqlite"), poolclass=NullPool)
+
+    async def scenario():
+        try:
+            async with AsyncSession(async_engine) as async_session:
+                overdue = await mcp.tools.list_tasks_tool(async_session, user.id, overdue=True)
+                by_due = await mcp.tools.list_tasks_tool(async_session, user.id, priority=["high"], sort="due_date", limit=1)
+                bad = await mcp.tools.list_tasks_tool(async_session, user.id, sort="colour")
+            return overdue, by_due, bad
+        finally:
+            await async_engine.dispose()
+
+    overdue, by_due, bad = asyncio.run(scenario())
+    assert [task["title"] for task in overdue["tasks"]] == ["Late and open"]
+    assert [task["title"] for task in by_due["tasks"]] == ["Late and open"]
+    assert by_due["has_more"] is True
+    assert bad["success"] is False
+
+
+def test_task_stats(authenticated_client: TestClient, session: Session):
+    from utils.cache import cache_stats
+
+    _seed_dated_tasks(session)
+    stats = authenticated_client.get("/api/v1/tasks/stats").json()
+    assert stats == {
+        "total": 5,
+        "completed": 1,
+        "pending": 4,
+        "overdue": 1,
+        "by_priority": {
+            "low": {"total": 2, "completed": 1},
+            "medium": {"total": 1, "completed": 0},
+            "high": {"total": 2, "completed": 0},
+        },
+    }
+
+    # Unchanged tasks are served from cache; any write invalidates it
+    assert authenticated_client.get("/api/v1/tasks/stats").json() == stats
+    assert cache_stats()["task_stats"] == {"hits": 1, "misses": 1}
+
+    authenticated_client.post("/api/v1/tasks/", json={"title": "One more", "priority": "high"})
+    stats = authenticated_client.get("/api/v1/tasks/stats").json()
+    assert stats["total"] == 6
+    assert stats["by_priority"]["high"] == {"total": 3, "completed": 0}
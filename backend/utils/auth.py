@@ -1,13 +1,16 @@
+import time
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
-from sqlmodel import Session
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from .security import verify_password, get_password_hash, oauth2_scheme
+from .cache import token_cache, get_cached_user, cache_user
 from config import settings
 from models.user import User
-from database import get_session
+from database import get_async_session, set_session_user
 
 
 # Password hashing context
@@ -32,20 +35,32 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 def verify_token(token: str, credentials_exception):
     """
     Verify the provided token and return the user email if valid.
+    Decoded tokens are cached until they expire.
     """
+    if settings.user_cache_enabled:
+        cached_email = token_cache.get(token)
+        if cached_email is not None:
+            return cached_email
+
     try:
         payload = jwt.decode(token, settings.jwt_secret_key, algorithms=[settings.jwt_algorithm])
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
-        return email
     except JWTError:
         raise credentials_exception
 
+    if settings.user_cache_enabled:
+        # Never keep a token around past its own expiry
+        ttl = min(settings.user_cache_ttl_seconds, payload.get("exp", 0) - time.time())
+        token_cache.set(token, email, ttl)
+    return email
+
 
-def get_current_user(session: Session = Depends(get_session), token: str = Depends(oauth2_scheme)):
+async def get_current_user(session: AsyncSession = Depends(get_async_session), token: str = Depends(oauth2_scheme)):
     """
     Get the current user based on the provided token.
+    The user row is only fetched on a cache miss.
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -54,10 +69,16 @@ def get_current_user(session: Session = Depends(get_session), token: str = Depen
     )
 
     email = verify_token(token, credentials_exception)
-    from sqlmodel import select
-    user = session.exec(select(User).where(User.email == email)).first()
-
+    user = get_cached_user(email)
     if user is None:
-        raise credentials_exception
+        result = await session.exec(select(User).where(User.email == email))
+        user = result.first()
+
+        if user is None:
+            raise credentials_exception
+
+        cache_user(user)
 
+    # Route this request's reads with the user's own writes in mind
+    set_session_user(user.id)
     return user
\ No newline at end of file
@@ -0,0 +1,273 @@
+"""
+Caches used to keep hot lookups (token decoding, token -> user resolution)
+off the database.
+
+The default backend is an in-process TTL/LRU cache. Deployments running
+several workers can plug in a shared backend (see RedisCacheBackend) so
+invalidations are seen by every worker.
+"""
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional
+from uuid import UUID
+
+from sqlalchemy import event, inspect
+
+from config import settings
+from models.user import User
+
+
+logger = logging.getLogger(__name__)
+
+class CacheBackend:
+    """
+    Minimal key/value interface every cache backend implements.
+    """
+
+    def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class TTLCache(CacheBackend):
+    """
+    Thread-safe in-process LRU cache with per-entry expiry.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Shared cache backend for multi-worker deployments.
+    Values must be JSON serializable.
+
+    Calls are synchronous, so they are bounded by a short socket timeout,
+    and a failing Redis is treated as an empty cache: reads miss and
+    writes are dropped rather than failing the request.
+    """
+
+    def __init__(self, url: str, prefix: str = "todo:"):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("The 'redis' package is required for the redis cache backend")
+        self.client = redis.Redis.from_url(url, socket_timeout=0.05, socket_connect_timeout=0.05)
+        self.prefix = prefix
+        self._errors = redis.RedisError
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            raw = self.client.get(self.prefix + key)
+        except self._errors as e:
+            logger.warning("Redis cache read failed, treating it as a miss: %s", e)
+            return None
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        try:
+            self.client.set(self.prefix + key, json.dumps(value), px=int(ttl * 1000))
+        except self._errors as e:
+            logger.warning("Redis cache write failed: %s", e)
+
+    def delete(self, key: str) -> None:
+        try:
+            self.client.delete(self.prefix + key)
+        except self._errors as e:
+            logger.warning("Redis cache invalidation failed: %s", e)
+
+    def clear(self) -> None:
+        try:
+            for key in self.client.scan_iter(self.prefix + "*"):
+                self.client.delete(key)
+        except self._errors as e:
+            logger.warning("Redis cache clear failed: %s", e)
+
+
+class CountingCache:
+    """
+    Wraps a backend and keeps hit/miss counters.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self.backend.set(key, value, self.ttl if ttl is None else ttl)
+
+    def delete(self, key: str) -> None:
+        self.backend.delete(key)
+
+    def clear(self) -> None:
+        self.backend.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+def _user_to_dict(user: User) -> Dict[str, Any]:
+    # The password hash is never needed by request handlers, keep it out of shared caches
+    return {
+        "id": str(user.id),
+        "email": user.email,
+        "created_at": user.created_at.isoformat() if user.created_at else None,
+    }
+
+
+def _user_from_dict(data: Dict[str, Any]) -> User:
+    return User(
+        id=UUID(data["id"]),
+        email=data["email"],
+        hashed_password="",
+        created_at=datetime.fromisoformat(data["created_at"]) if data["created_at"] else None,
+    )
+
+
+def _create_backend() -> CacheBackend:
+    if settings.user_cache_backend == "redis":
+        if not settings.user_cache_redis_url:
+            raise RuntimeError("USER_CACHE_REDIS_URL must be set for the redis cache backend")
+        return RedisCacheBackend(settings.user_cache_redis_url)
+    return TTLCache(max_size=settings.user_cache_max_size)
+
+
+# Decoded JWT claims, keyed by raw token. Always in-process: decoding is
+# cheap enough that sharing it across workers would not pay off.
+token_cache = CountingCache(TTLCache(max_size=settings.user_cache_max_size), settings.user_cache_ttl_seconds)
+
+# Resolved users, keyed by email
+user_cache = CountingCache(_create_backend(), settings.user_cache_ttl_seconds)
+
+# Task statistics, keyed by user and task collection version, so any task
+# write makes the old entry unreachable. The TTL bounds how stale the
+# clock-dependent overdue count can get.
+task_stats_cache = CountingCache(TTLCache(max_size=settings.user_cache_max_size), settings.task_stats_cache_ttl_seconds)
+
+
+# Users who wrote to the primary database recently, so their reads skip the
+# replicas until those have caught up. Always in-process: it is consulted on
+# every statement a session routes and on every commit, too often for a
+# network round trip. Reads served by another worker right after a write may
+# therefore still go to a replica.
+recent_write_cache = CountingCache(TTLCache(max_size=settings.user_cache_max_size), settings.read_your_writes_seconds)
+
+
+def mark_recent_write(user_id: UUID) -> None:
+    recent_write_cache.set("wrote:" + str(user_id), True)
+
+
+def wrote_recently(user_id: UUID) -> bool:
+    return recent_write_cache.get("wrote:" + str(user_id)) is not None
+
+
+def get_cached_user(email: str) -> Optional[User]:
+    """
+    Return the cached user for an email, if any.
+    """
+    if not settings.user_cache_enabled:
+        return None
+    data = user_cache.get("user:" + email)
+    return _user_from_dict(data) if data is not None else None
+
+
+def cache_user(user: User) -> None:
+    """
+    Store a resolved user in the cache.
+    """
+    if settings.user_cache_enabled:
+        user_cache.set("user:" + user.email, _user_to_dict(user))
+
+
+def invalidate_user(email: str) -> None:
+    """
+    Drop a user from the cache. Call this whenever a user changes or is deleted.
+    """
+    user_cache.delete("user:" + email)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_changed_user(mapper, connection, target):
+    # Covers email changes too: drop the entry for the previous address
+    for email in [target.email, *inspect(target).attrs.email.history.deleted]:
+        if email:
+            invalidate_user(email)
+
+
+def clear_caches() -> None:
+    """
+    Drop every cached token, user, task statistics and recent write entry.
+    """
+    token_cache.clear()
+    user_cache.clear()
+    task_stats_cache.clear()
+    recent_write_cache.clear()
+
+
+def cache_stats() -> Dict[str, Dict[str, int]]:
+    """
+    Hit/miss counters for the token, user and task statistics caches.
+    """
+    return {"token": token_cache.stats(), "user": user_cache.stats(), "task_stats": task_stats_cache.stats()}
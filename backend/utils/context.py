@@ -0,0 +1,174 @@
+"""
+Chat context assembly.
+
+The prompt sent to the model is packed into a fixed token budget: the
+system prompt and tool schemas first, then the conversation summary, then
+as many of the most recent messages as still fit. Messages that drop out of
+the window are folded into a rolling summary stored on the conversation, so
+prompt size stays bounded however long a conversation runs.
+"""
+import json
+import logging
+from datetime import datetime
+from typing import List, Optional
+from uuid import UUID
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from config import settings
+from models.conversation import Conversation
+from models.message import Message
+from utils.llm import LLMClient
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - the estimate below is used instead
+    tiktoken = None
+
+
+logger = logging.getLogger(__name__)
+
+# Fixed per-message cost of the chat format (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+# Unsummarized messages folded into the summary per compaction
+SUMMARY_BATCH_SIZE = 200
+
+SUMMARY_PROMPT = (
+    "Summarize the conversation below between a user and a task management assistant. "
+    "Keep facts that later turns may rely on: tasks mentioned with their IDs, titles, "
+    "priorities and due dates, decisions made and open questions. Be concise."
+)
+
+_encoding = None
+
+
+def count_tokens(text: Optional[str]) -> int:
+    """
+    Tokens in `text` for the chat models; about four characters per token
+    when tiktoken is not installed.
+    """
+    global _encoding
+    if not text:
+        return 0
+    if tiktoken is None:
+        return len(text) // 4 + 1
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding("cl100k_base")
+    return len(_encoding.encode(text))
+
+
+async def load_recent_messages(
+    session: AsyncSession,
+    conversation_id: UUID,
+    limit: int,
+    after: Optional[datetime] = None
+) -> List[Message]:
+    """
+    The last `limit` messages of a conversation newer than `after`, oldest
+    first. Reads the (conversation_id, created_at) index backwards.
+    """
+    query = select(Message).where(Message.conversation_id == conversation_id)
+    if after is not None:
+        query = query.where(Message.created_at > after)
+    result = await session.exec(query.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit))
+    return list(reversed(result.all()))
+
+
+def fit_to_budget(messages: List[Message], budget: int) -> List[Message]:
+    """
+    The longest suffix of `messages` that fits in `budget` tokens. The newest
+    message is always kept, even when it alone exceeds the budget.
+    """
+    kept: List[Message] = []
+    used = 0
+    for message in reversed(messages):
+        cost = MESSAGE_OVERHEAD_TOKENS + count_tokens(message.content)
+        if kept and used + cost > budget:
+            break
+        kept.append(message)
+        used += cost
+    return list(reversed(kept))
+
+
+async def compact_conversation(
+    session: AsyncSession,
+    conversation: Conversation,
+    before: datetime,
+    llm: LLMClient
+) -> bool:
+    """
+    Fold unsummarized messages older than `before` into the conversation
+    summary once there are at least chat_summary_min_messages of them.
+    Returns whether the summary changed; failures keep the old summary.
+    """
+    query = select(Message).where(
+        Message.conversation_id == conversation.id,
+        Message.created_at < before
+    )
+    if conversation.summarized_until is not None:
+        query = query.where(Message.created_at > conversation.summarized_until)
+    result = await session.exec(
+        query.order_by(Message.created_at, Message.id).limit(SUMMARY_BATCH_SIZE)
+    )
+    older = result.all()
+    if len(older) < settings.chat_summary_min_messages:
+        return False
+
+    transcript = "\n".join(f"{message.role}: {message.content}" for message in older)
+    if conversation.summary:
+        transcript = f"Summary so far:\n{conversation.summary}\n\nNew messages:\n{transcript}"
+    try:
+        response = await llm.chat_completion(
+            model=settings.openai_model,
+            messages=[
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": transcript}
+            ],
+            max_tokens=settings.chat_summary_max_tokens
+        )
+        summary = response.choices[0].message.content
+    except Exception:
+        logger.exception("Failed to summarize conversation %s", conversation.id)
+        return False
+    if not summary:
+        return False
+
+    conversation.summary = summary
+    conversation.summarized_until = older[-1].created_at
+    session.add(conversation)
+    await session.commit()
+    return True
+
+
+async def build_context(
+    session: AsyncSession,
+    conversation: Conversation,
+    system_prompt: str,
+    tools: Optional[List[dict]] = None,
+    llm: Optional[LLMClient] = None
+) -> List[dict]:
+    """
+    Chat messages for the model within settings.chat_context_token_budget:
+    the system prompt (with the conversation summary appended) followed by
+    the most recent messages that fit. Room for a summary of
+    chat_summary_max_tokens is always reserved, so compacting never
+    pushes the prompt over budget. Pass `llm` to compact older messages.
+    """
+    reserved = count_tokens(system_prompt) + MESSAGE_OVERHEAD_TOKENS + settings.chat_summary_max_tokens
+    if tools:
+        reserved += count_tokens(json.dumps(tools))
+
+    recent = await load_recent_messages(
+        session, conversation.id, settings.chat_context_messages, after=conversation.summarized_until
+    )
+    window = fit_to_budget(recent, settings.chat_context_token_budget - reserved)
+    history = [{"role": message.role, "content": message.content} for message in window]
+
+    if llm is not None and window:
+        await compact_conversation(session, conversation, window[0].created_at, llm)
+
+    content = system_prompt
+    if conversation.summary:
+        content += f"\n\nSummary of the earlier conversation:\n{conversation.summary}"
+    return [{"role": "system", "content": content}] + history
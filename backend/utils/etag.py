@@ -0,0 +1,56 @@
+"""
+HTTP conditional request helpers.
+
+A task's ETag is derived from its ID and updated_at, so it changes on every
+write. The task list is versioned by the owner's task_version counter plus
+the query parameters that shape the page.
+"""
+import hashlib
+from typing import Any, Dict, Optional
+
+from fastapi import HTTPException, Response, status
+
+from models.task import Task
+
+
+def task_etag(task: Task) -> str:
+    return f'"{task.id.hex}-{int(task.updated_at.timestamp() * 1_000_000):x}"'
+
+
+def collection_etag(version: int, params: Dict[str, Any]) -> str:
+    shape = "&".join(f"{key}={params[key]}" for key in sorted(params) if params[key] is not None)
+    return f'"v{version}-{hashlib.sha1(shape.encode()).hexdigest()[:16]}"'
+
+
+def etag_matches(header: Optional[str], etag: str, weak: bool = True) -> bool:
+    """
+    Check an If-None-Match / If-Match header against an ETag.
+    If-None-Match uses weak comparison (W/ prefixes ignored), If-Match strong.
+    """
+    if not header:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if weak and candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+
+def check_if_match(if_match: Optional[str], task: Task) -> None:
+    """
+    Enforce optimistic concurrency: reject the write when the client's copy
+    of the task is out of date.
+    """
+    if if_match is not None and not etag_matches(if_match, task_etag(task), weak=False):
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="Task has been modified since it was last fetched"
+        )
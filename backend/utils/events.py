@@ -0,0 +1,232 @@
+"""
+Task change notifications.
+
+Every committed task write is published on the owner's channel; browsers
+subscribe through GET /api/v1/tasks/events instead of polling. The default
+broker is in-process. Deployments running several workers can plug in a
+shared broker (see RedisEventBroker) so a write handled by one worker
+reaches subscribers connected to another.
+"""
+import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Set
+from uuid import UUID
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from config import settings
+from models.task import Task, TaskPublic
+
+
+logger = logging.getLogger(__name__)
+
+# Sent to a subscriber that fell too far behind; it should resync via /changes
+RESYNC = {"type": "resync"}
+# Session.info key for events waiting on a commit
+_QUEUED_EVENTS = "queued_task_events"
+
+
+class EventBroker:
+    """
+    Minimal publish/subscribe interface every broker implements.
+    """
+
+    async def publish(self, channel: str, message: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def subscribe(self, channel: str, heartbeat: Optional[float] = None):
+        """
+        Async context manager: the subscription is live once entered and
+        yields an async iterator of messages, with None after every
+        `heartbeat` seconds without one.
+        """
+        raise NotImplementedError
+
+
+class _Subscriber:
+    def __init__(self, max_queue: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+
+
+class InMemoryEventBroker(EventBroker):
+    """
+    In-process broker: one bounded queue per subscriber. A subscriber whose
+    queue overflows gets RESYNC and is dropped rather than slowing writers.
+    """
+
+    def __init__(self, max_queue: int = 100):
+        self.max_queue = max_queue
+        self._channels: Dict[str, Set[_Subscriber]] = {}
+
+    async def publish(self, channel: str, message: Dict[str, Any]) -> None:
+        for subscriber in list(self._channels.get(channel, ())):
+            try:
+                subscriber.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self._remove(channel, subscriber)
+                while not subscriber.queue.empty():
+                    subscriber.queue.get_nowait()
+                subscriber.queue.put_nowait(RESYNC)
+
+    @asynccontextmanager
+    async def subscribe(self, channel: str, heartbeat: Optional[float] = None):
+        subscriber = _Subscriber(self.max_queue)
+        self._channels.setdefault(channel, set()).add(subscriber)
+        try:
+            yield self._iterate(subscriber, heartbeat)
+        finally:
+            self._remove(channel, subscriber)
+
+    async def _iterate(self, subscriber: _Subscriber, heartbeat: Optional[float]) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        while True:
+            try:
+                message = await asyncio.wait_for(subscriber.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            yield message
+            if message is RESYNC:
+                return
+
+    def _remove(self, channel: str, subscriber: _Subscriber) -> None:
+        subscribers = self._channels.get(channel)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._channels[channel]
+
+    def subscriber_count(self, channel: str) -> int:
+        return len(self._channels.get(channel, ()))
+
+
+class RedisEventBroker(EventBroker):
+    """
+    Shared broker for multi-worker deployments, built on Redis pub/sub.
+    """
+
+    def __init__(self, url: str, prefix: str = "todo:events:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("The 'redis' package is required for the redis event broker")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    async def publish(self, channel: str, message: Dict[str, Any]) -> None:
+        await self.client.publish(self.prefix + channel, json.dumps(message))
+
+    @asynccontextmanager
+    async def subscribe(self, channel: str, heartbeat: Optional[float] = None):
+        pubsub = self.client.pubsub()
+        await pubsub.subscribe(self.prefix + channel)
+        try:
+            yield self._iterate(pubsub, heartbeat)
+        finally:
+            await pubsub.unsubscribe(self.prefix + channel)
+            await pubsub.aclose()
+
+    async def _iterate(self, pubsub, heartbeat: Optional[float]) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        while True:
+            item = await pubsub.get_message(ignore_subscribe_messages=True, timeout=heartbeat)
+            yield json.loads(item["data"]) if item is not None else None
+
+
+def _create_broker() -> EventBroker:
+    if settings.task_events_backend == "redis":
+        if not settings.task_events_redis_url:
+            raise RuntimeError("TASK_EVENTS_REDIS_URL must be set for the redis event broker")
+        return RedisEventBroker(settings.task_events_redis_url)
+    return InMemoryEventBroker(max_queue=settings.task_events_queue_size)
+
+
+broker = _create_broker()
+
+
+def format_sse(event: str, data: dict) -> str:
+    """
+    Encode one Server-Sent Event.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def user_channel(user_id: UUID) -> str:
+    return f"user:{user_id}"
+
+
+def subscribe_task_events(user_id: UUID):
+    """
+    Subscribe to a user's task changes. See EventBroker.subscribe.
+    """
+    return broker.subscribe(user_channel(user_id), settings.task_events_heartbeat_seconds)
+
+
+def _task_event(
+    event_type: str,
+    change_seq: int,
+    task: Optional[Task] = None,
+    task_id: Optional[UUID] = None
+) -> Dict[str, Any]:
+    message: Dict[str, Any] = {"type": f"task.{event_type}", "change_seq": change_seq}
+    if task is not None:
+        message["task"] = TaskPublic.model_validate(task).model_dump(mode="json")
+    else:
+        message["task_id"] = str(task_id)
+    return message
+
+
+async def _publish(user_id: UUID, message: Dict[str, Any]) -> None:
+    try:
+        await broker.publish(user_channel(user_id), message)
+    except Exception:
+        logger.exception("Failed to publish %s event for user %s", message["type"], user_id)
+
+
+async def publish_task_event(
+    user_id: UUID,
+    event_type: str,
+    change_seq: int,
+    task: Optional[Task] = None,
+    task_id: Optional[UUID] = None
+) -> None:
+    """
+    Publish a committed task change: "created", "updated" or "deleted".
+    Delivery is best effort; clients catch up with /changes using change_seq.
+    """
+    await _publish(user_id, _task_event(event_type, change_seq, task, task_id))
+
+
+def queue_task_event(
+    session: AsyncSession,
+    user_id: UUID,
+    event_type: str,
+    change_seq: int,
+    task: Optional[Task] = None,
+    task_id: Optional[UUID] = None
+) -> None:
+    """
+    Hold a task change made in `session` until it commits; the task is
+    captured as it is now. See publish_queued_task_events.
+    """
+    message = _task_event(event_type, change_seq, task, task_id)
+    session.info.setdefault(_QUEUED_EVENTS, []).append((user_id, message))
+
+
+def queued_task_event_count(session: AsyncSession) -> int:
+    return len(session.info.get(_QUEUED_EVENTS, ()))
+
+
+def discard_queued_task_events(session: AsyncSession, keep: int = 0) -> None:
+    """
+    Drop events queued after the first `keep`, e.g. when a savepoint rolls back.
+    """
+    del session.info.get(_QUEUED_EVENTS, [])[keep:]
+
+
+async def publish_queued_task_events(session: AsyncSession) -> None:
+    """
+    Publish the events queued on `session`; call after it commits.
+    """
+    for user_id, message in session.info.pop(_QUEUED_EVENTS, []):
+        await _publish(user_id, message)
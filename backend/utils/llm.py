@@ -0,0 +1,121 @@
+"""
+Process-wide OpenAI client.
+
+One AsyncOpenAI instance is created in the application lifespan and shared
+by every request, so HTTP connections and TLS sessions are reused. A
+semaphore caps how many LLM calls are in flight at once.
+"""
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+import httpx
+from fastapi import Request
+from openai import AsyncOpenAI
+
+from config import settings
+from utils.metrics import llm_request_duration, llm_tokens
+from utils.tracing import span
+
+
+# stream_options for streamed completions: a final chunk carries token usage
+STREAM_USAGE = {"include_usage": True}
+
+
+class LLMClient:
+    """
+    Shared AsyncOpenAI client plus a concurrency limit.
+    """
+
+    def __init__(self, client: AsyncOpenAI, max_concurrency: int):
+        self.client = client
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[AsyncOpenAI]:
+        """
+        Hold one concurrency slot, e.g. while consuming a streamed response.
+        The time the slot is held is recorded as the call's latency; pass
+        the stream's usage to record_usage().
+        """
+        with span("openai.chat.completions", {"gen_ai.request.model": settings.openai_model, "stream": True}):
+            async with self.semaphore:
+                started = time.perf_counter()
+                outcome = "error"
+                try:
+                    yield self.client
+                    outcome = "ok"
+                finally:
+                    llm_request_duration.observe(
+                        time.perf_counter() - started, model=settings.openai_model, stream="true", outcome=outcome
+                    )
+
+    async def chat_completion(self, **kwargs):
+        """
+        Create a chat completion with the configured per-request timeout.
+        """
+        kwargs.setdefault("timeout", settings.openai_timeout)
+        model = kwargs.get("model", settings.openai_model)
+        with span("openai.chat.completions", {"gen_ai.request.model": model}) as call_span:
+            async with self.semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await self.client.chat.completions.create(**kwargs)
+                except Exception:
+                    llm_request_duration.observe(time.perf_counter() - started, model=model, stream="false", outcome="error")
+                    raise
+            llm_request_duration.observe(time.perf_counter() - started, model=model, stream="false", outcome="ok")
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                self.record_usage(usage, model)
+                call_span.set_attributes({
+                    "gen_ai.usage.input_tokens": usage.prompt_tokens or 0,
+                    "gen_ai.usage.output_tokens": usage.completion_tokens or 0,
+                })
+        return response
+
+    def record_usage(self, usage, model: Optional[str] = None) -> None:
+        """
+        Count the tokens of a completion. Streamed completions report usage
+        in their last chunk when created with STREAM_USAGE.
+        """
+        model = model or settings.openai_model
+        llm_tokens.inc(usage.prompt_tokens or 0, model=model, type="prompt")
+        llm_tokens.inc(usage.completion_tokens or 0, model=model, type="completion")
+
+    async def close(self):
+        await self.client.close()
+
+
+def create_llm_client() -> Optional[LLMClient]:
+    """
+    Build the shared client, or None when no API key is configured.
+    """
+    api_key = settings.openai_api_key or os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        return None
+
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=settings.openai_max_connections,
+            max_keepalive_connections=settings.openai_max_keepalive_connections,
+        ),
+        timeout=httpx.Timeout(settings.openai_timeout, connect=settings.openai_connect_timeout),
+    )
+    client = AsyncOpenAI(
+        api_key=api_key,
+        base_url=settings.openai_base_url,
+        max_retries=settings.openai_max_retries,  # exponential backoff is built into the client
+        http_client=http_client,
+    )
+    return LLMClient(client, settings.openai_max_concurrency)
+
+
+def get_llm_client(request: Request) -> Optional[LLMClient]:
+    """
+    Get the shared LLM client created at startup.
+    This function is meant to be used as a FastAPI dependency.
+    """
+    return getattr(request.app.state, "llm_client", None)
@@ -0,0 +1,399 @@
+"""
+In-process metrics.
+
+Query instrumentation hooks SQLAlchemy's cursor events on every engine and
+keeps, per distinct statement, a latency histogram and the number of rows
+returned, plus the most recent statements slower than
+settings.slow_query_threshold_ms. The numbers are served by
+GET /api/v1/metrics/queries.
+
+Application metrics (HTTP requests, database pools, OpenAI calls, MCP tool
+calls) live in `registry` and are served in the Prometheus text format by
+GET /metrics. Updating one is a dictionary lookup and a few additions under
+a lock; pool gauges are only read when /metrics is scraped.
+"""
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config import settings
+
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float("inf"))
+# Same for the Prometheus histograms, in seconds
+REQUEST_BUCKETS_SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float("inf"))
+LLM_BUCKETS_SECONDS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, float("inf"))
+# Distinct statements tracked; the rest are counted under OTHER_STATEMENTS
+MAX_STATEMENTS = 500
+OTHER_STATEMENTS = "(other statements)"
+MAX_STATEMENT_LENGTH = 1000
+
+_WHITESPACE = re.compile(r"\s+")
+# Expanded IN lists: (?, ?, ?) or ($1, $2, $3) become (?...)
+_PLACEHOLDER_LIST = re.compile(r"\((?:\?|\$\d+|%s)(?:\s*,\s*(?:\?|\$\d+|%s))+\)")
+
+
+class Histogram:
+    """
+    Cumulative-style histogram over fixed bucket bounds.
+    """
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def cumulative(self) -> List[int]:
+        """
+        Observations at or below each bucket bound.
+        """
+        total, result = 0, []
+        for count in self.counts:
+            total += count
+            result.append(total)
+        return result
+
+
+class StatementStats:
+    def __init__(self):
+        self.latency = Histogram()
+        self.rows = 0
+
+    def as_dict(self, statement: str) -> Dict[str, Any]:
+        latency = self.latency
+        return {
+            "statement": statement,
+            "count": latency.count,
+            "total_ms": round(latency.sum, 3),
+            "mean_ms": round(latency.sum / latency.count, 3) if latency.count else 0.0,
+            "max_ms": round(latency.max, 3),
+            "rows": self.rows,
+            "buckets_ms": {
+                ("+Inf" if bound == float("inf") else str(bound)): count
+                for bound, count in zip(latency.buckets, latency.cumulative())
+            },
+        }
+
+
+def normalize_statement(statement: str) -> str:
+    """
+    Statement text used as the metrics key: whitespace collapsed and
+    expanded IN lists folded, so one query shape maps to one entry.
+    """
+    statement = _PLACEHOLDER_LIST.sub("(?...)", _WHITESPACE.sub(" ", statement).strip())
+    return statement[:MAX_STATEMENT_LENGTH]
+
+
+def _rows_returned(cursor) -> int:
+    # The async drivers buffer result rows on the cursor; otherwise fall back
+    # to the driver's rowcount, which is -1 for SELECTs on some drivers
+    rows = getattr(cursor, "_rows", None)
+    if cursor.description is not None and rows is not None:
+        return len(rows)
+    return max(cursor.rowcount, 0)
+
+
+class QueryMetrics:
+    """
+    Per-statement latency and row counts plus slow query samples.
+    """
+
+    def __init__(self, slow_samples: int = 50):
+        self._statements: Dict[str, StatementStats] = {}
+        self._slow: deque = deque(maxlen=slow_samples)
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, duration_ms: float, rows: int, parameters: Any = None) -> None:
+        key = normalize_statement(statement)
+        with self._lock:
+            stats = self._statements.get(key)
+            if stats is None:
+                if len(self._statements) >= MAX_STATEMENTS:
+                    key = OTHER_STATEMENTS
+                stats = self._statements.setdefault(key, StatementStats())
+            stats.latency.observe(duration_ms)
+            stats.rows += rows
+            if duration_ms >= settings.slow_query_threshold_ms:
+                sample = {
+                    "statement": key,
+                    "duration_ms": round(duration_ms, 3),
+                    "rows": rows,
+                    "at": time.time(),
+                }
+                # Parameter values may be personal data; only kept when debugging
+                if settings.debug:
+                    sample["parameters"] = repr(parameters)[:MAX_STATEMENT_LENGTH]
+                self._slow.append(sample)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Statements by total time spent, and slow queries newest first.
+        """
+        with self._lock:
+            statements = [stats.as_dict(statement) for statement, stats in self._statements.items()]
+            slow = list(reversed(self._slow))
+        statements.sort(key=lambda s: s["total_ms"], reverse=True)
+        return {
+            "slow_query_threshold_ms": settings.slow_query_threshold_ms,
+            "statements": statements,
+            "slow_queries": slow,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._statements.clear()
+            self._slow.clear()
+
+
+query_metrics = QueryMetrics(slow_samples=settings.slow_query_samples)
+
+
+def instrument_engine(engine: Engine, metrics: Optional[QueryMetrics] = None) -> None:
+    """
+    Record every statement `engine` executes. Pass the sync_engine of an
+    async engine.
+    """
+    metrics = metrics or query_metrics
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_start_time"].pop()
+        metrics.record(statement, (time.perf_counter() - started) * 1000, _rows_returned(cursor), parameters)
+
+    @event.listens_for(engine, "handle_error")
+    def _discard_timer(exception_context):
+        # Failed statements never reach after_cursor_execute
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_start_time"):
+            conn.info["query_start_time"].pop()
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricFamily:
+    """
+    A named metric with a fixed set of labels, one child per label value
+    combination.
+    """
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._children: Dict[tuple, Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> tuple:
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def _format_labels(self, key: tuple, extra: Sequence[tuple] = ()) -> str:
+        pairs = list(zip(self.labels, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in pairs) + "}"
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}", *self.samples()]
+
+
+class Counter(MetricFamily):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._children[key] = self._children.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._children.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._children.items())
+        return [f"{self.name}{self._format_labels(key)} {value}" for key, value in items]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._children[self._key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class HistogramFamily(MetricFamily):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = REQUEST_BUCKETS_SECONDS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            histogram = self._children.get(key)
+            if histogram is None:
+                histogram = self._children[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def child(self, **labels) -> Optional[Histogram]:
+        return self._children.get(self._key(labels))
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            items = [(key, histogram.cumulative(), histogram.count, histogram.sum)
+                     for key, histogram in self._children.items()]
+        for key, cumulative, count, total in items:
+            for bound, value in zip(self.buckets, cumulative):
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                lines.append(f"{self.name}_bucket{self._format_labels(key, [('le', le)])} {value}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {count}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {total}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Metric families plus collectors that refresh gauges at scrape time.
+    """
+
+    def __init__(self):
+        self._families: Dict[str, MetricFamily] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def _register(self, family: MetricFamily) -> MetricFamily:
+        if family.name in self._families:
+            raise ValueError(f"Metric {family.name} is already registered")
+        self._families[family.name] = family
+        return family
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = REQUEST_BUCKETS_SECONDS) -> HistogramFamily:
+        return self._register(HistogramFamily(name, documentation, labels, buckets))
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """
+        All metrics in the Prometheus text exposition format.
+        """
+        for collector in self._collectors:
+            collector()
+        lines = []
+        for family in self._families.values():
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ["method", "route", "status"]
+)
+http_requests_in_progress = registry.gauge(
+    "http_requests_in_progress", "HTTP requests currently being served", ["method"]
+)
+db_pool_size = registry.gauge("db_pool_size", "Configured connections per database pool", ["pool"])
+db_pool_checked_out = registry.gauge("db_pool_checked_out", "Connections currently in use", ["pool"])
+db_pool_overflow = registry.gauge("db_pool_overflow", "Connections open beyond the pool size", ["pool"])
+llm_request_duration = registry.histogram(
+    "openai_request_duration_seconds", "OpenAI chat completion latency", ["model", "stream", "outcome"],
+    buckets=LLM_BUCKETS_SECONDS
+)
+llm_tokens = registry.counter("openai_tokens_total", "OpenAI tokens used", ["model", "type"])
+mcp_tool_duration = registry.histogram(
+    "mcp_tool_duration_seconds", "MCP tool execution time", ["tool"]
+)
+mcp_tool_errors = registry.counter("mcp_tool_errors_total", "MCP tool calls that failed", ["tool"])
+
+
+def register_pool_metrics(pools: Dict[str, Any]) -> None:
+    """
+    Report the given connection pools (name -> Pool) at scrape time. Pools
+    without a fixed size, such as SQLite's, are skipped.
+    """
+    def collect():
+        for name, pool in pools.items():
+            if hasattr(pool, "checkedout"):
+                db_pool_size.set(pool.size(), pool=name)
+                db_pool_checked_out.set(pool.checkedout(), pool=name)
+                db_pool_overflow.set(max(pool.overflow(), 0), pool=name)
+
+    registry.add_collector(collect)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request by its route template, so
+    /api/v1/tasks/{task_id} is one series whatever the ID.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        http_requests_in_progress.inc(method=method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_requests_in_progress.dec(method=method)
+            route = scope.get("route")
+            http_request_duration.observe(
+                time.perf_counter() - started,
+                method=method,
+                route=getattr(route, "path", "unmatched"),
+                status=status[0]
+            )
@@ -0,0 +1,183 @@
+"""
+Keyset (cursor) pagination helpers.
+
+A cursor is an opaque, URL-safe token holding the sort key values of the
+last row of a page. The next page continues strictly after that row, so
+fetching page N costs the same as fetching page 1 and rows never shift
+between pages.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from fastapi import HTTPException, status
+from sqlalchemy import and_, false, or_, tuple_
+
+from models.conversation import Conversation
+from models.message import Message
+from models.task import DUE_DATE_MISSING, PRIORITY_RANK, Task
+
+
+class SortKey:
+    """
+    One component of a keyset ordering.
+    """
+
+    def __init__(self, expression, value_type: type, descending: bool = False,
+                 value: Optional[Callable[[Any], Any]] = None):
+        self.expression = expression
+        self.value_type = value_type
+        self.descending = descending
+        # Reads the key from a loaded row; defaults to the mapped attribute
+        self.value = value or (lambda row, key=expression.key: getattr(row, key))
+
+
+# PRIORITY_RANK of a loaded task
+PRIORITY_RANKS = {"high": 3, "medium": 2, "low": 1}
+
+# The last key of every ordering is the primary key so the ordering is total
+TASK_SORT_KEYS = {
+    "created_at": [
+        SortKey(Task.created_at, datetime, descending=True),
+        SortKey(Task.id, UUID, descending=True),
+    ],
+    "due_date": [
+        SortKey(DUE_DATE_MISSING, int, value=lambda task: int(task.due_date is None)),
+        SortKey(Task.due_date, datetime),
+        SortKey(Task.id, UUID),
+    ],
+    "priority": [
+        SortKey(PRIORITY_RANK, int, descending=True, value=lambda task: PRIORITY_RANKS.get(task.priority, 0)),
+        SortKey(Task.created_at, datetime, descending=True),
+        SortKey(Task.id, UUID, descending=True),
+    ],
+    "updated_at": [
+        SortKey(Task.updated_at, datetime, descending=True),
+        SortKey(Task.id, UUID, descending=True),
+    ],
+}
+
+CONVERSATION_SORT_KEYS = [
+    SortKey(Conversation.updated_at, datetime, descending=True),
+    SortKey(Conversation.id, UUID, descending=True),
+]
+
+# Message history, newest first
+MESSAGE_SORT_KEYS = [
+    SortKey(Message.created_at, datetime, descending=True),
+    SortKey(Message.id, UUID, descending=True),
+]
+
+
+def _invalid_cursor() -> HTTPException:
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor")
+
+
+def _dump_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    return value
+
+
+def _load_value(value: Any, value_type: type) -> Any:
+    if value is None or value_type is int:
+        return value
+    if value_type is datetime:
+        return datetime.fromisoformat(value)
+    return value_type(value)
+
+
+def encode_cursor(sort: str, keys: Sequence[SortKey], row: Any) -> str:
+    """
+    Build an opaque cursor from the sort key values of a row.
+    """
+    values = [_dump_value(key.value(row)) for key in keys]
+    payload = json.dumps([sort, values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, keys: Sequence[SortKey]) -> List[Any]:
+    """
+    Decode a cursor produced by encode_cursor for the given sort order.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if cursor_sort != sort or len(values) != len(keys):
+            raise ValueError("cursor does not match sort order")
+        return [_load_value(v, key.value_type) for v, key in zip(values, keys)]
+    except (ValueError, TypeError):
+        raise _invalid_cursor()
+
+
+def _equals(expression, value):
+    return expression.is_(None) if value is None else expression == value
+
+
+def _after(key: SortKey, value):
+    if value is None:
+        # NULLs only appear in keys guarded by a "missing" key before them
+        return false()
+    return key.expression < value if key.descending else key.expression > value
+
+
+def keyset_condition(keys: Sequence[SortKey], values: Sequence[Any]):
+    """
+    WHERE clause selecting rows strictly after the row described by values.
+
+    When every key sorts the same way and no value is NULL this is a row
+    value comparison, (k1, k2) < (v1, v2), which the database can answer
+    with one seek into the matching index, so deep pages cost the same as
+    the first. Otherwise it expands to (k1 > v1) OR (k1 = v1 AND k2 > v2)
+    OR ..., which supports mixed directions and NULLs but only seeks on the
+    equality prefix of the query.
+    """
+    if len({key.descending for key in keys}) == 1 and None not in values:
+        row = tuple_(*(key.expression for key in keys))
+        cursor_row = tuple(values)
+        return row < cursor_row if keys[0].descending else row > cursor_row
+
+    clauses = []
+    for i, key in enumerate(keys):
+        prefix = [_equals(keys[j].expression, values[j]) for j in range(i)]
+        clauses.append(and_(*prefix, _after(key, values[i])))
+    return or_(*clauses)
+
+
+def order_by_clauses(keys: Sequence[SortKey]) -> List[Any]:
+    return [key.expression.desc() if key.descending else key.expression.asc() for key in keys]
+
+
+def paginate(query, sort: str, keys: Sequence[SortKey], limit: int, cursor: Optional[str]):
+    """
+    Apply keyset ordering, the cursor position and a look-ahead limit to a
+    query. Fetching limit + 1 rows tells us whether a next page exists.
+    """
+    if cursor:
+        query = query.where(keyset_condition(keys, decode_cursor(cursor, sort, keys)))
+    return query.order_by(*order_by_clauses(keys)).limit(limit + 1)
+
+
+def split_page(rows: Sequence[Any], sort: str, keys: Sequence[SortKey], limit: int,
+               row_key: Callable[[Any], Any] = lambda row: row) -> Tuple[List[Any], Optional[str]]:
+    """
+    Trim the look-ahead row and build the cursor for the next page.
+    row_key extracts the mapped object from rows that carry extra columns.
+    """
+    page = list(rows[:limit])
+    next_cursor = None
+    if len(rows) > limit and page:
+        next_cursor = encode_cursor(sort, keys, row_key(page[-1]))
+    return page, next_cursor
+
+
+def paginate_tasks(query, sort: str, limit: int, cursor: Optional[str]):
+    return paginate(query, sort, TASK_SORT_KEYS[sort], limit, cursor)
+
+
+def split_task_page(tasks: Sequence[Task], sort: str, limit: int) -> Tuple[List[Task], Optional[str]]:
+    return split_page(tasks, sort, TASK_SORT_KEYS[sort], limit)
@@ -0,0 +1,64 @@
+"""
+Full-text search over task titles and descriptions.
+
+The index itself lives in the database and is kept up to date by it on every
+write (see TASK_SEARCH_DDL in models/task.py), so REST handlers, bulk
+endpoints and MCP tools need no extra bookkeeping. This module turns a user
+query into a prefix-matching full-text predicate plus a ranking expression
+for the current dialect.
+"""
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import column, false, func, literal_column, or_, table
+
+from models.task import Task
+
+
+# Most words taken from one query
+MAX_SEARCH_TERMS = 8
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+_task_search = table("task_search", column("rowid"))
+_task_search_key = table("task_search_key", column("id"), column("task_id"))
+
+
+def search_terms(q: str) -> List[str]:
+    """
+    Split a free-text query into words, dropping any search syntax.
+    """
+    return _WORD.findall(q)[:MAX_SEARCH_TERMS]
+
+
+def apply_task_search(query, q: str, dialect: str) -> Tuple[object, Optional[object]]:
+    """
+    Restrict a Task query to rows matching every word of q as a prefix.
+    Returns the query and an ORDER BY clause putting the best match first,
+    or None when the database has no full-text ranking.
+    """
+    terms = search_terms(q)
+    if not terms:
+        return query.where(false()), None
+
+    if dialect == "sqlite":
+        fts = literal_column("task_search")
+        match = " ".join(f'"{term}"*' for term in terms)
+        query = (
+            query.join(_task_search_key, _task_search_key.c.task_id == Task.id)
+            .join(_task_search, _task_search.c.rowid == _task_search_key.c.id)
+            .where(fts.op("MATCH")(match))
+        )
+        # bm25 is lower for better matches; title hits weigh more than description ones
+        return query, func.bm25(fts, 10.0, 1.0).asc()
+
+    if dialect == "postgresql":
+        vector = literal_column("task.search_vector")
+        tsquery = func.to_tsquery("simple", " & ".join(f"{term}:*" for term in terms))
+        return query.where(vector.op("@@")(tsquery)), func.ts_rank(vector, tsquery).desc()
+
+    # Any other database: unindexed substring match without ranking
+    for term in terms:
+        pattern = f"%{term}%"
+        query = query.where(or_(Task.title.ilike(pattern), Task.description.ilike(pattern)))
+    return query, None
@@ -1,5 +1,12 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple
 from passlib.context import CryptContext
+from fastapi import HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from config import settings
 
 
 # Password hashing context - using argon2 as primary, bcrypt as fallback
@@ -23,4 +30,92 @@ def get_password_hash(password: str) -> str:
     """
     # Bcrypt has a 72-byte password limit, so we truncate if necessary
     truncated_password = password[:72]
-    return pwd_context.hash(truncated_password)
\ No newline at end of file
+    return pwd_context.hash(truncated_password)
+
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password and, when the stored hash uses outdated parameters,
+    return a fresh hash to store in its place.
+    """
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+class PasswordHashPool:
+    """
+    Runs password hashing in a size-limited process pool so the CPU cost
+    never lands on the event loop. Requests beyond the pool size plus the
+    queue limit are rejected with 503 instead of piling up.
+
+    Workers are started by a fork server (spawned where that is not
+    available), never forked from the app process: by the time they start,
+    it runs other threads whose locks a forked child could inherit held.
+    Start the pool on startup and shut it down on exit.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, retry_after: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        self.mp_context = multiprocessing.get_context(start_method)
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    def start(self) -> None:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=self.mp_context)
+
+    def _busy(self) -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please retry shortly",
+            headers={"Retry-After": str(self.retry_after)},
+        )
+
+    async def run(self, func, *args):
+        if self.in_flight >= self.capacity:
+            raise self._busy()
+
+        self.in_flight += 1
+        try:
+            # Started on startup; again here only after a worker died
+            self.start()
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+        except BrokenProcessPool:
+            # A worker died; start a fresh pool on the next call
+            self._executor = None
+            raise self._busy()
+        finally:
+            self.in_flight -= 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hash_pool = PasswordHashPool(
+    max_workers=settings.password_hash_workers,
+    max_queue=settings.password_hash_max_queue,
+    retry_after=settings.password_hash_retry_after,
+)
+
+
+async def hash_password_async(password: str) -> str:
+    """
+    Hash a password in the password hashing pool.
+    """
+    return await password_hash_pool.run(get_password_hash, password)
+
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password in the password hashing pool.
+    """
+    return await password_hash_pool.run(verify_and_update_password, plain_password, hashed_password)
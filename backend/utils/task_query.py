@@ -0,0 +1,92 @@
+"""
+Task listing query shared by GET /api/v1/tasks and the list_tasks MCP tool.
+
+Every filter is a predicate on a column covered by one of the
+(user_id, ...) task indexes, so filtering and ordering happen in SQL.
+"""
+from datetime import datetime
+from typing import Optional, Tuple
+from sqlmodel.ext.asyncio.session import AsyncSession
+from uuid import UUID
+
+from sqlalchemy import case, func, or_
+from sqlmodel import select
+
+from models.task import Task, TaskFilters, TaskPriorityStats, TaskStats
+from utils.search import apply_task_search
+
+
+def build_task_query(
+    user_id: UUID,
+    filters: TaskFilters,
+    dialect: str,
+    now: Optional[datetime] = None
+) -> Tuple[object, Optional[object]]:
+    """
+    SELECT for a user's tasks matching the filters, without ordering.
+    Returns the query and, when filters.q is set, an ORDER BY clause for
+    search relevance (None if the database cannot rank).
+    """
+    now = now or datetime.utcnow()
+    query = select(Task).where(Task.user_id == user_id)
+
+    if filters.completed is not None:
+        query = query.where(Task.completed == filters.completed)
+
+    if filters.priority:
+        query = query.where(Task.priority.in_(filters.priority))
+
+    if filters.due_before is not None:
+        query = query.where(Task.due_date < filters.due_before)
+
+    if filters.due_after is not None:
+        query = query.where(Task.due_date >= filters.due_after)
+
+    if filters.overdue is True:
+        query = query.where(Task.due_date < now, Task.completed == False)  # noqa: E712
+    elif filters.overdue is False:
+        query = query.where(or_(Task.due_date.is_(None), Task.due_date >= now, Task.completed == True))  # noqa: E712
+
+    if filters.created_after is not None:
+        query = query.where(Task.created_at >= filters.created_after)
+
+    rank = None
+    if filters.q is not None:
+        query, rank = apply_task_search(query, filters.q, dialect)
+
+    return query, rank
+
+
+def order_by_relevance(query, rank, limit: int, offset: int = 0):
+    """
+    Order search results best match first, newest first among equals.
+    """
+    ordering = [rank] if rank is not None else []
+    return query.order_by(*ordering, Task.created_at.desc(), Task.id.desc()).offset(offset).limit(limit)
+
+
+async def get_task_stats(session: AsyncSession, user_id: UUID, now: Optional[datetime] = None) -> TaskStats:
+    """
+    Task totals for a user from one GROUP BY over the
+    (user_id, completed, priority) index.
+    """
+    now = now or datetime.utcnow()
+    overdue = case((Task.due_date < now, 1), else_=0)
+    result = await session.exec(
+        select(Task.priority, Task.completed, func.count(), func.coalesce(func.sum(overdue), 0))
+        .where(Task.user_id == user_id)
+        .group_by(Task.priority, Task.completed)
+    )
+
+    stats = TaskStats(by_priority={p: TaskPriorityStats() for p in ("low", "medium", "high")})
+    for priority, completed, count, overdue_count in result.all():
+        bucket = stats.by_priority.setdefault(priority or "none", TaskPriorityStats())
+        bucket.total += count
+        stats.total += count
+        if completed:
+            bucket.completed += count
+            stats.completed += count
+        else:
+            stats.overdue += overdue_count
+    stats.pending = stats.total - stats.completed
+    return stats
@@ -0,0 +1,69 @@
+"""
+Per-user task change sequence.
+
+User.task_version is a counter bumped once per transaction that writes the
+user's tasks. Every task touched by that transaction records the new value
+in Task.change_seq, and deleted tasks leave a TaskTombstone with it, so
+"what changed since N" is an indexed range scan. Bumping takes a row lock on
+the user, which also keeps sequence order equal to commit order.
+"""
+from datetime import datetime
+from typing import Iterable
+from uuid import UUID
+
+from sqlalchemy import insert, update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models.task import Task, TaskTombstone
+from models.user import User
+
+
+async def get_task_version(session: AsyncSession, user_id: UUID) -> int:
+    result = await session.exec(select(User.task_version).where(User.id == user_id))
+    return result.first() or 0
+
+
+async def bump_task_version(session: AsyncSession, user_id: UUID) -> int:
+    """
+    Move the user's task collection to a new version and return it. Call
+    this in the same transaction as every write to the user's tasks, before
+    changing any Task objects, and stamp them with the returned value.
+    """
+    result = await session.exec(
+        update(User)
+        .where(User.id == user_id)
+        .values(task_version=User.task_version + 1)
+        .returning(User.task_version)
+    )
+    return result.scalar_one()
+
+
+async def record_task_deletions(session: AsyncSession, user_id: UUID, task_ids: Iterable[UUID], change_seq: int) -> None:
+    """
+    Leave tombstones for deleted tasks.
+    """
+    now = datetime.utcnow()
+    rows = [
+        {"task_id": task_id, "user_id": user_id, "change_seq": change_seq, "deleted_at": now}
+        for task_id in set(task_ids)
+    ]
+    if rows:
+        await session.exec(insert(TaskTombstone), params=rows)
+
+
+async def get_changes(session: AsyncSession, user_id: UUID, since: int):
+    """
+    Tasks written and IDs of tasks deleted after the given sequence number.
+    """
+    tasks = await session.exec(
+        select(Task)
+        .where(Task.user_id == user_id, Task.change_seq > since)
+        .order_by(Task.change_seq, Task.id)
+    )
+    deleted = await session.exec(
+        select(TaskTombstone.task_id)
+        .where(TaskTombstone.user_id == user_id, TaskTombstone.change_seq > since)
+        .order_by(TaskTombstone.change_seq)
+    )
+    return tasks.all(), deleted.all()
@@ -0,0 +1,381 @@
+"""
+Request tracing.
+
+Every HTTP request gets a request ID (taken from the X-Request-ID header or
+generated) that is added to all log records and echoed in the response.
+With tracing enabled, the request is also a root span, and the chat stages,
+OpenAI calls, MCP tool calls and SQL statements made while serving it are
+nested spans below it.
+
+Spans go through the OpenTelemetry API when tracing_exporter is "otel" and
+opentelemetry is installed, so an SDK configured for the process (for
+example by opentelemetry-instrument) ships them to its collector. Without
+one, spans are exported as JSON lines in the layout of OpenTelemetry's
+ConsoleSpanExporter, to stdout ("console") or to tracing_file ("file").
+"""
+import json
+import logging
+import secrets
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, Optional
+from uuid import uuid4
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config import settings
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # pragma: no cover - the built-in spans are used instead
+    otel_trace = None
+
+
+logger = logging.getLogger(__name__)
+
+REQUEST_ID_HEADER = "x-request-id"
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(request_id)s %(trace_id)s] %(name)s: %(message)s"
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+def get_request_id() -> Optional[str]:
+    return request_id_var.get()
+
+
+def _timestamp(ns: int) -> str:
+    return datetime.fromtimestamp(ns / 1e9, tz=timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+class Span:
+    """
+    A finished or running span. Mirrors the subset of the OpenTelemetry
+    Span interface the application uses.
+    """
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.events = []
+        self.status = "UNSET"
+        self.status_description: Optional[str] = None
+        self.start_time = time.time_ns()
+        self.end_time: Optional[int] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: Dict[str, Any]) -> None:
+        self.attributes.update(attributes)
+
+    def update_name(self, name: str) -> None:
+        self.name = name
+
+    def set_error(self, description: str) -> None:
+        self.status = "ERROR"
+        self.status_description = description
+
+    def record_exception(self, exception: BaseException) -> None:
+        self.events.append({
+            "name": "exception",
+            "timestamp": _timestamp(time.time_ns()),
+            "attributes": {"exception.type": type(exception).__name__, "exception.message": str(exception)},
+        })
+        self.set_error(f"{type(exception).__name__}: {exception}")
+
+    def end(self) -> None:
+        if self.end_time is None:
+            self.end_time = time.time_ns()
+
+    def to_dict(self) -> Dict[str, Any]:
+        status = {"status_code": self.status}
+        if self.status_description:
+            status["description"] = self.status_description
+        return {
+            "name": self.name,
+            "context": {"trace_id": f"0x{self.trace_id}", "span_id": f"0x{self.span_id}"},
+            "parent_id": f"0x{self.parent_id}" if self.parent_id else None,
+            "start_time": _timestamp(self.start_time),
+            "end_time": _timestamp(self.end_time or time.time_ns()),
+            "status": status,
+            "attributes": self.attributes,
+            "events": self.events,
+            "resource": {"attributes": {"service.name": settings.tracing_service_name}},
+        }
+
+
+class _NoopSpan:
+    trace_id = None
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_attributes(self, attributes):
+        pass
+
+    def update_name(self, name):
+        pass
+
+    def record_exception(self, exception):
+        pass
+
+    def end(self):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class ConsoleSpanExporter:
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+
+class FileSpanExporter(ConsoleSpanExporter):
+    def __init__(self, path: str):
+        super().__init__(open(path, "a", buffering=1, encoding="utf-8"))
+
+
+class MemorySpanExporter:
+    """
+    Keeps finished spans in a list; for tests.
+    """
+
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span: Span) -> None:
+        self.spans.append(span)
+
+
+class Tracer:
+    def __init__(self, exporter=None):
+        self.exporter = exporter
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def start_child(self, name: str, attributes: Optional[Dict[str, Any]] = None) -> Optional[Span]:
+        """
+        A span under the current one, not made current itself; None outside
+        a span, so work done outside a request is not traced.
+        """
+        parent = _current_span.get()
+        if parent is None:
+            return None
+        return Span(name, parent.trace_id, parent.span_id, attributes)
+
+    def finish(self, span: Span) -> None:
+        span.end()
+        try:
+            self.exporter.export(span)
+        except Exception:
+            logger.exception("Failed to export span %s", span.name)
+
+    def set_error(self, span, description: str) -> None:
+        span.set_error(description)
+
+    def current_trace_id(self) -> Optional[str]:
+        current = _current_span.get()
+        return current.trace_id if current is not None else None
+
+    @contextmanager
+    def span(self, name: str, attributes: Optional[Dict[str, Any]] = None) -> Iterator[Span]:
+        if self.exporter is None:
+            yield NOOP_SPAN
+            return
+        parent = _current_span.get()
+        if parent is not None:
+            span = Span(name, parent.trace_id, parent.span_id, attributes)
+        else:
+            span = Span(name, secrets.token_hex(16), None, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                # Ended in another context, e.g. a streamed response's generator
+                _current_span.set(parent)
+            self.finish(span)
+
+
+class OpenTelemetryTracer(Tracer):
+    """
+    Spans created through the OpenTelemetry API and exported by whatever
+    SDK the process configured.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.tracer = otel_trace.get_tracer("todo-backend")
+
+    @property
+    def enabled(self) -> bool:
+        return True
+
+    def start_child(self, name: str, attributes: Optional[Dict[str, Any]] = None):
+        if not otel_trace.get_current_span().get_span_context().is_valid:
+            return None
+        return self.tracer.start_span(name, attributes=attributes)
+
+    def finish(self, span) -> None:
+        span.end()
+
+    def set_error(self, span, description: str) -> None:
+        span.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR, description))
+
+    def current_trace_id(self) -> Optional[str]:
+        context = otel_trace.get_current_span().get_span_context()
+        return format(context.trace_id, "032x") if context.is_valid else None
+
+    @contextmanager
+    def span(self, name: str, attributes: Optional[Dict[str, Any]] = None) -> Iterator[Any]:
+        with self.tracer.start_as_current_span(name, attributes=attributes) as span:
+            yield span
+
+
+def create_tracer() -> Tracer:
+    exporter = settings.tracing_exporter if settings.tracing_enabled else "none"
+    if exporter == "otel":
+        if otel_trace is not None:
+            return OpenTelemetryTracer()
+        logger.warning("opentelemetry is not installed; exporting spans to the console")
+        exporter = "console"
+    if exporter == "console":
+        return Tracer(ConsoleSpanExporter())
+    if exporter == "file":
+        return Tracer(FileSpanExporter(settings.tracing_file))
+    return Tracer()
+
+
+tracer = create_tracer()
+
+
+def span(name: str, attributes: Optional[Dict[str, Any]] = None):
+    """
+    Context manager running its block in a span nested under the current
+    one. A no-op when tracing is disabled.
+    """
+    return tracer.span(name, attributes)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Record every statement `engine` executes as a span under the current
+    one. Pass the sync_engine of an async engine.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start_span(conn, cursor, statement, parameters, context, executemany):
+        statement_span = tracer.start_child("db.query", {
+            "db.system": engine.dialect.name,
+            "db.statement": statement[:1000],
+        })
+        conn.info.setdefault("trace_spans", []).append(statement_span)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _end_span(conn, cursor, statement, parameters, context, executemany):
+        statement_span = conn.info["trace_spans"].pop()
+        if statement_span is not None:
+            statement_span.set_attribute("db.rows", max(cursor.rowcount, 0))
+            tracer.finish(statement_span)
+
+    @event.listens_for(engine, "handle_error")
+    def _fail_span(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("trace_spans"):
+            statement_span = conn.info["trace_spans"].pop()
+            if statement_span is not None:
+                statement_span.record_exception(exception_context.original_exception)
+                tracer.finish(statement_span)
+
+
+class RequestIdFilter(logging.Filter):
+    """
+    Adds request_id and trace_id to log records ("-" outside a request).
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get() or "-"
+        record.trace_id = tracer.current_trace_id() or "-"
+        return True
+
+
+def configure_logging() -> None:
+    """
+    Log to stderr at settings.log_level with the request and trace IDs in
+    every line.
+    """
+    root = logging.getLogger()
+    if any(isinstance(f, RequestIdFilter) for handler in root.handlers for f in handler.filters):
+        return
+    handler = logging.StreamHandler()
+    handler.addFilter(RequestIdFilter())
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    root.addHandler(handler)
+    root.setLevel(settings.log_level.upper())
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware assigning each request its ID and root span.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER.encode():
+                request_id = value.decode("latin-1")[:128]
+                break
+        request_id = request_id or uuid4().hex
+        token = request_id_var.set(request_id)
+
+        method = scope["method"]
+        with span(f"{method} {scope['path']}", {"http.method": method, "http.target": scope["path"],
+                                                 "http.request_id": request_id}) as request_span:
+            async def send_with_request_id(message):
+                if message["type"] == "http.response.start":
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [(b"x-request-id", request_id.encode("latin-1"))]
+                    request_span.set_attribute("http.status_code", message["status"])
+                    if message["status"] >= 500 and tracer.enabled:
+                        tracer.set_error(request_span, f"HTTP {message['status']}")
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_request_id)
+            finally:
+                route = scope.get("route")
+                if route is not None:
+                    request_span.update_name(f"{method} {route.path}")
+                    request_span.set_attribute("http.route", route.path)
+                request_id_var.reset(token)